@@ -0,0 +1,72 @@
+"""
+Compares the default numpy fetch path of setup_dataframe.create_dataframe against
+the Arrow-backed path. Reports the wall time of the fetch plus header and date
+transformation, and the deep memory usage of the resulting dataframe.
+
+Run from the repository root:
+    python dev_scripts/benchmark_fetch.py --db data/medical_data.db --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Allow importing src when running the script directly
+repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, repo_dir)
+
+from src import setup_dataframe  # noqa: E402
+
+
+def run_backend(db_path: str, config_dict: dict, dtype_backend: str, repeat: int) -> dict:
+    """
+    Runs the fetch and transform stages for one backend and collects timings
+
+    Args:
+        db_path (str): path to the SQLite database
+        config_dict (dict): loaded config.json
+        dtype_backend (str): backend passed to create_dataframe
+        repeat (int): number of timed runs, the fastest one is reported
+
+    Returns:
+        result (dict): best time in seconds, memory in bytes and row count
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = setup_dataframe.create_dataframe(db_path, dtype_backend=dtype_backend)
+        df = setup_dataframe.transform_header(df, mapping_dict=config_dict["database_fields_to_headers"])
+        df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "backend": dtype_backend,
+        "rows": df.shape[0],
+        "seconds": min(timings),
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="benchmark_fetch.py")
+    parser.add_argument("--db", type=str, default=os.path.join(repo_dir, "data", "medical_data.db"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(os.path.join(repo_dir, "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+
+    baseline = run_backend(args.db, config, "numpy", args.repeat)
+    arrow = run_backend(args.db, config, "pyarrow", args.repeat)
+
+    print(f"{'backend':<10}{'rows':>10}{'seconds':>12}{'memory (MB)':>14}")
+    for result in (baseline, arrow):
+        print(f"{result['backend']:<10}{result['rows']:>10}{result['seconds']:>12.4f}"
+              f"{result['memory_bytes'] / 1e6:>14.2f}")
+
+    print(f"\nTime saved:   {1 - arrow['seconds'] / baseline['seconds']:.1%}")
+    print(f"Memory saved: {1 - arrow['memory_bytes'] / baseline['memory_bytes']:.1%}")
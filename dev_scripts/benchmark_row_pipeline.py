@@ -0,0 +1,122 @@
+"""
+Compares the DataFrame route of main.py (create_dataframe, transform_header,
+format_date_columns, populate_templates) against the pandas-free row pipeline.
+Reports the wall time and the peak resident memory of each route up to the saved
+workbook. Every run is done in a fresh process, so the peak of one route does
+not hide the other, and the files are saved to a temporary directory.
+
+Run from the repository root:
+    python dev_scripts/benchmark_row_pipeline.py --db data/medical_data.db --repeat 3
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+# Allow importing src when running the script directly
+repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, repo_dir)
+
+from src import export_excel, row_pipeline, setup_dataframe, template_registry  # noqa: E402
+
+
+def dataframe_route(db_path: str, config_dict: dict, directory: str) -> int:
+    """
+    Helper function running the DataFrame route and saving every workbook
+    """
+
+    df = setup_dataframe.create_dataframe(db_path)
+    df = setup_dataframe.transform_header(df, mapping_dict=config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+    df = setup_dataframe.format_money_columns(df, config_dict.get("money_columns", []))
+
+    for output_name, workbook in template_registry.populate_templates(df, config_dict).items():
+        export_excel.save_workbook(workbook, f"{output_name}.xlsx", sheets_directory=directory)
+
+    return df.shape[0]
+
+
+def lean_route(db_path: str, config_dict: dict, directory: str) -> int:
+    """
+    Helper function running the row pipeline and saving the workbook
+    """
+
+    workbook, num_rows = row_pipeline.generate_lean(db_path, config_dict)
+    export_excel.save_workbook(workbook, "lean.xlsx", sheets_directory=directory)
+
+    return num_rows
+
+
+def timed_run(route, db_path: str, config_dict: dict) -> tuple:
+    """
+    Helper function running a route in the current process
+
+    Returns:
+        num_rows (int): number of rows written
+        seconds (float): wall time up to the saved workbook
+        peak_rss (int): peak resident memory of the process in bytes
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        num_rows = route(db_path, config_dict, directory)
+        seconds = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return num_rows, seconds, peak_rss
+
+
+def run_route(name: str, route, db_path: str, config_dict: dict, repeat: int) -> dict:
+    """
+    Runs a route repeatedly, each time in a new process
+
+    Args:
+        name (str): label of the route
+        route (callable): (db_path, config_dict, directory) -> number of rows
+        db_path (str): path to the SQLite database
+        config_dict (dict): loaded config.json
+        repeat (int): number of runs, the fastest time and the highest peak are reported
+
+    Returns:
+        result (dict): best time in seconds, peak resident bytes and row count
+    """
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for _ in range(repeat):
+        with context.Pool(1) as pool:
+            results.append(pool.apply(timed_run, (route, db_path, config_dict)))
+
+    return {"route": name, "rows": results[0][0], "seconds": min(result[1] for result in results),
+            "peak_rss": max(result[2] for result in results)}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="benchmark_row_pipeline.py")
+    parser.add_argument("--db", type=str, default=os.path.join(repo_dir, "data", "medical_data.db"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Templates in config.json are relative to the repository root
+    os.chdir(repo_dir)
+    with open("config.json", encoding="utf-8") as f:
+        config = json.load(f)
+
+    baseline = run_route("dataframe", dataframe_route, args.db, config, args.repeat)
+    lean = run_route("lean", lean_route, args.db, config, args.repeat)
+
+    print(f"{'route':<12}{'rows':>10}{'seconds':>12}{'peak RSS (MB)':>16}")
+    for result in (baseline, lean):
+        print(f"{result['route']:<12}{result['rows']:>10}{result['seconds']:>12.4f}"
+              f"{result['peak_rss'] / 1e6:>16.2f}")
+
+    print(f"\nTime saved:   {1 - lean['seconds'] / baseline['seconds']:.1%}")
+    print(f"Peak saved:   {1 - lean['peak_rss'] / baseline['peak_rss']:.1%}")
@@ -0,0 +1,115 @@
+"""
+Measures the startup cost of the main.py command line with `python -X importtime`.
+The script runs the command several times, reports the median total import time
+and the slowest imports, and exits with status 1 when the median exceeds the
+budget or when a heavy module is imported on the startup path.
+
+Run from the repository root:
+    python dev_scripts/benchmark_startup.py --budget-ms 60
+    python dev_scripts/benchmark_startup.py --args "-n bad_name"
+"""
+
+import argparse
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+
+repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Modules that must not be imported before the stage that needs them
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "pyarrow", "src.modify_excel")
+
+# Default budget for the total import time of `main.py --help`
+DEFAULT_BUDGET_MS = 60
+
+# Example line: "import time:       559 |      15580 | json"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Parses the `-X importtime` report written to stderr
+
+    Args:
+        stderr (str): stderr of a python process started with -X importtime
+
+    Returns:
+        report (dict): total import time in microseconds, cumulative time of every
+        imported module and the set of imported module names
+    """
+
+    modules = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+
+        cumulative_us = int(match.group(2))
+        indent = len(match.group(3))
+        name = match.group(4)
+        modules[name] = cumulative_us
+
+        # Top level imports are indented by a single space, nested imports by more
+        if indent == 1:
+            total_us += cumulative_us
+
+    return {"total_us": total_us, "modules": modules}
+
+
+def measure(cli_args: list, runs: int) -> list:
+    """
+    Runs main.py with -X importtime and returns one parsed report per run
+
+    Args:
+        cli_args (list): arguments passed to main.py
+        runs (int): number of runs
+
+    Returns:
+        reports (list): parsed reports from parse_importtime
+    """
+
+    reports = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "main.py", *cli_args],
+                                cwd=repo_dir, capture_output=True, text=True)
+        reports.append(parse_importtime(result.stderr))
+
+    return reports
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="benchmark_startup.py")
+    parser.add_argument("--args", type=str, default="--help", help="Arguments passed to main.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to print")
+    args = parser.parse_args()
+
+    reports = measure(shlex.split(args.args), args.runs)
+    median_ms = statistics.median(report["total_us"] for report in reports) / 1000
+
+    print(f"main.py {args.args}: median import time {median_ms:.1f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.1f} ms)\n")
+
+    slowest = sorted(reports[-1]["modules"].items(), key=lambda item: item[1], reverse=True)
+    for name, cumulative_us in slowest[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f} ms  {name}")
+
+    failed = False
+
+    heavy = sorted(name for name in reports[-1]["modules"]
+                   if any(name == module or name.startswith(module + ".") for module in HEAVY_MODULES))
+    if heavy:
+        print(f"\nHeavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+
+    if median_ms > args.budget_ms:
+        print(f"\nStartup budget exceeded: {median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
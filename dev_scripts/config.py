@@ -233,6 +233,8 @@ validation_format_dict3 = {
 
     "date_columns":["DATE OF BIRTH", "COVERAGE EXPIRATION DATE", "DATE OF SERVICE"],
 
+    "money_columns":["BILLED AMOUNT", "SPEND DOWN", "TPL AMOUNT"],
+
     "inserted_columns": {
     "GRAND TOTAL": 11, 
     "AMOUNT DUE": 12, 
@@ -243,7 +245,65 @@ validation_format_dict3 = {
     "NOTE": 20
     },
 
-    "unprotected_columns": ["AMOUNT DUE", "SPEND DOWN", "CONTRACTUAL ADJUSTMENT", "ADJUSTMENT REASON", "NOTE"]
+    "unprotected_columns": ["AMOUNT DUE", "SPEND DOWN", "CONTRACTUAL ADJUSTMENT", "ADJUSTMENT REASON", "NOTE"],
+
+    "extract_cache": {
+        "enabled": False,
+        "directory": "cache",
+        "ttl_seconds": 86400,
+        "check_source_marker": True
+    },
+
+    "save": {
+        "compresslevel": 6,
+        "workers": None
+    },
+
+    "templates": {
+        "MAP or COFA": {
+            "path": "CTS_Example_Template.xlsx",
+            "sheet": "MAP or COFA"
+        }
+    },
+
+    "sqlite": {
+        "read_only": True,
+        "immutable": False,
+        "mmap_size": 268435456,
+        "cache_size_kib": 65536
+    },
+
+    "row_pipeline": {
+        "workers": 1,
+        "block_size": 5000
+    },
+
+    "metrics": {
+        "json_log": "logs/generation_metrics.jsonl",
+        "prometheus_textfile": None
+    },
+    "row_capacity": {
+        "slack_rows": 50
+    },
+    "config_compiler": {
+        "cache_directory": "cache/plans"
+    },
+    "template_blob": {
+        "directory": "cache/templates"
+    },
+    "auto_tune": {
+        "profile": "cache/tuning_profile.json",
+        "sample_rows": 20000,
+        "block_sizes": [1000, 2500, 5000, 10000],
+        "overrides": {}
+    },
+    "memprofile": {
+        "directory": "logs/memprofile",
+        "top_sites": 15,
+        "frames": 1,
+        "baseline": None,
+        "max_regression": 10.0
+    }
 }
 
 # Get path to parent directory
@@ -1,58 +1,345 @@
-import sqlite3
+"""
+Generates a synthetic medical_data table for development and load testing.
+Columns are generated in vectorized form with NumPy from a seeded generator, so
+the same seed, row count and batch size always produce the same database.
+Claims are grouped by account: every account spans several consecutive claim
+lines that share the patient's name, birth date and Medicaid ID. Payers,
+procedure codes and names follow skewed distributions, and a small share of the
+Medicaid IDs, modifiers and coverage dates is deliberately invalid so that the
+template's data validation has something to flag.
+
+Run from the repository root:
+    python dev_scripts/generate_fake_database.py --rows 30 --db data/test_medical_data.db
+    python dev_scripts/generate_fake_database.py --rows 5000000 --seed 7 --db data/load_medical_data.db
+"""
+
+import argparse
 import os
+import sqlite3
+import time
+import sys
+import numpy as np
+
+# Allow importing src when running the script directly
+repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, repo_dir)
+
+CREATE_TABLE = '''
+CREATE TABLE medical_data (
+    control_account_number VARCHAR(20),
+    last_name VARCHAR(60),
+    first_name VARCHAR(35),
+    middle VARCHAR(25),
+    date_of_birth DATE,
+    medicaid_id VARCHAR(20),
+    coverage_expiration_date DATE,
+    date_of_service DATE,
+    cpt_hcpcs_dental_code VARCHAR(48),
+    service_code_modifier CHAR(3),
+    billed_amount MONEY,
+    spend_down MONEY,
+    tpl_amount MONEY,
+    tpl VARCHAR(60)
+);
+'''
+
+INSERT = "INSERT INTO medical_data VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+LAST_NAMES = np.array(["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+                       "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+                       "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson",
+                       "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker",
+                       "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores",
+                       "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell",
+                       "Carter", "Roberts", "O'Brien", "Van der Berg"], dtype=object)
+
+FIRST_NAMES = np.array(["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+                        "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+                        "Thomas", "Sarah", "Charles", "Karen", "Christopher", "Lisa", "Daniel", "Nancy",
+                        "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra", "Jose", "Maria",
+                        "Anne-Marie", "Jean Luc"], dtype=object)
+
+# Payer names with their share of claims, "None" means no third party liability
+PAYERS = np.array(["None", "Medicare", "Private Insurance", "Medicare Advantage", "Workers Compensation",
+                   "Auto Insurance"], dtype=object)
+PAYER_SHARES = np.array([0.55, 0.2, 0.15, 0.06, 0.025, 0.015])
+
+# Modifiers accepted by the template validation (two characters) and rejected ones
+VALID_MODIFIERS = np.array(["25", "59", "26", "TC", "GT", "LT", "RT", "GA", "76", "91"], dtype=object)
+INVALID_MODIFIERS = np.array(["MOD", "2-", "5", "X;"], dtype=object)
+
+
+def zipf_weights(size: int, exponent: float = 1.1) -> np.ndarray:
+    """
+    Returns normalized weights proportional to 1 / rank ** exponent, so that a few
+    values account for most rows as with real payers and procedure codes
+
+    Args:
+        size (int): number of values
+        exponent (float): skew of the distribution
+
+    Returns:
+        weights (np.ndarray): probabilities summing to one
+    """
+
+    weights = 1 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def build_code_pool(rng: np.random.Generator, size: int = 600) -> np.ndarray:
+    """
+    Builds a pool of procedure codes: five digit CPT codes, HCPCS codes (letter and
+    four digits) and dental codes (D and four digits)
+
+    Args:
+        rng (np.random.Generator): seeded generator
+        size (int): number of distinct codes
+
+    Returns:
+        codes (np.ndarray): shuffled codes, the first ones are the most frequent
+    """
+
+    num_cpt = size * 3 // 5
+    num_hcpcs = size // 5
+    num_dental = size - num_cpt - num_hcpcs
+
+    cpt = rng.choice(np.arange(10000, 100000), num_cpt, replace=False).astype(str)
+    hcpcs = np.char.add(rng.choice(list("ABEGHJKLQV"), num_hcpcs),
+                        np.char.zfill(rng.integers(0, 10000, num_hcpcs).astype(str), 4))
+    dental = np.char.add("D", np.char.zfill(rng.integers(0, 10000, num_dental).astype(str), 4))
+
+    codes = np.concatenate([cpt, hcpcs, dental]).astype(object)
+    rng.shuffle(codes)
+    return codes
+
+
+def format_dates(days: np.ndarray) -> np.ndarray:
+    """
+    Helper function converting day offsets from 1970-01-01 into ISO date strings
+    """
+
+    return days.astype("datetime64[D]").astype(str).astype(object)
+
+
+def digit_strings(rng: np.random.Generator, size: int, pattern: str) -> np.ndarray:
+    """
+    Draws random strings following a pattern where every 0 is replaced by a random
+    digit and other characters are kept, e.g. 00-000000-00. The strings are built
+    as a byte matrix, which is much faster than concatenating string arrays.
+
+    Args:
+        rng (np.random.Generator): seeded generator
+        size (int): number of strings
+        pattern (str): template of the strings
+
+    Returns:
+        strings (np.ndarray): object array of str
+    """
+
+    template = np.frombuffer(pattern.encode("ascii"), dtype=np.uint8)
+    matrix = np.broadcast_to(template, (size, len(template))).copy()
+
+    is_digit = template == ord("0")
+    matrix[:, is_digit] += rng.integers(0, 10, (size, int(is_digit.sum())), dtype=np.uint8)
+
+    return matrix.view(f"S{len(template)}").ravel().astype(str).astype(object)
+
+
+def build_account_lines(rng: np.random.Generator, num_rows: int, lines_per_account: float = 4.0) -> np.ndarray:
+    """
+    Assigns every claim line to an account. Accounts have at least two lines and
+    lines_per_account on average, and the lines of an account are consecutive.
+
+    Args:
+        rng (np.random.Generator): seeded generator
+        num_rows (int): number of claim lines
+        lines_per_account (float): average number of lines per account, at least 2
+
+    Returns:
+        account_lines (np.ndarray): account index of every claim line
+    """
+
+    if lines_per_account < 2:
+        raise ValueError(f"lines_per_account must be at least 2, got {lines_per_account}")
+
+    # Enough accounts to cover the rows, the last account is cut at num_rows
+    num_accounts = num_rows // 2 + 1
+    lengths = 2 + rng.poisson(lines_per_account - 2, num_accounts)
+    num_accounts = int(np.searchsorted(np.cumsum(lengths), num_rows)) + 1
+
+    return np.repeat(np.arange(num_accounts), lengths[:num_accounts])[:num_rows]
+
+
+def build_patient_pool(rng: np.random.Generator, size: int, invalid_share: float = 0.03) -> dict:
+    """
+    Draws the patient of every account: name, birth date and Medicaid ID
+
+    Args:
+        rng (np.random.Generator): seeded generator
+        size (int): number of accounts
+        invalid_share (float): share of patients with an invalid Medicaid ID
+
+    Returns:
+        patients (dict): column name -> np.ndarray indexed by account
+    """
+
+    last_name = LAST_NAMES[rng.choice(len(LAST_NAMES), size, p=zipf_weights(len(LAST_NAMES), 0.8))]
+    first_name = FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), size)]
+    middle = np.where(rng.random(size) < 0.3, None,
+                      np.array(list("ABCDEFGHIJKLMNOPRSTW"), dtype=object)[rng.integers(0, 20, size)])
+
+    # Birth dates between 1930 and 2020
+    birth_days = rng.integers(np.datetime64("1930-01-01", "D").astype(int),
+                              np.datetime64("2020-12-31", "D").astype(int), size)
+
+    # Medicaid IDs as 00-000000-00 or ten digits not starting with 0, some in a legacy format
+    id_kind = rng.random(size)
+    dashed = digit_strings(rng, size, "00-000000-00")
+    numeric = rng.integers(1000000000, 10000000000, size).astype(str).astype(object)
+    legacy = digit_strings(rng, size, "MED000000")
+    medicaid_id = np.where(id_kind < invalid_share, legacy,
+                           np.where(id_kind < 0.7, dashed, numeric))
+
+    return {"last_name": last_name, "first_name": first_name, "middle": middle,
+            "birth_days": birth_days, "medicaid_id": medicaid_id}
+
+
+def generate_batch(rng: np.random.Generator, accounts: np.ndarray, codes: np.ndarray, patients: dict,
+                   invalid_share: float = 0.03) -> list:
+    """
+    Generates one batch of claims
+
+    Args:
+        rng (np.random.Generator): seeded generator, advanced by the batch
+        accounts (np.ndarray): account index of every row, see build_account_lines
+        codes (np.ndarray): procedure code pool from build_code_pool
+        patients (dict): patient of every account from build_patient_pool
+        invalid_share (float): share of rows with an invalid modifier or coverage date
+
+    Returns:
+        rows (list): tuples in the column order of medical_data
+    """
+
+    size = len(accounts)
+    account = (1000000000 + accounts).astype(str).astype(object)
+    last_name = patients["last_name"][accounts]
+    first_name = patients["first_name"][accounts]
+    middle = patients["middle"][accounts]
+    birth_days = patients["birth_days"][accounts]
+    medicaid_id = patients["medicaid_id"][accounts]
+
+    # Services during 2024
+    service_days = rng.integers(np.datetime64("2024-01-01", "D").astype(int),
+                                np.datetime64("2024-12-31", "D").astype(int), size)
+
+    # Coverage usually ends after the service, an invalid share ends before it
+    coverage_offset = rng.integers(0, 730, size)
+    coverage_offset[rng.random(size) < invalid_share] *= -1
+    coverage_days = service_days + coverage_offset
+
+    code = codes[rng.choice(len(codes), size, p=zipf_weights(len(codes)))]
+
+    # Most claims have no modifier
+    modifier_kind = rng.random(size)
+    modifier = np.where(modifier_kind < 0.55, None,
+                        VALID_MODIFIERS[rng.choice(len(VALID_MODIFIERS), size, p=zipf_weights(len(VALID_MODIFIERS)))])
+    invalid = modifier_kind > 1 - invalid_share
+    modifier[invalid] = INVALID_MODIFIERS[rng.integers(0, len(INVALID_MODIFIERS), int(invalid.sum()))]
+
+    # Amounts in dollars rounded to cents, billed amounts are right skewed
+    billed = np.round(rng.lognormal(np.log(150), 0.9, size), 2)
+    spend_down = np.where(rng.random(size) < 0.2, np.round(billed * rng.uniform(0, 0.5, size), 2), 0.0)
+
+    payer = PAYERS[rng.choice(len(PAYERS), size, p=PAYER_SHARES)]
+    tpl_amount = np.where(payer == "None", 0.0, np.round((billed - spend_down) * rng.uniform(0, 0.8, size), 2))
+
+    columns = [account, last_name, first_name, middle, format_dates(birth_days), medicaid_id,
+               format_dates(coverage_days), format_dates(service_days), code, modifier,
+               billed.tolist(), spend_down.tolist(), tpl_amount.tolist(), payer]
+
+    return list(zip(*columns))
+
+
+def generate_database(database_path: str, num_rows: int, seed: int = 0, batch_size: int = 100000,
+                      transaction_rows: int = 1000000, lines_per_account: float = 4.0) -> None:
+    """
+    Creates the database and fills medical_data with synthetic claims
+
+    Args:
+        database_path (str): path of the SQLite database to create
+        num_rows (int): number of claims
+        seed (int): seed of the generator
+        batch_size (int): rows generated and inserted per executemany call
+        transaction_rows (int): rows inserted per transaction
+        lines_per_account (float): average number of claim lines per account
+    """
+
+    rng = np.random.default_rng(seed)
+    codes = build_code_pool(rng)
+    account_lines = build_account_lines(rng, num_rows, lines_per_account)
+    patients = build_patient_pool(rng, int(account_lines[-1]) + 1 if num_rows else 0)
+
+    connection = sqlite3.connect(database_path)
+    try:
+        # Throwaway data, so skip the rollback journal and fsyncs
+        connection.execute("PRAGMA journal_mode=OFF;")
+        connection.execute("PRAGMA synchronous=OFF;")
+        connection.execute(CREATE_TABLE)
+
+        uncommitted = 0
+        for start in range(0, num_rows, batch_size):
+            size = min(batch_size, num_rows - start)
+            connection.executemany(INSERT, generate_batch(rng, account_lines[start:start + size], codes, patients))
+
+            uncommitted += size
+            if uncommitted >= transaction_rows:
+                connection.commit()
+                uncommitted = 0
+
+        connection.commit()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="generate_fake_database.py")
+    parser.add_argument("--db", type=str, default=os.path.join(repo_dir, "data", "test_medical_data.db"))
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=100000)
+    parser.add_argument("--transaction-rows", type=int, default=1000000)
+    parser.add_argument("--lines-per-account", type=float, default=4.0,
+                        help="Average number of claim lines per account, at least 2")
+    parser.add_argument("--overwrite", action="store_true", help="Replace an existing database")
+    parser.add_argument("--create-indexes", action="store_true",
+                        help="Create the indexes recommended by src.index_advisor")
+    args = parser.parse_args()
+
+    print("\nDatabase Path:", args.db)
+
+    # check if database already exists
+    if os.path.exists(args.db) and not args.overwrite:
+        print("\nSQLite database already exists")
 
+    else:
+        if os.path.exists(args.db):
+            os.remove(args.db)
 
-# Go up one level from the current working directory
-parent_dir = os.path.abspath(os.path.join(os.getcwd(), '..'))
-database_path = os.path.join(parent_dir, 'data', 'test_medical_data.db')
-
-print("\nParent Directory:", parent_dir)
-print("\nDatabase Path:", database_path)
-
-# check if table already exists
-if not os.path.exists(database_path):
-
-    # Create a connection to a local SQLite database file
-    connection = sqlite3.connect(database_path)  # This will create 'medical_services.db' in your working directory
-    cursor = connection.cursor()
-
-    # Create the table
-    cursor.execute('''
-    CREATE TABLE medical_data (
-        control_account_number VARCHAR(20),
-        last_name VARCHAR(60),
-        first_name VARCHAR(35),
-        middle VARCHAR(25),
-        date_of_birth DATE,
-        medicaid_id VARCHAR(20),
-        coverage_expiration_date DATE,
-        date_of_service DATE,
-        cpt_hcpcs_dental_code VARCHAR(48),
-        service_code_modifier CHAR(3),
-        billed_amount MONEY,
-        spend_down MONEY,
-        tpl_amount MONEY,
-        tpl VARCHAR(60)
-    );
-    ''')
-
-    # Insert sample data
-    data = [
-        ('1234567890', 'Smith', 'John', 'A', '1980-01-01', 'MED123456', '2024-12-31', '2024-06-15', 'D1234', 'MOD1', 150.73, 50.00, 20.00, 'Private Insurance'),
-        ('0987654321', 'Doe', 'Jane', 'B', '1975-05-15', 'MED654321', '2024-11-30', '2024-06-20', 'C4567', 'MOD2', 200.23, 75.00, 30.00, 'Medicare'),
-        ('5678901234', 'Brown', 'Michael', 'C', '1990-09-20', 'MED789012', '2025-01-15', '2024-06-25', 'H7890', 'MOD3', 300.47, 100.00, 40.00, 'None')
-    ]
-
-    data = data * 10
-    
-    cursor.executemany("INSERT INTO medical_data VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", data)
-
-    # Save and close
-    connection.commit()
-    print("\nSQLite database created and populated!")
-    connection.close()
-
-else:
-    print("\nSQLite database already exists")
+        start_time = time.perf_counter()
+        generate_database(args.db, args.rows, args.seed, args.batch_size, args.transaction_rows,
+                          args.lines_per_account)
+        elapsed = time.perf_counter() - start_time
+        print(f"\nSQLite database created and populated with {args.rows} rows in {elapsed:.1f}s "
+              f"({args.rows / max(elapsed, 1e-9):,.0f} rows/s)")
 
+        if args.create_indexes:
+            from src import index_advisor
 
+            index_connection = sqlite3.connect(args.db)
+            try:
+                for entry in index_advisor.advise(index_connection, create=True):
+                    if entry["action"] == "created":
+                        print(f"Created index for {entry['name']}: {entry['statement']}")
+            finally:
+                index_connection.close()
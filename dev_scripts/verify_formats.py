@@ -0,0 +1,110 @@
+"""
+Verifies that export_excel.insert_into_template renders the same cell formats as
+the original insertion, which called get_format on every inserted cell. Both
+insertions run on the same extract, then the values of every cell are compared,
+and both saved packages are compared with src.workbook_equivalence, which covers
+the rendered cell formats. Exits with status 1 if any cell differs.
+
+Run from the repository root:
+    python dev_scripts/verify_formats.py --db data/medical_data.db
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tempfile
+
+# Allow importing src when running the script directly
+repo_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, repo_dir)
+
+import pandas as pd  # noqa: E402
+from src import export_excel, setup_dataframe, workbook_equivalence  # noqa: E402
+
+
+def insert_per_cell(final_df: pd.DataFrame, validation_format_dict: dict, workbook, sheet_name: str = "MAP or COFA"):
+    """
+    Reference insertion applying get_format to every inserted cell
+    """
+
+    sheet = workbook[sheet_name]
+
+    for col_name in final_df.columns:
+        col_letter = export_excel.get_column_letter(sheet, col_name)
+
+        for row_idx, value in enumerate(final_df[col_name], start=2):
+            cell = sheet[f"{col_letter}{row_idx}"]
+
+            if not cell.data_type == "f":
+                if value is pd.NA:
+                    value = None
+
+                cell.value = value
+                export_excel.get_format(cell, validation_format_dict, col_name)
+
+    return workbook
+
+
+def diff_values(sheet_a, sheet_b) -> list:
+    """
+    Helper function comparing the values of two sheets cell by cell
+    """
+
+    differences = []
+    for row_a, row_b in zip(sheet_a.iter_rows(), sheet_b.iter_rows()):
+        for cell_a, cell_b in zip(row_a, row_b):
+            if cell_a.value != cell_b.value:
+                differences.append((cell_a.coordinate, "value", cell_a.value, cell_b.value))
+
+    return differences
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="verify_formats.py")
+    parser.add_argument("--db", type=str, default=os.path.join(repo_dir, "data", "medical_data.db"))
+    parser.add_argument("--template", type=str, default=os.path.join(repo_dir, "CTS_Example_Template.xlsx"))
+    args = parser.parse_args()
+
+    with open(os.path.join(repo_dir, "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+
+    df = setup_dataframe.create_dataframe(args.db)
+    df = setup_dataframe.transform_header(df, mapping_dict=config["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config["date_columns"])
+
+    start = time.perf_counter()
+    reference = insert_per_cell(df, config["formatting"], export_excel.load_template(args.template))
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidate = export_excel.insert_into_template(df, config["formatting"],
+                                                  workbook=export_excel.load_template(args.template))
+    candidate_seconds = time.perf_counter() - start
+
+    reference_sheet = reference["MAP or COFA"]
+    candidate_sheet = candidate["MAP or COFA"]
+    differences = diff_values(reference_sheet, candidate_sheet)
+
+    # The saved packages carry the cell formats, data validation, conditional formatting and sheet protection
+    with tempfile.TemporaryDirectory() as directory:
+        reference_path = export_excel.save_workbook(reference, "reference.xlsx", sheets_directory=directory)
+        candidate_path = export_excel.save_workbook(candidate, "candidate.xlsx", sheets_directory=directory)
+        for sheet, location, attribute, value_a, value_b in workbook_equivalence.compare_workbooks(reference_path,
+                                                                                                   candidate_path):
+            differences.append((f"{sheet}!{location}", attribute, value_a, value_b))
+
+    print(f"Rows: {df.shape[0]}")
+    print(f"Per-cell formats:   {reference_seconds:.3f}s (includes loading the template)")
+    print(f"Column formats:     {candidate_seconds:.3f}s (includes loading the template)")
+
+    for coordinate, attribute, value_a, value_b in differences[:20]:
+        print(f"{coordinate:<10}{attribute:<15}{value_a!s:<40} != {value_b!s}")
+
+    if differences:
+        print(f"\n{len(differences)} differences found")
+        sys.exit(1)
+
+    print("\nValues and formats are identical")
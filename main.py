@@ -1,41 +1,242 @@
+import os
+import sys
 import json
 import argparse
 import datetime
-from src import export_excel, setup_dataframe
 
+# pandas, numpy and openpyxl are imported by the src modules. They are imported inside
+# main() at the stage that needs them so that --help and argument errors return quickly.
 
-def main(excel_file_name: str):
+
+def main(excel_file_name: str, dtype_backend: str = "numpy", use_cache: bool = None, refresh_cache: bool = False,
+         lean: bool = False, partition_by: str = None, manifest_path: str = None, output_format: str = "xlsx",
+         compression: str = None, use_profile: bool = True, selection: dict = None, memprofile: bool = False,
+         memprofile_baseline: str = None):
 
     # Loading configuration file with formatting parameters
     with open("config.json", encoding='utf-8') as f:
         config_dict =  json.load(f)
 
-    """Setting Up Dataframe"""
+    # Worker counts and block sizes measured on this machine by src.auto_tune
+    from src import auto_tune
+    config_dict = auto_tune.apply_profile(config_dict, use_profile)
+
+    # Every run reports its metrics, failed runs included
+    from src import run_metrics
+    metrics = run_metrics.RunMetrics(excel_file_name)
+
+    # Allocation profile around every stage, traced runs are several times slower
+    memprofile_config = config_dict.get("memprofile", {})
+    if memprofile:
+        from src import mem_profile
+        metrics.profiler = mem_profile.MemoryProfile(
+            excel_file_name, top_sites=memprofile_config.get("top_sites", mem_profile.DEFAULT_TOP_SITES),
+            frames=memprofile_config.get("frames", mem_profile.DEFAULT_FRAMES))
+        metrics.profiler.start()
+
+    try:
+        generate(excel_file_name, config_dict, metrics, dtype_backend, use_cache, refresh_cache, lean, partition_by,
+                 manifest_path, output_format, compression, selection)
+        metrics.status = "ok"
+    except Exception as e:
+        metrics.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        run_metrics.emit(metrics, config_dict.get("metrics", {}))
+
+        # A failing profile is reported without hiding the error of the run
+        if metrics.profiler is not None:
+            try:
+                metrics.profiler.stop()
+                report = metrics.profiler.report(metrics.counters["rows"], metrics.status)
+                report_path, comparison_path = mem_profile.save_run(report, memprofile_config, memprofile_baseline)
+            except Exception as profile_error:
+                print(f"Allocation profile not saved: {type(profile_error).__name__}: {profile_error}", file=sys.stderr)
+            else:
+                print(f"Allocation profile saved to {report_path}")
+                if comparison_path:
+                    print(f"Comparison with the baseline saved to {comparison_path}")
+
 
-    # Read in dataframe and format data
+def generate(excel_file_name: str, config_dict: dict, metrics, dtype_backend: str = "numpy", use_cache: bool = None,
+             refresh_cache: bool = False, lean: bool = False, partition_by: str = None, manifest_path: str = None,
+             output_format: str = "xlsx", compression: str = None, selection: dict = None):
+
+    save_config = config_dict.get("save", {})
     server_connection_string = "data/medical_data.db"
-    raw_dataframe = setup_dataframe.create_dataframe(server_connection_string)
 
-    # Rename the headers of the dataframe
-    renamed_headers = setup_dataframe.transform_header(raw_dataframe, mapping_dict=config_dict["database_fields_to_headers"])
+    """Compiling Configuration"""
+
+    # Check the configuration against the templates and the database before any data is read
+    with metrics.stage("config"):
+        from src import config_compiler
+        plan = config_compiler.load_plan(config_dict, server_connection_string)
+
+    # Stream the rows from the database into the only template of the registry without pandas
+    if lean:
+        from src import export_excel, row_pipeline, template_blob
+        template = config_compiler.lean_template(plan)
+
+        with metrics.stage("export"):
+            workbook, num_rows = row_pipeline.generate_lean(server_connection_string, config_dict, password="test",
+                                                            metrics=metrics, selection=selection,
+                                                            plan_template=template)
+        metrics.add("rows", num_rows)
+
+        if selection and num_rows == 0:
+            raise ValueError(f"No claims match the selection {selection}")
+
+        with metrics.stage("save"):
+            save_path = export_excel.save_workbook(workbook, excel_file_name,
+                                                   compresslevel=save_config.get("compresslevel", 6),
+                                                   workers=save_config.get("workers"),
+                                                   precompressed=template_blob.precompressed_parts(
+                                                       save_config.get("compresslevel", 6)))
+        metrics.add("files_written")
+        metrics.add("bytes_written", os.path.getsize(save_path))
+        return
+
+    """Setting Up Dataframe"""
+
+    with metrics.stage("setup"):
+
+        # Read in dataframe and format data
+        from src import extract_cache, setup_dataframe
+
+        # Look for a fresh copy of the normalized extract before querying the database
+        cache_config = config_dict.get("extract_cache", {})
+        if use_cache is None:
+            use_cache = cache_config.get("enabled", False)
+
+        final_df = None
+        if use_cache:
+            cache_dir = cache_config.get("directory", "cache")
+            key = extract_cache.cache_key(setup_dataframe.QUERY, {
+                "connection_string": server_connection_string,
+                "dtype_backend": dtype_backend,
+                "database_fields_to_headers": config_dict["database_fields_to_headers"],
+                "date_columns": config_dict["date_columns"],
+                "money_columns": config_dict.get("money_columns", []),
+                "selection": selection,
+            })
+            source_marker = None
+            if cache_config.get("check_source_marker", True):
+                source_marker = extract_cache.get_source_marker(server_connection_string)
+
+            if not refresh_cache:
+                final_df = extract_cache.load_extract(cache_dir, key, cache_config.get("ttl_seconds"), source_marker)
+
+            metrics.add("cache_hits" if final_df is not None else "cache_misses")
+
+        if final_df is None:
+            raw_dataframe = setup_dataframe.create_dataframe(server_connection_string, dtype_backend=dtype_backend,
+                                                             sqlite_profile=config_dict.get("sqlite"),
+                                                             selection=selection)
+
+            # Rename the headers of the dataframe
+            renamed_headers = setup_dataframe.transform_header(raw_dataframe, mapping_dict=config_dict["database_fields_to_headers"])
+
+            # Reformat the date columns
+            final_df = setup_dataframe.format_date_columns(renamed_headers, config_dict["date_columns"])
+
+            # Keep the amounts in int64 cents until they are written
+            final_df = setup_dataframe.format_money_columns(final_df, config_dict.get("money_columns", []))
+
+            if use_cache:
+                extract_cache.save_extract(final_df, cache_dir, key, source_marker, dtype_backend=dtype_backend)
+
+        # A targeted rerun that matches nothing is a mistake in the filters, not an empty sheet
+        if selection and final_df.shape[0] == 0:
+            raise ValueError(f"No claims match the selection {selection}")
 
-    # Reformat the date columns
-    final_df = setup_dataframe.format_date_columns(renamed_headers, config_dict["date_columns"])
+    """Batch of one file per partition"""
+
+    # Partitions completed by an earlier run of the batch are skipped
+    if partition_by:
+        from src import job_manifest
+
+        with metrics.stage("export"):
+            manifest = job_manifest.run_batch(final_df, config_dict, partition_by, excel_file_name[:-len(".xlsx")],
+                                              manifest_path=manifest_path, password="test", metrics=metrics,
+                                              plan=plan, selection=selection)
+
+        failed = [key for key, entry in manifest["partitions"].items() if entry["status"] == "failed"]
+        if failed:
+            raise ValueError(f"{len(failed)} partitions failed: {', '.join(failed)}. Rerun to resume the batch.")
+        return
+
+    metrics.add("rows", final_df.shape[0])
+
+    """Exporting CSV or Parquet"""
+
+    # Machine readable copy of the rows in the layout of every template, without building workbooks
+    if output_format != "xlsx":
+        from src import export_tabular
+
+        with metrics.stage("export"):
+            export_tabular.export_tables(final_df, config_dict, excel_file_name[:-len(".xlsx")], output_format,
+                                         compression, plan=plan, metrics=metrics)
+        return
 
     """Exporting Excel"""
 
-    # Get number of samples from query
-    num_rows = final_df.shape[0]
+    from src import export_excel, template_blob, template_registry
+
+    # Route the rows to the registered templates, ingest the data and apply protection to every sheet
+    with metrics.stage("export"):
+        password = "test"
+        workbooks = template_registry.populate_templates(final_df, config_dict, password, metrics=metrics, plan=plan)
+
+    # Save Workbooks, suffixed with the template name when there are several
+    with metrics.stage("save"):
+        for output_name, workbook in workbooks.items():
+            workbook_name = excel_file_name
+            if len(workbooks) > 1:
+                workbook_name = excel_file_name.replace(".xlsx", f"_{output_name}.xlsx")
+
+            save_path = export_excel.save_workbook(workbook, workbook_name,
+                                                   compresslevel=save_config.get("compresslevel", 6),
+                                                   workers=save_config.get("workers"),
+                                                   precompressed=template_blob.precompressed_parts(
+                                                       save_config.get("compresslevel", 6)))
+            metrics.add("files_written")
+            metrics.add("bytes_written", os.path.getsize(save_path))
+
+
+def parse_date(text: str) -> datetime.date:
+    """
+    Parses a YYYY-MM-DD command line date
+
+    Args:
+        text (str): command line value
 
-    # Ingest Data into spreadsheet
-    workbook = export_excel.insert_into_template(final_df, validation_format_dict=config_dict["formatting"])
+    Returns:
+        date (datetime.date): parsed date
+    """
 
-    # Apply protection to sheet
-    password = "test"
-    export_excel.protection_handler(workbook, config_dict["unprotected_columns"], password, num_rows)
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a date formatted as YYYY-MM-DD")
+
+
+def parse_shard(text: str) -> list:
+    """
+    Parses a command line shard such as 2/8, the second of eight shards
+
+    Args:
+        text (str): command line value
+
+    Returns:
+        shard (list): [n, m] with 1 <= n <= m
+    """
+
+    shard, _, num_shards = text.partition("/")
+    if not (shard.isdigit() and num_shards.isdigit() and 1 <= int(shard) <= int(num_shards)):
+        raise argparse.ArgumentTypeError(f"'{text}' is not a shard N/M with 1 <= N <= M")
+
+    return [int(shard), int(num_shards)]
 
-    # Save Workbook
-    export_excel.save_workbook(workbook, excel_file_name)
 
 if __name__ == "__main__":
 
@@ -45,9 +246,70 @@ if __name__ == "__main__":
     # Define parser and arguments
     parser = argparse.ArgumentParser(prog="main.py")
     parser.add_argument("-n", "--name", type=str, help="Specify name of the excel file", required=False)
+    parser.add_argument("--dtype-backend", choices=["numpy", "pyarrow"], default="numpy",
+                        help="Column backend used when reading the query results")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=None,
+                        help="Reuse a cached copy of the extract (defaults to extract_cache.enabled in config.json)")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="Re-query the database and overwrite the cached extract")
+    parser.add_argument("--lean", action="store_true",
+                        help="Stream rows into the template without pandas (one unrouted template only, ignores the cache)")
+
+    parser.add_argument("--partition-by", type=str, metavar="HEADER",
+                        help="Write one file per value of the column, resuming the batch recorded in the manifest")
+    parser.add_argument("--manifest", type=str,
+                        help="Job manifest of the batch (defaults to generated_sheets/<name>.manifest.json)")
+
+    parser.add_argument("--format", choices=["xlsx", "csv", "parquet"], default="xlsx", dest="output_format",
+                        help="Write the rows as a workbook, or as CSV or Parquet in the column layout of the template")
+    parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none",
+                        help="Compression of the CSV stream or Parquet pages (zstd and Parquet need pyarrow)")
+    parser.add_argument("--no-profile", action="store_false", dest="use_profile",
+                        help="Ignore the tuning profile written by src.auto_tune (auto_tune.overrides still apply)")
+
+    parser.add_argument("--memprofile", action="store_true",
+                        help="Profile the allocations of every stage with tracemalloc (see memprofile in config.json)")
+    parser.add_argument("--memprofile-baseline", type=str, metavar="REPORT",
+                        help="Allocation report to compare the profile with (defaults to the latest report)")
+
+    # Selection of the claims to regenerate, the filters are combined with AND
+    parser.add_argument("--account", nargs="+", action="extend", dest="accounts", metavar="ID",
+                        help="Only the claims of these control/account numbers")
+    parser.add_argument("--accounts-file", type=str, metavar="PATH",
+                        help="Only the claims of the control/account numbers listed one per line in the file")
+    parser.add_argument("--service-from", type=parse_date, metavar="YYYY-MM-DD",
+                        help="Only the claims with a date of service on or after this date")
+    parser.add_argument("--service-to", type=parse_date, metavar="YYYY-MM-DD",
+                        help="Only the claims with a date of service on or before this date")
+    parser.add_argument("--payer", nargs="+", action="extend", dest="payers", metavar="TPL",
+                        help="Only the claims of these payers (TPL column)")
+    parser.add_argument("--shard", type=parse_shard, metavar="N/M",
+                        help="Only the claims whose account number hashes into shard N of M")
 
     args = parser.parse_args()
 
+    if args.output_format != "xlsx" and (args.lean or args.partition_by):
+        parser.error("--format csv and parquet cannot be combined with --lean or --partition-by")
+    if args.output_format == "xlsx" and args.compression != "none":
+        parser.error("--compression applies to --format csv and parquet")
+    if args.service_from and args.service_to and args.service_from > args.service_to:
+        parser.error("--service-from must not be after --service-to")
+    if args.memprofile_baseline and not args.memprofile:
+        parser.error("--memprofile-baseline requires --memprofile")
+
+    if args.accounts_file:
+        with open(args.accounts_file, encoding="utf-8") as accounts_file:
+            args.accounts = (args.accounts or []) + [line.strip() for line in accounts_file if line.strip()]
+
+    claim_selection = {
+        "accounts": args.accounts,
+        "service_from": args.service_from.isoformat() if args.service_from else None,
+        "service_to": args.service_to.isoformat() if args.service_to else None,
+        "payers": args.payers,
+        "shard": args.shard,
+    }
+    claim_selection = {key: value for key, value in claim_selection.items() if value is not None} or None
+
     # Use defined command line name if defined, else use default
     if args.name:
         file_name = args.name
@@ -58,4 +320,7 @@ if __name__ == "__main__":
     else:
         file_name = default_file_name + ".xlsx"
 
-    main(file_name)
+    main(file_name, dtype_backend=args.dtype_backend, use_cache=args.cache, refresh_cache=args.refresh_cache, lean=args.lean,
+         partition_by=args.partition_by, manifest_path=args.manifest, output_format=args.output_format,
+         compression=None if args.compression == "none" else args.compression, use_profile=args.use_profile,
+         selection=claim_selection, memprofile=args.memprofile, memprofile_baseline=args.memprofile_baseline)
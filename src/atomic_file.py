@@ -0,0 +1,102 @@
+"""
+Module: atomic_file
+Description: This module moves files into place atomically. Every output of the
+             project (workbooks, exports, manifests, caches, profiles, reports) is
+             written to a unique temporary file next to its destination, given the
+             permissions a plain open would give, and then renamed over the
+             destination or linked to it when an existing file must not be replaced.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import tempfile
+import contextlib
+
+
+def current_umask() -> int:
+    """
+    Returns the umask of the process. The umask can only be read by setting it,
+    so it is set and restored right away.
+
+    Returns:
+        umask (int): permission bits removed from new files
+    """
+
+    umask = os.umask(0o077)
+    os.umask(umask)
+    return umask
+
+
+def _fsync(path: str) -> None:
+    """
+    Helper function flushing a written file to disk
+    """
+
+    file_descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
+
+def _link_new(temp_path: str, path: str) -> None:
+    """
+    Helper function linking the temporary file to a destination that must not exist.
+    Linking fails if the destination exists, so two writers can never overwrite
+    each other.
+    """
+
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        raise FileExistsError(f'The file already exists: {path}') from None
+    except OSError:
+        # File systems without hard links: fall back to a checked rename
+        if os.path.exists(path):
+            raise FileExistsError(f'The file already exists: {path}')
+        os.replace(temp_path, path)
+
+
+@contextlib.contextmanager
+def atomic_path(path: str, overwrite: bool = True, durable: bool = False):
+    """
+    Yields a unique temporary path next to the destination. When the block exits
+    without an error the temporary file is moved to the destination, otherwise it
+    is removed, so readers only ever see the previous or the complete new file.
+
+    Args:
+        path (str): destination of the file, its directory is created if needed
+        overwrite (bool): replace an existing destination, or raise FileExistsError
+        durable (bool): flush the file to disk before it is moved into place
+
+    Yields:
+        temp_path (str): path the caller writes the file to
+
+    Raises:
+        FileExistsError: if overwrite is False and the destination already exists
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp",
+                                                  dir=directory)
+    os.close(file_descriptor)
+
+    try:
+        yield temp_path
+
+        # mkstemp creates owner-only files, use the permissions open would give
+        os.chmod(temp_path, 0o666 & ~current_umask())
+        if durable:
+            _fsync(temp_path)
+
+        if overwrite:
+            os.replace(temp_path, path)
+        else:
+            _link_new(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
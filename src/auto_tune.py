@@ -0,0 +1,410 @@
+"""
+Module: auto_tune
+Description: This module tunes the chunk sizes and worker counts of the generation to the
+             machine and the data. A sample of the claims query (the first rows, read
+             with LIMIT) is copied into a temporary database and short calibration
+             passes are run on it for every candidate setting:
+                save.workers: compression threads, timed on the DataFrame route
+                              (create_dataframe, insert_into_template, save)
+                row_pipeline.workers and row_pipeline.block_size: rendering processes
+                              and rows per block, timed on the lean route
+
+             Every pass runs in a fresh process so that the peak memory of one
+             candidate does not hide another's. The fastest candidate within the
+             memory limit is written to a local profile that later runs of main.py
+             and the worker apply on top of config.json. A profile is only applied on
+             the machine it was measured on.
+
+             Settings under "auto_tune" in config.json:
+                profile: path of the tuning profile, null to never apply a profile
+                sample_rows: rows of the query used for calibration
+                block_sizes: candidate rows per block of the lean route
+                overrides: settings applied after the profile, e.g.
+                           {"row_pipeline": {"workers": 2}}
+
+             Usage:
+                python -m src.auto_tune --db data/medical_data.db
+                python main.py --no-profile
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import io
+import os
+import sys
+import copy
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+# Profile format version
+PROFILE_VERSION = 1
+
+# Defaults of the "auto_tune" settings
+DEFAULT_PROFILE = "cache/tuning_profile.json"
+DEFAULT_SAMPLE_ROWS = 20000
+DEFAULT_BLOCK_SIZES = (1000, 2500, 5000, 10000)
+
+# Sections of config.json a profile can change
+TUNED_SETTINGS = ("row_pipeline", "save")
+
+
+def machine_id() -> dict:
+    """
+    Describes the machine a profile is measured on
+
+    Returns:
+        machine (dict): host name and cpu count
+    """
+
+    return {"host": socket.gethostname(), "cpu_count": os.cpu_count()}
+
+
+def worker_candidates(cpu_count: int = None) -> list:
+    """
+    Returns the worker counts to calibrate: 1, the powers of two below the cpu
+    count and the cpu count
+
+    Args:
+        cpu_count (int): number of cores, defaults to os.cpu_count()
+
+    Returns:
+        candidates (list): increasing worker counts
+    """
+
+    cpu_count = cpu_count or os.cpu_count() or 1
+
+    candidates = [1]
+    while candidates[-1] * 2 < cpu_count:
+        candidates.append(candidates[-1] * 2)
+    if cpu_count > 1:
+        candidates.append(cpu_count)
+
+    return candidates
+
+
+def sample_database(connection_string: str, sample_path: str, sample_rows: int, table: str = "medical_data",
+                    sqlite_profile: dict = None) -> int:
+    """
+    Copies the first rows of the claims table into a new database with the same
+    table definition
+
+    Args:
+        connection_string (str): path to the SQLite database
+        sample_path (str): path of the sample database to create
+        sample_rows (int): number of rows to copy
+        table (str): table the extract is read from
+        sqlite_profile (dict): connection settings of the source, see setup_dataframe.connect_sqlite
+
+    Returns:
+        num_rows (int): number of rows copied
+    """
+
+    from src.setup_dataframe import connect_sqlite
+
+    source = connect_sqlite(connection_string, sqlite_profile)
+    try:
+        schema, = source.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                                 (table,)).fetchone()
+        cursor = source.execute(f"SELECT * FROM {table} LIMIT ?;", (sample_rows,))
+
+        with sqlite3.connect(sample_path) as sample:
+            sample.execute(schema)
+            placeholders = ", ".join("?" * len(cursor.description))
+            sample.executemany(f"INSERT INTO {table} VALUES ({placeholders});", cursor)
+            num_rows, = sample.execute(f"SELECT COUNT(*) FROM {table};").fetchone()
+        sample.close()
+    finally:
+        source.close()
+
+    return num_rows
+
+
+def _peak_rss() -> int:
+    """
+    Helper function returning the peak resident memory of the process plus that of
+    its largest child process in bytes
+    """
+
+    from src.run_metrics import get_peak_rss
+
+    return get_peak_rss(children=True)
+
+
+def calibrate(route: str, sample_path: str, config_dict: dict, repeat: int = 2) -> dict:
+    """
+    Runs one calibration pass of a route on the sample database in this process.
+    The package is written to memory, nothing is saved.
+
+    Args:
+        route (str): "dataframe" or "lean"
+        sample_path (str): path of the sample database
+        config_dict (dict): config.json with the candidate settings
+        repeat (int): number of timed runs, the fastest one is reported
+
+    Returns:
+        result (dict): rows, seconds, rows_per_second and peak_rss of the pass
+    """
+
+    from src import row_pipeline, setup_dataframe, template_registry, xlsx_package
+
+    save_config = config_dict.get("save", {})
+
+    def run():
+        if route == "dataframe":
+            df = setup_dataframe.create_dataframe(sample_path, sqlite_profile=config_dict.get("sqlite"))
+            df = setup_dataframe.transform_header(df, mapping_dict=config_dict["database_fields_to_headers"])
+            df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+            df = setup_dataframe.format_money_columns(df, config_dict.get("money_columns", []))
+            workbooks = template_registry.populate_templates(df, config_dict)
+            num_rows = df.shape[0]
+        else:
+            workbook, num_rows = row_pipeline.generate_lean(sample_path, config_dict)
+            workbooks = {"lean": workbook}
+
+        for workbook in workbooks.values():
+            with xlsx_package.spool_workbook(workbook) as parts:
+                xlsx_package.write_package(parts, io.BytesIO(), compresslevel=save_config.get("compresslevel", 6),
+                                           workers=save_config.get("workers"))
+        return num_rows
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        num_rows = run()
+        timings.append(time.perf_counter() - start)
+
+    seconds = min(timings)
+    return {"rows": num_rows, "seconds": seconds, "rows_per_second": num_rows / seconds, "peak_rss": _peak_rss()}
+
+
+def run_candidate(route: str, sample_path: str, config_dict: dict, settings: dict, repeat: int = 2) -> dict:
+    """
+    Runs a calibration pass in a fresh process with the candidate settings applied
+
+    Args:
+        route (str): "dataframe" or "lean"
+        sample_path (str): path of the sample database
+        config_dict (dict): loaded config.json
+        settings (dict): candidate settings, e.g. {"save": {"workers": 2}}
+        repeat (int): number of timed runs
+
+    Returns:
+        result (dict): route, settings and the measurements of calibrate
+    """
+
+    candidate = merge_settings(config_dict, settings)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(candidate, f)
+        config_path = f.name
+
+    try:
+        completed = subprocess.run([sys.executable, "-m", "src.auto_tune", "--calibrate", route, sample_path,
+                                    config_path, "--repeat", str(repeat)],
+                                   capture_output=True, text=True, check=True)
+    finally:
+        os.remove(config_path)
+
+    # The measurement is the last line, populate and save print above it
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return dict(result, route=route, settings=settings)
+
+
+def best_result(results: list, max_memory: int = None) -> dict:
+    """
+    Returns the fastest result within the memory limit. If no candidate fits, the
+    one with the smallest peak memory is returned.
+
+    Args:
+        results (list): results of run_candidate
+        max_memory (int): limit of the peak resident memory in bytes, None for no limit
+
+    Returns:
+        result (dict): chosen result
+    """
+
+    fitting = [result for result in results
+               if max_memory is None or result["peak_rss"] is None or result["peak_rss"] <= max_memory]
+    if not fitting:
+        return min(results, key=lambda result: result["peak_rss"])
+
+    return max(fitting, key=lambda result: result["rows_per_second"])
+
+
+def merge_settings(config_dict: dict, settings: dict) -> dict:
+    """
+    Returns a copy of the configuration with the sections of settings updated
+
+    Args:
+        config_dict (dict): loaded config.json
+        settings (dict): section -> key -> value
+
+    Returns:
+        merged (dict): updated copy of config_dict
+    """
+
+    merged = copy.deepcopy(config_dict)
+    for section, values in settings.items():
+        merged[section] = dict(merged.get(section) or {}, **values)
+
+    return merged
+
+
+def tune(connection_string: str, config_dict: dict, sample_rows: int = None, block_sizes: list = None,
+         worker_counts: list = None, max_memory: int = None, repeat: int = 2, log=print) -> dict:
+    """
+    Calibrates the compression threads on the DataFrame route, then the rendering
+    processes and block size on the lean route with the chosen threads
+
+    Args:
+        connection_string (str): path to the SQLite database
+        config_dict (dict): loaded config.json, without a profile applied (see apply_profile)
+        sample_rows (int): rows of the query used for calibration, defaults to auto_tune.sample_rows
+        block_sizes (list): candidate rows per block, defaults to auto_tune.block_sizes
+        worker_counts (list): candidate worker counts, defaults to worker_candidates()
+        max_memory (int): limit of the peak resident memory in bytes
+        repeat (int): timed runs per candidate
+        log (callable): receives a line per measured candidate
+
+    Returns:
+        profile (dict): tuning profile, see write_profile
+    """
+
+    tune_config = config_dict.get("auto_tune", {})
+    sample_rows = sample_rows or tune_config.get("sample_rows", DEFAULT_SAMPLE_ROWS)
+    block_sizes = block_sizes or tune_config.get("block_sizes", DEFAULT_BLOCK_SIZES)
+    worker_counts = worker_counts or worker_candidates()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sample_path = os.path.join(directory, "sample.db")
+        num_rows = sample_database(connection_string, sample_path, sample_rows,
+                                   sqlite_profile=config_dict.get("sqlite"))
+
+        def measure(route, settings):
+            result = run_candidate(route, sample_path, config_dict, settings, repeat)
+            peak = f"{result['peak_rss'] / 1e6:.0f} MB" if result["peak_rss"] is not None else "n/a"
+            log(f"{route:<10}{json.dumps(settings):<80}{result['rows_per_second']:>12.0f} rows/s{peak:>10}")
+            return result
+
+        save_results = [measure("dataframe", {"save": {"workers": workers}}) for workers in worker_counts]
+        save_settings = best_result(save_results, max_memory)["settings"]
+
+        lean_results = [measure("lean", dict(save_settings, row_pipeline={"workers": workers,
+                                                                          "block_size": block_size}))
+                        for workers in worker_counts for block_size in block_sizes]
+        lean_settings = best_result(lean_results, max_memory)["settings"]
+
+    return {
+        "version": PROFILE_VERSION,
+        "machine": machine_id(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sample_rows": num_rows,
+        "max_memory": max_memory,
+        "settings": {section: lean_settings[section] for section in TUNED_SETTINGS},
+        "results": save_results + lean_results,
+    }
+
+
+def write_profile(profile: dict, profile_path: str) -> None:
+    """
+    Writes the profile next to its destination and renames it, see atomic_file
+
+    Args:
+        profile (dict): result of tune
+        profile_path (str): path of the profile, its directory is created if needed
+    """
+
+    from src import atomic_file
+
+    with atomic_file.atomic_path(profile_path) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=4)
+
+
+def load_profile(profile_path: str) -> dict:
+    """
+    Loads a tuning profile measured on this machine
+
+    Args:
+        profile_path (str): path of the profile
+
+    Returns:
+        profile (dict): loaded profile, None if it does not exist, has another version
+                        or was measured on another machine
+    """
+
+    if not profile_path or not os.path.exists(profile_path):
+        return None
+
+    with open(profile_path, encoding="utf-8") as f:
+        profile = json.load(f)
+
+    if profile.get("version") != PROFILE_VERSION or profile.get("machine") != machine_id():
+        return None
+
+    return profile
+
+
+def apply_profile(config_dict: dict, use_profile: bool = True) -> dict:
+    """
+    Applies the tuning profile and then auto_tune.overrides on top of config.json
+
+    Args:
+        config_dict (dict): loaded config.json
+        use_profile (bool): False to skip the profile, the overrides still apply
+
+    Returns:
+        config_dict (dict): configuration with the tuned settings
+    """
+
+    tune_config = config_dict.get("auto_tune", {})
+
+    settings = {}
+    if use_profile:
+        profile = load_profile(tune_config.get("profile", DEFAULT_PROFILE))
+        if profile is not None:
+            settings = profile["settings"]
+
+    config_dict = merge_settings(config_dict, settings)
+    return merge_settings(config_dict, tune_config.get("overrides", {}))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.auto_tune")
+    parser.add_argument("--db", type=str, default="data/medical_data.db", help="Database to sample")
+    parser.add_argument("--config", type=str, default="config.json")
+    parser.add_argument("--sample-rows", type=int, help="Rows of the query used for calibration")
+    parser.add_argument("--block-sizes", type=int, nargs="+", help="Candidate rows per block")
+    parser.add_argument("--workers", type=int, nargs="+", help="Candidate worker counts")
+    parser.add_argument("--max-memory-mb", type=float, help="Skip candidates whose peak memory exceeds this")
+    parser.add_argument("--repeat", type=int, default=2, help="Timed runs per candidate")
+    parser.add_argument("--profile", type=str, help="Profile to write (defaults to auto_tune.profile)")
+    parser.add_argument("--calibrate", nargs=3, metavar=("ROUTE", "SAMPLE_DB", "CONFIG"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Calibration pass of run_candidate
+    if args.calibrate:
+        calibrate_route, calibrate_db, calibrate_config = args.calibrate
+        with open(calibrate_config, encoding="utf-8") as config_file:
+            candidate_config = json.load(config_file)
+        print(json.dumps(calibrate(calibrate_route, calibrate_db, candidate_config, args.repeat)))
+        sys.exit(0)
+
+    with open(args.config, encoding="utf-8") as config_file:
+        base_config = json.load(config_file)
+
+    max_memory_bytes = int(args.max_memory_mb * 1e6) if args.max_memory_mb else None
+    tuned = tune(args.db, base_config, args.sample_rows, args.block_sizes, args.workers, max_memory_bytes,
+                 args.repeat)
+
+    output_path = args.profile or base_config.get("auto_tune", {}).get("profile", DEFAULT_PROFILE)
+    write_profile(tuned, output_path)
+    print(f"Tuned settings {json.dumps(tuned['settings'])} saved to {output_path}")
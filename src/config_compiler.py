@@ -0,0 +1,319 @@
+"""
+Module: config_compiler
+Description: This module compiles config.json into a generation plan before any data is
+             read. Every cross reference of the configuration is checked against the
+             template sheets and the columns of the claims table:
+                database fields exist in the table, mapped headers exist in every
+                template sheet, date and money columns are mapped headers, formatting,
+                unprotected and inserted columns exist in the templates, routes name a
+                mapped header and a single predicate, no two templates populate the
+                same sheet or share an output name, numeric settings are in range
+
+             All problems are collected and raised together as one ValueError. The
+             plan resolves every header to its template column and holds the compiled
+             layout and formatting of every template sheet, which populate_templates
+             and the lean writer use instead of resolving the headers again. Plans are cached on disk keyed by the
+             hashes of the configuration, the template files and the table columns,
+             so a valid configuration is only resolved again when one of them changes.
+
+             Settings under "config_compiler" in config.json:
+                cache_directory: directory of the compiled plans, null to disable
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import json
+import hashlib
+from src import atomic_file, export_excel, template_registry
+from src.setup_dataframe import connect_sqlite
+
+# Plan format version, part of the cache key
+PLAN_VERSION = 1
+
+# Horizontal alignments accepted by openpyxl
+ALIGNMENTS = ("general", "left", "center", "right", "fill", "justify", "centerContinuous", "distributed")
+
+# Route predicates understood by template_registry.route_mask
+ROUTE_PREDICATES = ("equals", "in", "not_in")
+
+# Settings that must be positive integers, (section, key, minimum)
+INTEGER_SETTINGS = (
+    ("row_capacity", "slack_rows", 0),
+    ("row_pipeline", "workers", 1),
+    ("row_pipeline", "block_size", 1),
+    ("save", "compresslevel", 0),
+)
+
+
+def database_columns(connection_string: str, table: str = "medical_data", sqlite_profile: dict = None) -> list:
+    """
+    Returns the column names of the claims table
+
+    Args:
+        connection_string (str): path to the SQLite database
+        table (str): table the extract is read from
+        sqlite_profile (dict): connection settings, see setup_dataframe.connect_sqlite
+
+    Returns:
+        columns (list): column names in table order, empty if the table does not exist
+    """
+
+    connection = connect_sqlite(connection_string, sqlite_profile)
+    try:
+        return [row[1] for row in connection.execute(f"PRAGMA table_info({table});")]
+    finally:
+        connection.close()
+
+
+def plan_key(config_dict: dict, columns: list = None) -> str:
+    """
+    Builds the cache key of a plan from the configuration, the content of the
+    template files and the table columns
+
+    Args:
+        config_dict (dict): loaded config.json
+        columns (list): columns of the claims table, None if not checked
+
+    Returns:
+        key (str): hex digest identifying the plan
+    """
+
+    digest = hashlib.sha256(f"{PLAN_VERSION}".encode("utf-8"))
+    digest.update(json.dumps(config_dict, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(json.dumps(columns).encode("utf-8"))
+
+    templates = config_dict.get("templates", template_registry.DEFAULT_TEMPLATES)
+    for template_path in sorted({template["path"] for template in templates.values()}):
+        if os.path.exists(template_path):
+            with open(template_path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+def _check_settings(config_dict: dict, errors: list) -> None:
+    """
+    Helper function checking the settings that do not depend on the templates
+    """
+
+    for key in ("formatting", "database_fields_to_headers", "date_columns", "unprotected_columns"):
+        if key not in config_dict:
+            errors.append(f"Missing setting: {key}")
+
+    mapped_headers = set(config_dict.get("database_fields_to_headers", {}).values())
+    for header in config_dict.get("date_columns", []):
+        if header not in mapped_headers:
+            errors.append(f"Date column: {header} is not a mapped header")
+    for header in config_dict.get("money_columns", []):
+        if header not in mapped_headers:
+            errors.append(f"Money column: {header} is not a mapped header")
+
+    for header, format_rules in config_dict.get("formatting", {}).items():
+        alignment = format_rules.get("alignment")
+        if alignment is not None and alignment not in ALIGNMENTS:
+            errors.append(f"Formatting of {header}: alignment {alignment} is not one of {', '.join(ALIGNMENTS)}")
+
+    for section, key, minimum in INTEGER_SETTINGS:
+        value = config_dict.get(section, {}).get(key)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < minimum):
+            errors.append(f"Setting {section}.{key} must be an integer of at least {minimum}, got {value!r}")
+
+    templates = config_dict.get("templates", template_registry.DEFAULT_TEMPLATES)
+    errors.extend(template_registry.duplicate_templates(templates))
+
+    defaults = [name for name, template in templates.items() if template.get("default", False)]
+    if len(defaults) > 1:
+        errors.append(f"Only one template can be the default, found {', '.join(defaults)}")
+
+    for name, template in templates.items():
+        route = template.get("route")
+        if route is None:
+            continue
+        if route.get("column") not in mapped_headers:
+            errors.append(f"Route of template {name}: column {route.get('column')} is not a mapped header")
+        predicates = [predicate for predicate in ROUTE_PREDICATES if predicate in route]
+        if len(predicates) != 1:
+            errors.append(f"Route of template {name} needs exactly one of {', '.join(ROUTE_PREDICATES)}")
+
+
+def _compile_template(name: str, template: dict, config_dict: dict, errors: list) -> dict:
+    """
+    Helper function checking the headers of the configuration against a template
+    sheet and resolving them to its columns. Returns None if the sheet cannot be read.
+    """
+
+    template_path = template.get("path")
+    sheet_name = template.get("sheet", "MAP or COFA")
+
+    if template_path is None or not os.path.exists(template_path):
+        errors.append(f"Template {name}: file {template_path} does not exist")
+        return None
+
+    workbook = export_excel.load_template(template_path)
+    if sheet_name not in workbook.sheetnames:
+        errors.append(f"Template {name}: sheet {sheet_name} not found in {template_path}")
+        return None
+
+    # Unprotected columns are checked below with the other headers
+    unprotected_columns = config_dict.get("unprotected_columns", [])
+    layout = template_registry.get_layout(workbook, template_path, sheet_name, [])
+    headers = layout["headers"]
+
+    def check(kind, header):
+        if header not in headers:
+            errors.append(f"Template {name}: {kind} {header} not found in sheet {sheet_name}")
+            return False
+        return True
+
+    for header in config_dict.get("database_fields_to_headers", {}).values():
+        check("mapped header", header)
+    for header in unprotected_columns:
+        check("unprotected column", header)
+
+    formatting = {}
+    for header, format_rules in config_dict.get("formatting", {}).items():
+        if check("formatted column", header):
+            formatting[header] = {
+                "column": headers[header],
+                "style_format": format_rules.get("style_format"),
+                "alignment": format_rules.get("alignment"),
+            }
+
+    # Inserted columns are zero-based positions of the headers
+    sheet = workbook[sheet_name]
+    for header, position in config_dict.get("inserted_columns", {}).items():
+        if check("inserted column", header) and sheet.cell(row=1, column=position + 1).value != header:
+            errors.append(f"Template {name}: inserted column {header} is not at position {position}")
+
+    return {
+        "path": template_path,
+        "sheet": sheet_name,
+        "route": template.get("route"),
+        "default": template.get("default", False),
+        "layout": dict(layout, unlock_columns=[headers[header] for header in unprotected_columns
+                                               if header in headers]),
+        "formatting": formatting,
+    }
+
+
+def compile_config(config_dict: dict, columns: list = None) -> dict:
+    """
+    Validates the configuration and resolves it into a plan
+
+    Args:
+        config_dict (dict): loaded config.json
+        columns (list): columns of the claims table, database fields are not checked if None
+
+    Returns:
+        plan (dict): with the keys
+                     version (int): PLAN_VERSION
+                     fields (dict): database field -> header
+                     date_columns (list): headers parsed as dates
+                     money_columns (list): headers held in cents
+                     templates (dict): template name -> path, sheet, route, default,
+                                       layout (see template_registry.compile_layout) and
+                                       formatting (header -> column, style_format, alignment)
+
+    Raises:
+        ValueError: listing every problem found in the configuration
+    """
+
+    errors = []
+    _check_settings(config_dict, errors)
+
+    fields = config_dict.get("database_fields_to_headers", {})
+    if columns is not None:
+        if not columns:
+            errors.append("The claims table does not exist or has no columns")
+        for field in fields:
+            if columns and field not in columns:
+                errors.append(f"Database field: {field} not found in the claims table")
+
+    templates = {}
+    for name, template in config_dict.get("templates", template_registry.DEFAULT_TEMPLATES).items():
+        templates[name] = _compile_template(name, template, config_dict, errors)
+
+    if errors:
+        raise ValueError("Invalid configuration:\n  " + "\n  ".join(errors))
+
+    return {
+        "version": PLAN_VERSION,
+        "fields": dict(fields),
+        "date_columns": list(config_dict.get("date_columns", [])),
+        "money_columns": list(config_dict.get("money_columns", [])),
+        "templates": templates,
+    }
+
+
+def lean_template(plan: dict) -> dict:
+    """
+    Returns the template the lean path of row_pipeline writes to. The lean path
+    streams every row into one sheet, so a registry with several templates or a
+    routed template is rejected instead of writing every row to one of them.
+
+    Args:
+        plan (dict): compiled plan, see compile_config
+
+    Returns:
+        template (dict): compiled template with path, sheet and layout
+
+    Raises:
+        ValueError: if the registry has more than one template or a route
+    """
+
+    templates = plan["templates"]
+    if len(templates) != 1:
+        raise ValueError(f"--lean writes a single template, the registry has {len(templates)}: "
+                         f"{', '.join(templates)}")
+
+    name, template = next(iter(templates.items()))
+    if template["route"] is not None:
+        raise ValueError(f"--lean cannot route rows, template {name} has a route")
+
+    return template
+
+
+def load_plan(config_dict: dict, connection_string: str = None, cache_dir: str = None) -> dict:
+    """
+    Returns the compiled plan of the configuration, from the plan cache if the
+    configuration, templates and table columns are unchanged
+
+    Args:
+        config_dict (dict): loaded config.json
+        connection_string (str): path to the SQLite database, its columns are not checked if None
+        cache_dir (str): directory of the compiled plans, defaults to config_compiler.cache_directory
+                         in config.json, no caching if that is null
+
+    Returns:
+        plan (dict): compiled plan, see compile_config
+
+    Raises:
+        ValueError: listing every problem found in the configuration
+    """
+
+    if cache_dir is None:
+        cache_dir = config_dict.get("config_compiler", {}).get("cache_directory")
+
+    columns = None
+    if connection_string is not None:
+        columns = database_columns(connection_string, sqlite_profile=config_dict.get("sqlite"))
+
+    key = plan_key(config_dict, columns)
+    plan_path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+
+    if plan_path is not None and os.path.exists(plan_path):
+        with open(plan_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    plan = compile_config(config_dict, columns)
+
+    # Only valid plans are cached, written next to the destination and renamed
+    if plan_path is not None:
+        with atomic_file.atomic_path(plan_path) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(plan, f)
+
+    return plan
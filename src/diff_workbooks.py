@@ -0,0 +1,223 @@
+"""
+Module: diff_workbooks
+Description: This module reconciles a returned CTS workbook against the generated one.
+             Both workbooks are streamed in read_only mode and only the claim columns and
+             the compared columns are kept, each as a NumPy array. Rows are aligned by
+             the locked claim attributes of ingest_returns.CLAIM_COLUMNS (account, date
+             of service, procedure code and modifier), so re-sorted rows still match,
+             and the columns are compared in vectorized form. The result is a compact change set with
+             per-column counts that can be written to CSV or JSON.
+
+             Usage:
+                python -m src.diff_workbooks generated.xlsx returned.xlsx -o changes.csv
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import csv
+import json
+import argparse
+import datetime
+import numpy as np
+from openpyxl import load_workbook
+from src.ingest_returns import CLAIM_COLUMNS, claim_value, get_column_indices
+
+
+def read_columns(file_path: str, columns: list, claim_columns: tuple = CLAIM_COLUMNS,
+                 sheet_name: str = "MAP or COFA") -> tuple:
+    """
+    Streams a workbook and loads the claim key and the requested columns into
+    NumPy object arrays. Rows without an account are skipped.
+
+    Args:
+        file_path (str): path of the workbook
+        columns (list): headers of the columns to load
+        claim_columns (tuple): headers of the columns identifying a claim line, the account first
+        sheet_name (str): sheet holding the claims
+
+    Returns:
+        keys (np.ndarray): claim of every row as "account / date of service / code / modifier"
+        values (dict): header -> np.ndarray of cell values
+    """
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        indices = get_column_indices(sheet, [*claim_columns, *columns])
+        claim_idxs, value_idxs = indices[:len(claim_columns)], indices[len(claim_columns):]
+        max_col = max(indices) + 1
+
+        keys = []
+        column_values = [[] for _ in columns]
+        for row in sheet.iter_rows(min_row=2, max_col=max_col, values_only=True):
+            claim = [row[idx] if idx < len(row) else None for idx in claim_idxs]
+            if claim[0] is None:
+                continue
+
+            keys.append(" / ".join(claim_value(value) for value in claim))
+            for values, idx in zip(column_values, value_idxs):
+                values.append(row[idx] if idx < len(row) else None)
+    finally:
+        workbook.close()
+
+    values = {}
+    for column, column_list in zip(columns, column_values):
+        array = np.empty(len(column_list), dtype=object)
+        array[:] = column_list
+        values[column] = array
+
+    return np.array(keys, dtype=object), values
+
+
+def occurrence_keys(keys: np.ndarray) -> np.ndarray:
+    """
+    Makes keys unique by appending the occurrence number of each key. Only claims
+    with identical attributes share a key, their n-th row in one workbook is
+    aligned with their n-th row in the other.
+
+    Args:
+        keys (np.ndarray): row keys, possibly repeated
+
+    Returns:
+        unique_keys (np.ndarray): "key#occurrence" for every row
+    """
+
+    num_rows = len(keys)
+    if num_rows == 0:
+        return keys.astype(str)
+
+    keys = keys.astype(str)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    # Position of the first row of each run of equal keys
+    positions = np.arange(num_rows)
+    run_starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    first_position = np.maximum.accumulate(np.where(run_starts, positions, 0))
+
+    occurrence = np.empty(num_rows, dtype=np.int64)
+    occurrence[order] = positions - first_position
+
+    return np.char.add(np.char.add(keys, "#"), occurrence.astype(str))
+
+
+def diff_workbooks(generated_path: str, returned_path: str, columns: list, claim_columns: tuple = CLAIM_COLUMNS,
+                   sheet_name: str = "MAP or COFA") -> dict:
+    """
+    Compares the columns of two workbooks row by row after aligning the rows by
+    their claim attributes. Rows are reported by claim and occurrence, e.g.
+    "1234567890 / 2024-06-15 / D1234 / MOD1#0", so every entry names one row.
+
+    Args:
+        generated_path (str): path of the generated workbook
+        returned_path (str): path of the returned workbook
+        columns (list): headers of the columns to compare
+        claim_columns (tuple): headers of the columns identifying a claim line, the account first
+        sheet_name (str): sheet holding the claims
+
+    Returns:
+        change_set (dict): with the keys
+                           changes (list): {key, column, old, new} for every changed cell
+                           added (list): occurrence keys only present in the returned workbook
+                           removed (list): occurrence keys only present in the generated workbook
+                           counts (dict): number of changed cells per column
+    """
+
+    old_keys, old_values = read_columns(generated_path, columns, claim_columns, sheet_name)
+    new_keys, new_values = read_columns(returned_path, columns, claim_columns, sheet_name)
+
+    old_unique = occurrence_keys(old_keys)
+    new_unique = occurrence_keys(new_keys)
+
+    # Align the rows present in both workbooks
+    _, old_idx, new_idx = np.intersect1d(old_unique, new_unique, assume_unique=True, return_indices=True)
+
+    # Keep the order of the generated workbook in the output
+    order = np.argsort(old_idx, kind="stable")
+    old_idx, new_idx = old_idx[order], new_idx[order]
+
+    changes = []
+    counts = {}
+    for column in columns:
+        old_column = old_values[column][old_idx]
+        new_column = new_values[column][new_idx]
+
+        changed = np.flatnonzero(old_column != new_column)
+        counts[column] = int(changed.size)
+
+        for idx in changed:
+            changes.append({
+                "key": str(old_unique[old_idx[idx]]),
+                "column": column,
+                "old": old_column[idx],
+                "new": new_column[idx],
+            })
+
+    added = new_unique[np.isin(new_unique, old_unique, invert=True)].tolist()
+    removed = old_unique[np.isin(old_unique, new_unique, invert=True)].tolist()
+
+    return {"changes": changes, "added": added, "removed": removed, "counts": counts}
+
+
+def _json_default(value):
+    """
+    Helper function serializing cell values that json does not handle
+    """
+
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def write_change_set(change_set: dict, output_path: str) -> None:
+    """
+    Writes a change set as JSON or, for a .csv path, as one row per changed cell
+
+    Args:
+        change_set (dict): result of diff_workbooks
+        output_path (str): destination file, format chosen by the extension
+    """
+
+    if output_path.endswith(".csv"):
+        with open(output_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["key", "column", "old", "new"])
+            writer.writeheader()
+            writer.writerows(change_set["changes"])
+            for key in change_set["added"]:
+                writer.writerow({"key": key, "column": "<row added>"})
+            for key in change_set["removed"]:
+                writer.writerow({"key": key, "column": "<row removed>"})
+        return
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(change_set, f, indent=4, default=_json_default)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.diff_workbooks")
+    parser.add_argument("generated", help="Generated workbook")
+    parser.add_argument("returned", help="Returned workbook")
+    parser.add_argument("-c", "--columns", nargs="+", default=None,
+                        help="Headers to compare, defaults to unprotected_columns in config.json")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Write the change set to a .csv or .json file")
+    parser.add_argument("--config", type=str, default="config.json")
+    args = parser.parse_args()
+
+    compare_columns = args.columns
+    if compare_columns is None:
+        with open(args.config, encoding="utf-8") as config_file:
+            compare_columns = json.load(config_file)["unprotected_columns"]
+
+    result = diff_workbooks(args.generated, args.returned, compare_columns)
+
+    for header, count in result["counts"].items():
+        print(f"{header:<30}{count:>10}")
+    print(f"{'rows added':<30}{len(result['added']):>10}")
+    print(f"{'rows removed':<30}{len(result['removed']):>10}")
+
+    if args.output:
+        write_change_set(result, args.output)
+        print(f"Change set saved to {args.output}")
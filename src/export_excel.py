@@ -6,15 +6,18 @@ Description: This module handles the creation of a claims transmittal spreadshee
 
 Author: Urban Halpern
 Original Creation: 2024-12-24
-Latest Revision: 2025-01-17
+Latest Revision: 2026-10-19
 """
 
 import os
+import copy
 import pandas as pd
 import openpyxl
 import openpyxl.workbook
 from openpyxl import load_workbook
 from openpyxl.styles import Protection, Alignment
+from openpyxl.utils import column_index_from_string
+from src import money, xlsx_package
 
 
 def get_format(cell: openpyxl.cell.cell.Cell, validation_format_dict: dict, header: str) -> None:
@@ -46,36 +49,76 @@ def get_format(cell: openpyxl.cell.cell.Cell, validation_format_dict: dict, head
             cell.alignment = Alignment(horizontal=alignment)
 
 
-def insert_into_template(final_df: pd.DataFrame, validation_format_dict: dict) -> openpyxl.workbook.workbook.Workbook:
+def load_template(template_file_path: str = None) -> openpyxl.workbook.workbook.Workbook:
     """
-    Inserts data into the template spreadsheet using data from the final_df by column
+    Loads the CTS template workbook
+
+    Args:
+        template_file_path (str): path to the template, defaults to CTS_Example_Template.xlsx
+                                  in the working directory
+
+    Returns:
+        workbook (openpyxl.workbook.workbook.Workbook): parsed template
+    """
+
+    if template_file_path is None:
+        # Get parent dir of repo to access the template
+        parent_dir = os.path.abspath(os.path.join(os.getcwd()))
+
+        # Access the template file
+        template_file_path = os.path.join(parent_dir, 'CTS_Example_Template.xlsx')
+
+    return load_workbook(template_file_path)
+
+
+def insert_into_template(final_df: pd.DataFrame, validation_format_dict: dict,
+                         workbook: openpyxl.workbook.workbook.Workbook = None, sheet_name: str = "MAP or COFA",
+                         layout: dict = None, money_columns: list = ()) -> openpyxl.workbook.workbook.Workbook:
+    """
+    Inserts data into the template spreadsheet using data from the final_df by column.
+    The formats of a column are applied once per distinct cell style with get_format,
+    the other cells of the column receive a copy of the resulting style.
+    Money columns hold int64 cents and are written as display amounts.
 
     Args:
         final_df (pandas.dataframe): dataframe which holds transformed data from SQL query
         validation_format_dict (dict): dictionary that holds formatting for each column
-        workbook_name (str): name of workbook that will be saved after data is ingested
+        workbook (openpyxl.workbook.workbook.Workbook): already parsed template to insert into,
+                                                        loaded from disk if not given
+        sheet_name (str): name of the sheet to insert into
+        layout (dict): compiled layout of the sheet from template_registry, used to look up
+                       header columns without scanning the header row
+        money_columns (list): headers of the columns in cents, see setup_dataframe.format_money_columns
 
     Returns:
         workbook (openpyxl.workbook.workbook.Workbook): workbook with ingested data
 
     """
 
-    # Get parent dir of repo to access generated_sheets dir
-    parent_dir = os.path.abspath(os.path.join(os.getcwd()))
-
-    # Access the template file
-    template_file_path = os.path.join(parent_dir, 'CTS_Example_Template.xlsx')
+    if workbook is None:
+        workbook = load_template()
 
-    workbook = load_workbook(template_file_path)
-    sheet = workbook["MAP or COFA"]
+    sheet = workbook[sheet_name]
 
     # Iterate though the columns in the dataframe
     for col_name in final_df.columns:
 
         # Find the column in the sheet
-        col_letter = get_column_letter(sheet, col_name)
+        if layout is not None:
+            col_letter = layout["headers"].get(col_name)
+            if col_letter is None:
+                raise ValueError(f'Specified Column: {col_name} not found in sheet.')
+        else:
+            col_letter = get_column_letter(sheet, col_name)
         col_data = final_df[col_name]
 
+        # Amounts are converted from cents only when written
+        if col_name in money_columns:
+            col_data = money.from_cents(col_data)
+
+        # Formatted style for every style found in the column after binding the value
+        formatted_styles = {}
+
         # iterate through the rows in the column, skipping the header cell and using one-based indexing
         for row_idx, value in enumerate(col_data, start=2):
 
@@ -83,59 +126,90 @@ def insert_into_template(final_df: pd.DataFrame, validation_format_dict: dict) -
 
             # Skip cells with formulas
             if not cell.data_type == "f":
+
+                # Arrow-backed columns use pd.NA for missing values, which openpyxl cannot write
+                if value is pd.NA:
+                    value = None
+
                 cell.value = value
 
-                get_format(cell, validation_format_dict, col_name)
+                # Cells without a style array use the default style
+                style_key = tuple(cell._style) if cell._style is not None else None
+                if style_key not in formatted_styles:
+                    get_format(cell, validation_format_dict, col_name)
+                    formatted_styles[style_key] = copy.copy(cell._style)
+                else:
+                    cell._style = copy.copy(formatted_styles[style_key])
 
     return workbook
 
 
-def save_workbook(workbook: openpyxl.workbook.Workbook, workbook_name: str = "CTS_Insert_Example.xlsx") -> None:
+def save_workbook(workbook: openpyxl.workbook.Workbook, workbook_name: str = "CTS_Insert_Example.xlsx",
+                  compresslevel: int = 6, workers: int = None, sheets_directory: str = None,
+                  precompressed: dict = None) -> str:
     """
-    Saves the workbook to the specified path and checks if file already exists
+    Saves the workbook to the specified path and checks if file already exists.
+    The parts are compressed in parallel and written to a temporary file that is
+    moved into place atomically, so an existing file is never overwritten.
 
     Args:
         workbook (openpyxl.workbook.Workbook): The workbook object to save
         worbook_name (str): Name of file
+        compresslevel (int): zlib compression level, 0 stores the parts uncompressed
+        workers (int): number of threads used to compress the parts
+        sheets_directory (str): directory to save to, defaults to generated_sheets
+        precompressed (dict): payloads of the template parts, see template_blob.precompressed_parts
 
+    Returns:
+        save_path (str): path the workbook was saved to
     """
     # Get parent dir of repo to access generated_sheets dir
-    parent_dir = os.path.abspath(os.path.join(os.getcwd()))
-    sheets_directory = os.path.join(parent_dir, 'generated_sheets')
+    if sheets_directory is None:
+        parent_dir = os.path.abspath(os.path.join(os.getcwd()))
+        sheets_directory = os.path.join(parent_dir, 'generated_sheets')
 
     # Define path to save workbook and raise error if wb with same name exists
+    # before spending time on serialization. The final link is checked again.
     save_path = os.path.join(sheets_directory, workbook_name)
     if os.path.exists(save_path):
         raise FileExistsError(f'The file already exists: {save_path}')
 
-    # Save workbook
-    workbook.save(save_path)
+    # Save workbook, streaming the parts from a spooled archive
+    with xlsx_package.spool_workbook(workbook) as parts:
+        xlsx_package.save_atomic(parts, save_path, compresslevel=compresslevel, workers=workers,
+                                 precompressed=precompressed)
     print(f'Sheet saved to {workbook_name} at {save_path}') 
 
     return save_path
 
 
 def protection_handler(workbook: openpyxl.workbook.Workbook, cols_to_unprotect: list,
-                       password: str = "test", row_range: int = 50) -> None:
+                       password: str = "test", row_range: int = 50, sheet_name: str = "MAP or COFA",
+                       layout: dict = None) -> None:
     """
     Un-protects columns that do not need protection. Should only unprotect
-    number of rows equal to the SQL query.
+    number of rows equal to the SQL query plus the slack rows of the sheet.
 
     Args:
         workbook (openpyxl.workbook.Workbook): The workbook with columns to unprotect
         cols_to_unprotect (list): List of column headers to unprotect
         password (str): password to unlock the sheet
-        range (int): range of cells in column to unprotect
+        row_range (int): number of cells below the header to unprotect in each column
+        sheet_name (str): name of the sheet to protect
+        layout (dict): compiled layout of the sheet from template_registry
 
     """
 
     # Protect all cells and set password
-    sheet = workbook["MAP or COFA"]
+    sheet = workbook[sheet_name]
     sheet.protection.enable()
     sheet.protection.password = password
 
     for column in cols_to_unprotect:
-        col_letter = get_column_letter(sheet, column)
+        if layout is not None and column in layout["headers"]:
+            col_letter = layout["headers"][column]
+        else:
+            col_letter = get_column_letter(sheet, column)
 
         unlock_column(sheet, col_letter, row_range)
 
@@ -179,9 +253,11 @@ def unlock_column(sheet: openpyxl.worksheet.worksheet.Worksheet, column_to_unloc
     Args:
         sheet (openpyxl.worksheet.worksheet.Worksheet): sheet to unlock columns in
         column_to_unlock (str): letter of the column to unlock
-        range (int): Range of cells to unlock
+        row_range (int): number of cells below the header to unlock
     """
 
+    column = column_index_from_string(column_to_unlock)
+
     # iterate through cells in the column, skipping the header cell
-    for cell in sheet[column_to_unlock][1:row_range]:
+    for (cell,) in sheet.iter_rows(min_row=2, max_row=row_range + 1, min_col=column, max_col=column):
         cell.protection = Protection(locked=False)  # Unlock the cell
@@ -0,0 +1,346 @@
+"""
+Module: export_tabular
+Description: This module exports the extract as CSV or Parquet for machine consumers
+             that do not need a styled, protected workbook. The columns follow the
+             header layout of the template sheet, including the columns left for
+             manual entry, and the formula columns (GRAND TOTAL, LOCAL SHARE, FEDERAL
+             SHARE) are computed from the template formulas with the values an empty
+             entry column gives in Excel.
+
+             CSV files are written in chunks through an optional gzip or zstd stream.
+             Parquet files use dictionary encoding for the text columns and gzip or
+             zstd page compression. Dates are written as ISO dates. Files are written
+             next to their destination and renamed, an existing file is never
+             overwritten.
+
+             The zstd codec and Parquet need the optional pyarrow package.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import io
+import os
+import re
+import gzip
+import numpy as np
+import pandas as pd
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.utils import column_index_from_string
+from src import atomic_file, export_excel, money, template_registry
+
+# Output formats and the file extension of each compression
+FORMATS = ("csv", "parquet")
+COMPRESSIONS = (None, "gzip", "zstd")
+CSV_EXTENSIONS = {None: ".csv", "gzip": ".csv.gz", "zstd": ".csv.zst"}
+
+# Rows converted to CSV text at a time
+CSV_CHUNK_ROWS = 50000
+
+# Functions of the template formulas, evaluated exactly on amounts in cents
+FORMULA_FUNCTIONS = {
+    "SUM": money.total,
+    "FLOOR": lambda value, significance: value.floor(significance),
+}
+
+# Operators of the formulas, Excel's ^, &, = and <> have no exact money meaning
+FORMULA_OPERATORS = ("+", "-", "*", "/")
+
+
+def compile_formula(formula: str, origin_row: int = 2):
+    """
+    Compiles a template formula into a function computing the column from the other
+    columns in exact fixed-point arithmetic. References must point to the origin row
+    and are amounts in cents, blank cells count as 0 like in Excel arithmetic.
+
+    Args:
+        formula (str): formula of the first data row, e.g. "=FLOOR($M2*0.17,0.01)"
+        origin_row (int): row the formula was read from
+
+    Returns:
+        evaluate (callable): evaluate(columns) with columns a dict of column letter -> pd.Series
+                             of cents, returns the result in whole cents
+
+    Raises:
+        ValueError: if the formula uses a function, operator, range or reference that is not supported
+    """
+
+    parts = []
+    letters = []
+    for token in Tokenizer(formula).items:
+        if token.type == Token.WSPACE:
+            continue
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper()
+            if name not in FORMULA_FUNCTIONS:
+                raise ValueError(f"Formula {formula}: function {name} is not supported")
+            parts.append(f"functions[{name!r}](")
+        elif token.type == Token.OPERAND and token.subtype == Token.RANGE:
+            reference = token.value.replace("$", "")
+            letter = reference.rstrip("0123456789")
+            row = reference[len(letter):]
+            if not letter.isalpha() or not row or int(row) != origin_row:
+                raise ValueError(f"Formula {formula}: reference {token.value} is not a cell of row {origin_row}")
+            letters.append(letter)
+            parts.append(f"columns[{letter!r}]")
+        elif token.type == Token.OPERAND and token.subtype == Token.NUMBER:
+            parts.append(f"rate({token.value!r})")
+        elif token.type in (Token.OP_IN, Token.OP_PRE):
+            if token.value not in FORMULA_OPERATORS:
+                raise ValueError(f"Formula {formula}: operator {token.value} is not supported")
+            parts.append(token.value)
+        elif token.type in (Token.FUNC, Token.PAREN, Token.SEP):
+            parts.append(token.value)
+        else:
+            raise ValueError(f"Formula {formula}: {token.value} is not supported")
+
+    code = compile("".join(parts), formula, "eval")
+
+    def evaluate(columns: dict) -> pd.Series:
+        index = columns[letters[0]].index if letters else None
+        amounts = {letter: money.FixedPoint(columns[letter].fillna(0).to_numpy(dtype="int64"))
+                   for letter in letters}
+        result = eval(code, {"__builtins__": {}}, {"functions": FORMULA_FUNCTIONS, "columns": amounts,
+                                                   "rate": money.FixedPoint.rate})
+        cents = pd.Series(result.to_cents(), index=index, dtype="int64")
+
+        # Rows divided by zero are left empty, like the #DIV/0! Excel would show
+        if result.missing is not None:
+            cents = cents.astype("Int64").mask(np.broadcast_to(result.missing, cents.shape))
+        return cents
+
+    return evaluate
+
+
+def tabular_frame(final_df: pd.DataFrame, layout: dict, money_columns: list = ()) -> pd.DataFrame:
+    """
+    Arranges the extract in the header order of a template sheet. Entry columns
+    missing from the extract are empty, numeric if a formula reads them. The formula
+    columns are computed in cents and every amount is converted to its display value.
+
+    Args:
+        final_df (pd.DataFrame): transformed data with spreadsheet headers
+        layout (dict): compiled layout of the template sheet, see template_registry.compile_layout
+        money_columns (list): headers of the columns holding int64 cents, see setup_dataframe.format_money_columns
+
+    Returns:
+        frame (pd.DataFrame): one column per template header, in column order
+    """
+
+    formulas = {letter: compile_formula(formula) for letter, formula in layout["formulas"].items()}
+    referenced = {reference.replace("$", "").rstrip("0123456789")
+                  for formula in layout["formulas"].values()
+                  for reference in formula_references(formula)}
+
+    columns = {}
+    headers = sorted(layout["headers"].items(), key=lambda item: column_index_from_string(item[1]))
+    for header, letter in headers:
+        if letter in formulas:
+            continue
+        if header in final_df.columns:
+            columns[letter] = final_df[header].reset_index(drop=True)
+        else:
+            dtype = "Float64" if letter in referenced else "string"
+            columns[letter] = pd.Series(pd.NA, index=pd.RangeIndex(final_df.shape[0]), dtype=dtype)
+
+    # Formulas read every referenced column as cents
+    header_of = {letter: header for header, letter in headers}
+    cents = {letter: columns[letter] if header_of[letter] in money_columns else money.to_cents(columns[letter])
+             for letter in referenced if letter in columns}
+    for letter, evaluate in formulas.items():
+        columns[letter] = money.from_cents(evaluate(cents))
+
+    # Amounts are converted to display values only when written
+    for header, letter in headers:
+        if header in money_columns and letter not in formulas:
+            columns[letter] = money.from_cents(columns[letter])
+
+    return pd.DataFrame({header: columns[letter] for header, letter in headers})
+
+
+def formula_references(formula: str) -> list:
+    """
+    Returns the cell references of a formula
+
+    Args:
+        formula (str): formula starting with "="
+
+    Returns:
+        references (list): references as written in the formula
+    """
+
+    return [token.value for token in Tokenizer(formula).items
+            if token.type == Token.OPERAND and token.subtype == Token.RANGE]
+
+
+def _date_columns(frame: pd.DataFrame) -> list:
+    """
+    Helper function returning the datetime columns of a frame
+    """
+
+    return [column for column in frame.columns
+            if pd.api.types.is_datetime64_any_dtype(frame[column])
+            or str(frame[column].dtype).startswith("timestamp")]
+
+
+def _open_csv_stream(path: str, compression: str = None):
+    """
+    Helper function opening a text stream writing to path through the compression
+    """
+
+    if compression is None:
+        return open(path, "w", encoding="utf-8", newline="")
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("compression='zstd' requires the pyarrow package") from e
+    return io.TextIOWrapper(pa.CompressedOutputStream(path, "zstd"), encoding="utf-8", newline="")
+
+
+def write_csv(frame: pd.DataFrame, path: str, compression: str = None, chunk_rows: int = CSV_CHUNK_ROWS) -> None:
+    """
+    Writes the frame as CSV in chunks, so the text of the whole file is never held
+    in memory
+
+    Args:
+        frame (pd.DataFrame): result of tabular_frame
+        path (str): file to write
+        compression (str): None, "gzip" or "zstd"
+        chunk_rows (int): rows converted to text at a time
+    """
+
+    date_columns = _date_columns(frame)
+
+    with _open_csv_stream(path, compression) as stream:
+        for start in range(0, max(frame.shape[0], 1), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows].copy()
+            for column in date_columns:
+                chunk[column] = chunk[column].dt.strftime("%Y-%m-%d")
+            chunk.to_csv(stream, header=start == 0, index=False, lineterminator="\n")
+
+
+def write_parquet(frame: pd.DataFrame, path: str, compression: str = None) -> None:
+    """
+    Writes the frame as Parquet with dictionary encoded text columns and dates
+    stored as dates
+
+    Args:
+        frame (pd.DataFrame): result of tabular_frame
+        path (str): file to write
+        compression (str): None, "gzip" or "zstd"
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output requires the pyarrow package") from e
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+
+    # Dates carry no time of day in the extract
+    for column in _date_columns(frame):
+        index = table.schema.get_field_index(column)
+        table = table.set_column(index, column, table.column(column).cast(pa.date32()))
+
+    text_columns = [field.name for field in table.schema if pa.types.is_string(field.type)]
+    pq.write_table(table, path, use_dictionary=text_columns, compression=compression or "none")
+
+
+def output_path(base_path: str, file_format: str, compression: str = None) -> str:
+    """
+    Returns the path of an export from the path without extension
+
+    Args:
+        base_path (str): path without extension
+        file_format (str): "csv" or "parquet"
+        compression (str): None, "gzip" or "zstd"
+
+    Returns:
+        path (str): path with the extension of the format and compression
+    """
+
+    if file_format == "csv":
+        return base_path + CSV_EXTENSIONS[compression]
+    return base_path + ".parquet"
+
+
+def export_tables(final_df: pd.DataFrame, config_dict: dict, base_name: str, file_format: str = "csv",
+                  compression: str = None, sheets_directory: str = None, plan: dict = None,
+                  metrics=None) -> list:
+    """
+    Exports the rows of every template in the registry as one CSV or Parquet file,
+    suffixed with the template file name when there are several and with the sheet
+    when entries share a template file. The money columns of config.json must hold cents.
+
+    Args:
+        final_df (pd.DataFrame): transformed data with spreadsheet headers
+        config_dict (dict): loaded config.json
+        base_name (str): file name without extension
+        file_format (str): "csv" or "parquet"
+        compression (str): None, "gzip" or "zstd"
+        sheets_directory (str): directory to save to, defaults to generated_sheets
+        plan (dict): compiled plan from config_compiler, its layouts are used instead of
+                     loading the templates
+        metrics (run_metrics.RunMetrics): receives the files and bytes written
+
+    Returns:
+        paths (list): paths of the written files
+    """
+
+    if file_format not in FORMATS:
+        raise ValueError(f"Output format: {file_format} is not one of {', '.join(FORMATS)}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Compression: {compression} is not one of gzip, zstd")
+
+    if sheets_directory is None:
+        sheets_directory = os.path.join(os.path.abspath(os.getcwd()), "generated_sheets")
+
+    templates = config_dict.get("templates", template_registry.DEFAULT_TEMPLATES)
+
+    # One file per entry, entries sharing a template file are told apart by their sheet
+    names = template_registry.output_names(templates)
+    shared = {output_name for output_name in names.values() if list(names.values()).count(output_name) > 1}
+
+    paths = []
+    for name, rows in template_registry.route_rows(final_df, templates).items():
+        template = templates[name]
+        if plan is not None:
+            layout = plan["templates"][name]["layout"]
+        else:
+            workbook = export_excel.load_template(template["path"])
+            layout = template_registry.get_layout(workbook, template["path"], template.get("sheet", "MAP or COFA"),
+                                                  config_dict["unprotected_columns"])
+
+        file_name = base_name
+        if len(templates) > 1:
+            file_name += f"_{names[name]}"
+        if names[name] in shared:
+            file_name += "_" + re.sub(r"[^0-9A-Za-z]+", "_", template.get("sheet", "MAP or COFA")).strip("_")
+        save_path = output_path(os.path.join(sheets_directory, file_name), file_format, compression)
+
+        # Raise error if a file with the same name exists before doing any work
+        if os.path.exists(save_path):
+            raise FileExistsError(f'The file already exists: {save_path}')
+
+        frame = tabular_frame(rows, layout, config_dict.get("money_columns", []))
+
+        # The link fails instead of replacing a file created in the meantime
+        with atomic_file.atomic_path(save_path, overwrite=False) as temp_path:
+            if file_format == "csv":
+                write_csv(frame, temp_path, compression)
+            else:
+                write_parquet(frame, temp_path, compression)
+
+        print(f'{file_format.upper()} saved to {os.path.basename(save_path)} at {save_path}')
+        paths.append(save_path)
+
+        if metrics is not None:
+            metrics.add("files_written")
+            metrics.add("bytes_written", os.path.getsize(save_path))
+
+    return paths
@@ -0,0 +1,160 @@
+"""
+Module: extract_cache
+Description: This module caches the normalized dataframe produced by setup_dataframe
+             on local disk as an Arrow IPC (Feather) file. Entries are keyed by the
+             query text and the parameters that shape the dataframe, and are checked
+             for freshness with a time to live and/or a change marker read from the
+             source table. Every entry is a single file holding its metadata in the
+             Arrow schema, and is memory-mapped when it is loaded.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import pandas as pd
+from src import atomic_file
+
+
+def cache_key(query: str, params: dict) -> str:
+    """
+    Builds a stable key for an extract from the query text and the parameters
+    that affect the resulting dataframe (connection, header mapping, date columns...)
+
+    Args:
+        query (str): SQL query used to read the extract
+        params (dict): JSON serializable parameters that shape the dataframe
+
+    Returns:
+        key (str): hex digest identifying the extract
+    """
+
+    payload = json.dumps({"query": query, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_source_marker(connection_string: str, table: str = "medical_data",
+                      date_column: str = "date_of_service") -> str:
+    """
+    Reads a cheap change marker from the source table. New or deleted rows move
+    the max rowid and newly loaded claims move the max date of service.
+
+    Args:
+        connection_string (str): path to the SQLite database
+        table (str): table the extract is read from
+        date_column (str): date column used to detect newly loaded data
+
+    Returns:
+        marker (str): string that changes when the source data changes
+    """
+
+    connection = sqlite3.connect(connection_string)
+    try:
+        max_rowid, max_date = connection.execute(
+            f"SELECT MAX(rowid), MAX({date_column}) FROM {table};"
+        ).fetchone()
+    finally:
+        connection.close()
+
+    return f"{max_rowid}|{max_date}"
+
+
+METADATA_KEY = b"extract_cache"
+
+
+def _entry_path(cache_dir: str, key: str) -> str:
+    """
+    Helper function returning the path of a cache entry
+    """
+
+    return os.path.join(cache_dir, f"{key}.feather")
+
+
+def load_extract(cache_dir: str, key: str, ttl_seconds: float = None,
+                 source_marker: str = None) -> pd.DataFrame:
+    """
+    Loads a cached extract if one exists and is still fresh. An entry is stale
+    when it is older than ttl_seconds or when it was written with a different
+    source marker. Either check is skipped when its argument is None.
+
+    Args:
+        cache_dir (str): directory holding the cache entries
+        key (str): key produced by cache_key
+        ttl_seconds (float): maximum age of the entry in seconds
+        source_marker (str): current marker produced by get_source_marker
+
+    Returns:
+        df (pd.DataFrame): cached dataframe, or None on a miss
+    """
+
+    data_path = _entry_path(cache_dir, key)
+    if not os.path.exists(data_path):
+        return None
+
+    from pyarrow import feather
+
+    # Memory-map the uncompressed IPC file so loading does not copy the buffers
+    table = feather.read_table(data_path, memory_map=True)
+
+    # Entries written without metadata are treated as a miss
+    schema_metadata = table.schema.metadata or {}
+    if METADATA_KEY not in schema_metadata:
+        return None
+    metadata = json.loads(schema_metadata[METADATA_KEY])
+
+    # Freshness checks
+    if ttl_seconds is not None and time.time() - metadata["created"] > ttl_seconds:
+        return None
+
+    if source_marker is not None and metadata.get("source_marker") != source_marker:
+        return None
+
+    if metadata.get("dtype_backend") == "pyarrow":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    return table.to_pandas()
+
+
+def save_extract(df: pd.DataFrame, cache_dir: str, key: str, source_marker: str = None,
+                 dtype_backend: str = "numpy") -> str:
+    """
+    Writes the dataframe to the cache. The metadata is stored in the schema of the
+    data file, which is written to a unique temporary file and renamed into place,
+    so readers never see a partially written entry or the metadata of another one.
+
+    Args:
+        df (pd.DataFrame): normalized dataframe to cache
+        cache_dir (str): directory holding the cache entries
+        key (str): key produced by cache_key
+        source_marker (str): marker produced by get_source_marker
+        dtype_backend (str): backend the dataframe was read with, restored on load
+
+    Returns:
+        data_path (str): path of the cached data file
+    """
+
+    import pyarrow as pa
+    from pyarrow import feather
+
+    data_path = _entry_path(cache_dir, key)
+
+    metadata = {
+        "created": time.time(),
+        "source_marker": source_marker,
+        "dtype_backend": dtype_backend,
+        "rows": int(df.shape[0]),
+    }
+    table = pa.Table.from_pandas(df.reset_index(drop=True))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(metadata).encode("utf-8")})
+
+    # Uncompressed so that the file can be memory-mapped on reuse
+    with atomic_file.atomic_path(data_path) as temp_path:
+        feather.write_feather(table, temp_path, compression="uncompressed")
+
+    return data_path
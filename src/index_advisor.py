@@ -0,0 +1,166 @@
+"""
+Module: index_advisor
+Description: This module checks the filtered queries run against the claims source with
+             EXPLAIN QUERY PLAN and recommends, or creates, the indexes that turn their
+             full table scans into index searches. The query shapes are the filters used
+             for extracts (date range, account, payer and date range) and the source
+             marker of the extract cache.
+
+             The extracts select every column, so their indexes cannot be covering
+             without duplicating the table. They narrow the scan to the matching rows,
+             which is what makes filtered extracts fast. The source marker only reads
+             date_of_service and is answered from the index alone.
+
+             Usage:
+                python -m src.index_advisor --db data/medical_data.db
+                python -m src.index_advisor --db data/medical_data.db --create
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import argparse
+import sqlite3
+from src.setup_dataframe import connect_sqlite
+
+# Filtered queries run against the claims source and the columns indexed for them
+QUERY_SHAPES = {
+    "date_range": {
+        "sql": "SELECT * FROM {table} WHERE date_of_service BETWEEN ? AND ?;",
+        "columns": ("date_of_service",),
+    },
+    "account": {
+        "sql": "SELECT * FROM {table} WHERE control_account_number = ?;",
+        "columns": ("control_account_number",),
+    },
+    "payer_date_range": {
+        "sql": "SELECT * FROM {table} WHERE tpl = ? AND date_of_service BETWEEN ? AND ?;",
+        "columns": ("tpl", "date_of_service"),
+    },
+    "source_marker": {
+        "sql": "SELECT MAX(rowid), MAX(date_of_service) FROM {table};",
+        "columns": ("date_of_service",),
+    },
+}
+
+
+def explain(connection, sql: str) -> list:
+    """
+    Returns the query plan of a statement. Placeholders are bound to NULL, which
+    does not change the plan.
+
+    Args:
+        connection: open sqlite3 connection
+        sql (str): statement with ? placeholders
+
+    Returns:
+        plan (list): detail string of every plan step
+    """
+
+    params = (None,) * sql.count("?")
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def uses_index(plan: list, table: str) -> bool:
+    """
+    Checks that no step of a plan scans the whole table
+
+    Args:
+        plan (list): result of explain
+        table (str): name of the table
+
+    Returns:
+        indexed (bool): True if every access to the table goes through an index
+    """
+
+    for detail in plan:
+        if detail.startswith(f"SCAN {table}") and "USING" not in detail:
+            return False
+    return True
+
+
+def index_statement(table: str, columns: tuple) -> str:
+    """
+    Builds the CREATE INDEX statement of an index on the given columns
+
+    Args:
+        table (str): name of the table
+        columns (tuple): indexed columns, in order
+
+    Returns:
+        statement (str): CREATE INDEX IF NOT EXISTS statement
+    """
+
+    name = f"idx_{table}_{'_'.join(columns)}"
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});"
+
+
+def advise(connection, table: str = "medical_data", create: bool = False) -> list:
+    """
+    Explains every query shape and recommends an index for the ones that scan the
+    whole table. With create=True the indexes are created, the table statistics
+    are refreshed with ANALYZE and the plans are explained again.
+
+    Args:
+        connection: open sqlite3 connection, writable if create is True
+        table (str): name of the claims table
+        create (bool): create the recommended indexes
+
+    Returns:
+        advice (list): one dict per query shape with the keys
+                       name (str): name of the query shape
+                       plan (list): query plan, after creation if create is True
+                       statement (str): recommended CREATE INDEX statement or None
+                       action (str): "ok", "recommended" or "created"
+    """
+
+    advice = []
+    for name, shape in QUERY_SHAPES.items():
+        sql = shape["sql"].format(table=table)
+        plan = explain(connection, sql)
+
+        if uses_index(plan, table):
+            advice.append({"name": name, "plan": plan, "statement": None, "action": "ok"})
+        else:
+            advice.append({"name": name, "plan": plan, "statement": index_statement(table, shape["columns"]),
+                           "action": "recommended"})
+
+    if create:
+        statements = {entry["statement"] for entry in advice if entry["statement"] is not None}
+        for statement in sorted(statements):
+            connection.execute(statement)
+        connection.execute(f"ANALYZE {table};")
+        connection.commit()
+
+        for entry in advice:
+            entry["plan"] = explain(connection, QUERY_SHAPES[entry["name"]]["sql"].format(table=table))
+            if entry["statement"] is not None:
+                entry["action"] = "created"
+
+    return advice
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.index_advisor")
+    parser.add_argument("--db", type=str, default="data/medical_data.db")
+    parser.add_argument("--table", type=str, default="medical_data")
+    parser.add_argument("--create", action="store_true", help="Create the recommended indexes")
+    args = parser.parse_args()
+
+    # Index creation needs a writable connection
+    if args.create:
+        db_connection = sqlite3.connect(args.db)
+    else:
+        db_connection = connect_sqlite(args.db)
+
+    try:
+        results = advise(db_connection, args.table, create=args.create)
+    finally:
+        db_connection.close()
+
+    for result in results:
+        print(f"{result['name']:<20}{result['action']:<14}{'; '.join(result['plan'])}")
+        if result["action"] == "recommended":
+            print(f"{'':<20}{result['statement']}")
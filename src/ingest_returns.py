@@ -0,0 +1,323 @@
+"""
+Module: ingest_returns
+Description: This module reads completed CTS workbooks returned by providers back into
+             the database. Only the key column and the unprotected user entry columns
+             are read, with openpyxl in read_only streaming mode. Workbooks are parsed in
+             parallel worker processes and the parent process upserts all rows with
+             executemany in batches inside a single transaction.
+
+             An account has several claim lines, so returned rows are keyed on the
+             locked attributes of the claim (CLAIM_COLUMNS: account, date of service,
+             procedure code and modifier), which do not change when a provider sorts
+             or filters the sheet. A claim found twice, in one workbook or in two
+             workbooks of the same ingest, is reported as an error.
+
+             Usage:
+                python -m src.ingest_returns returned/*.xlsx --db data/medical_data.db
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import re
+import json
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+
+# Column identifying the account of a claim
+KEY_COLUMN = "CONTROL/ACCOUNT #"
+
+# Locked columns identifying a claim line, the account first
+CLAIM_COLUMNS = (KEY_COLUMN, "DATE OF SERVICE", "CPT/HCPCS/DENTAL CODE", "SERVICE CODE MODIFIER")
+
+# Table the returned values are upserted into
+RETURNS_TABLE = "cts_returns"
+
+
+def header_to_field(header: str, mapping_dict: dict = None) -> str:
+    """
+    Converts a spreadsheet header back to a database field name. Headers from
+    database_fields_to_headers use their original field name, other headers are
+    converted to snake_case (AMOUNT DUE -> amount_due).
+
+    Args:
+        header (str): spreadsheet header
+        mapping_dict (dict): database_fields_to_headers from config.json
+
+    Returns:
+        field (str): database field name
+    """
+
+    if mapping_dict:
+        for field, mapped_header in mapping_dict.items():
+            if mapped_header == header:
+                return field
+
+    return re.sub(r"[^0-9a-z]+", "_", header.lower()).strip("_")
+
+
+def claim_value(value) -> str:
+    """
+    Normalizes a cell of a claim column so that a claim matches its database row:
+    dates become ISO dates, whole numbers lose their decimals and empty cells
+    become "" (a primary key column cannot hold NULL and still conflict)
+
+    Args:
+        value: cell value read with data_only
+
+    Returns:
+        value (str): normalized value
+    """
+
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def get_column_indices(sheet, column_names: list) -> list:
+    """
+    Finds the zero-based position of each header in the first row of the sheet.
+    Works on read-only worksheets, which do not support iter_cols.
+
+    Args:
+        sheet: worksheet or read-only worksheet to search
+        column_names (list): header names to find
+
+    Returns:
+        indices (list): position of each header, in the order of column_names
+    """
+
+    header_row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True))
+    positions = {value: idx for idx, value in enumerate(header_row) if value is not None}
+
+    indices = []
+    for column_name in column_names:
+        # Raise error if the column was not found in the sheet.
+        if column_name not in positions:
+            raise ValueError(f'Specified Column: {column_name} not found in sheet.')
+        indices.append(positions[column_name])
+
+    return indices
+
+
+def read_returned_workbook(file_path: str, value_columns: list, claim_columns: tuple = CLAIM_COLUMNS,
+                           sheet_name: str = "MAP or COFA") -> list:
+    """
+    Streams a returned workbook and extracts the claim and user entry columns.
+    Rows without an account are skipped, since the template is pre-formatted well
+    past the last claim.
+
+    Args:
+        file_path (str): path of the returned workbook
+        value_columns (list): headers of the columns to read
+        claim_columns (tuple): headers of the columns identifying a claim line, the account first
+        sheet_name (str): sheet holding the claims
+
+    Returns:
+        rows (list): (*claim, *values, source_file) tuples, claim values normalized with claim_value
+
+    Raises:
+        ValueError: if a claim appears more than once in the workbook
+    """
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        indices = get_column_indices(sheet, [*claim_columns, *value_columns])
+        claim_idxs, value_idxs = indices[:len(claim_columns)], indices[len(claim_columns):]
+
+        # Only read up to the right-most column needed
+        max_col = max(indices) + 1
+        source_file = os.path.basename(file_path)
+
+        rows = []
+        claim_rows = {}
+        for row_number, row in enumerate(sheet.iter_rows(min_row=2, max_col=max_col, values_only=True), start=2):
+            cells = [row[idx] if idx < len(row) else None for idx in indices]
+            if cells[0] is None:
+                continue
+
+            claim = tuple(claim_value(cell) for cell in cells[:len(claim_idxs)])
+            claim_rows.setdefault(claim, []).append(row_number)
+            rows.append((*claim, *cells[len(claim_idxs):], source_file))
+    finally:
+        workbook.close()
+
+    duplicates = [f"{' / '.join(claim)} in rows {', '.join(map(str, numbers))}"
+                  for claim, numbers in claim_rows.items() if len(numbers) > 1]
+    if duplicates:
+        raise ValueError(f"Duplicate claims in {source_file}:\n  " + "\n  ".join(duplicates))
+
+    return rows
+
+
+def create_returns_table(connection, fields: list, key_fields: list, table: str = RETURNS_TABLE) -> None:
+    """
+    Creates the SQLite table holding returned values if it does not exist yet
+
+    Args:
+        connection: open sqlite3 connection
+        fields (list): database field names of the value columns
+        key_fields (list): database field names of the claim columns
+        table (str): name of the table
+    """
+
+    keys = ", ".join(f"{field} VARCHAR(60) NOT NULL" for field in key_fields)
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {table} ({keys}, {', '.join(fields)}, source_file VARCHAR(260), "
+        f"PRIMARY KEY ({', '.join(key_fields)}));"
+    )
+
+
+def build_upsert_statement(fields: list, key_fields: list, table: str = RETURNS_TABLE,
+                           dialect: str = "sqlite") -> str:
+    """
+    Builds a parameterized upsert statement for executemany
+
+    Args:
+        fields (list): database field names of the value columns
+        key_fields (list): database field names of the claim columns
+        table (str): name of the table
+        dialect (str): "sqlite" or "mssql"
+
+    Returns:
+        statement (str): SQL statement taking (*claim, *values, source_file) parameters
+    """
+
+    all_fields = [*key_fields, *fields, "source_file"]
+    value_fields = all_fields[len(key_fields):]
+    placeholders = ", ".join("?" for _ in all_fields)
+
+    if dialect == "sqlite":
+        updates = ", ".join(f"{field} = excluded.{field}" for field in value_fields)
+        return (f"INSERT INTO {table} ({', '.join(all_fields)}) VALUES ({placeholders}) "
+                f"ON CONFLICT({', '.join(key_fields)}) DO UPDATE SET {updates};")
+
+    if dialect == "mssql":
+        updates = ", ".join(f"target.{field} = source.{field}" for field in value_fields)
+        matches = " AND ".join(f"target.{field} = source.{field}" for field in key_fields)
+        return (f"MERGE {table} WITH (HOLDLOCK) AS target "
+                f"USING (VALUES ({placeholders})) AS source ({', '.join(all_fields)}) "
+                f"ON {matches} "
+                f"WHEN MATCHED THEN UPDATE SET {updates} "
+                f"WHEN NOT MATCHED THEN INSERT ({', '.join(all_fields)}) "
+                f"VALUES ({', '.join(f'source.{field}' for field in all_fields)});")
+
+    raise ValueError(f"Unsupported dialect: {dialect}")
+
+
+def ingest_returned_workbooks(file_paths: list, connection, value_columns: list,
+                              claim_columns: tuple = CLAIM_COLUMNS, mapping_dict: dict = None,
+                              table: str = RETURNS_TABLE, batch_size: int = 5000, workers: int = None,
+                              dialect: str = "sqlite") -> int:
+    """
+    Reads returned workbooks in parallel processes and upserts their rows in a
+    single transaction. Nothing is written if any workbook fails to parse, holds
+    a claim that another workbook of the batch also holds, or any batch fails to
+    insert. Claims stored by an earlier ingest are updated.
+
+    Args:
+        file_paths (list): paths of the returned workbooks
+        connection: open sqlite3 or pyodbc connection
+        value_columns (list): headers of the user entry columns to read
+        claim_columns (tuple): headers of the columns identifying a claim line
+        mapping_dict (dict): database_fields_to_headers from config.json
+        table (str): table to upsert into
+        batch_size (int): number of rows per executemany call
+        workers (int): number of parsing processes, 1 parses in this process
+        dialect (str): "sqlite" or "mssql"
+
+    Returns:
+        num_rows (int): number of claim lines stored
+
+    Raises:
+        ValueError: if a claim appears twice in a workbook or in two workbooks
+    """
+
+    key_fields = [header_to_field(column, mapping_dict) for column in claim_columns]
+    fields = [header_to_field(column, mapping_dict) for column in value_columns]
+    statement = build_upsert_statement(fields, key_fields, table, dialect)
+
+    # Parse the workbooks, in parallel unless a single worker is requested
+    if workers == 1 or len(file_paths) <= 1:
+        parsed = [read_returned_workbook(path, value_columns, claim_columns) for path in file_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(read_returned_workbook, file_paths,
+                                       [value_columns] * len(file_paths), [claim_columns] * len(file_paths)))
+
+    # A claim returned in two workbooks is ambiguous, neither copy is stored
+    sources = {}
+    duplicates = []
+    for rows in parsed:
+        for row in rows:
+            claim = row[:len(key_fields)]
+            if claim in sources:
+                duplicates.append(f"{' / '.join(claim)} in {sources[claim]} and {row[-1]}")
+            else:
+                sources[claim] = row[-1]
+    if duplicates:
+        raise ValueError("Claims returned in more than one workbook:\n  " + "\n  ".join(duplicates))
+
+    if dialect == "mssql":
+        # pyodbc sends the whole batch in one round trip with fast_executemany
+        cursor = connection.cursor()
+        cursor.fast_executemany = True
+    else:
+        create_returns_table(connection, fields, key_fields, table)
+        cursor = connection.cursor()
+
+    try:
+        batch = []
+        for rows in parsed:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    cursor.executemany(statement, batch)
+                    batch = []
+
+        if batch:
+            cursor.executemany(statement, batch)
+
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+    return len(sources)
+
+
+if __name__ == "__main__":
+
+    import sqlite3
+
+    parser = argparse.ArgumentParser(prog="python -m src.ingest_returns")
+    parser.add_argument("files", nargs="+", help="Returned workbooks to ingest")
+    parser.add_argument("--db", type=str, default="data/medical_data.db")
+    parser.add_argument("--config", type=str, default="config.json")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        config_dict = json.load(f)
+
+    db_connection = sqlite3.connect(args.db)
+    try:
+        count = ingest_returned_workbooks(args.files, db_connection, config_dict["unprotected_columns"],
+                                          mapping_dict=config_dict["database_fields_to_headers"],
+                                          batch_size=args.batch_size, workers=args.workers)
+    finally:
+        db_connection.close()
+
+    print(f"Ingested {count} claim lines from {len(args.files)} workbooks into {args.db}")
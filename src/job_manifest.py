@@ -0,0 +1,404 @@
+"""
+Module: job_manifest
+Description: This module runs a batch of CTS files, one partition of the extract per
+             file, with a resumable job manifest. The rows are split by the values of
+             a partition column and every partition is populated and saved like a
+             single run of main.py. The manifest records the input hash, output paths
+             and status of every partition and is replaced atomically after every
+             change, so it always describes the files on disk.
+
+             A rerun skips the partitions that are done and whose input hash is
+             unchanged. Outputs of partitions that were interrupted, failed, changed
+             or were requeued are removed before the partition is generated again,
+             so save_workbook never finds a stale file of the batch.
+
+             The input hash covers the rows of the partition, the settings of
+             config.json that shape the output, the template files and the password.
+
+             Partition keys are sanitized into file names, a key that changes is
+             suffixed with a short hash of the raw key. File names that would still
+             collide, also on case-insensitive file systems, stop the batch before
+             any file is written.
+
+             Usage:
+                python main.py -n month_end.xlsx --partition-by TPL
+                python -m src.job_manifest generated_sheets/month_end.manifest.json --requeue Medicare
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import datetime
+import pandas as pd
+from src import atomic_file, export_excel, template_blob, template_registry
+
+# Manifest format version, bumped when the layout of the manifest changes
+MANIFEST_VERSION = 2
+
+# Settings of config.json that change the generated files
+OUTPUT_SETTINGS = ("formatting", "unprotected_columns", "templates", "row_capacity")
+
+# Partition key of rows without a value in the partition column
+MISSING_PARTITION = "<missing>"
+
+# Hex digits of the key hash appended to sanitized file names
+KEY_HASH_DIGITS = 8
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def new_manifest(batch_name: str, partition_column: str, selection: dict = None) -> dict:
+    """
+    Creates an empty manifest
+
+    Args:
+        batch_name (str): name of the batch, prefix of every output file
+        partition_column (str): header the rows are partitioned by
+        selection (dict): claim selection of the batch, see setup_dataframe.select_claims
+
+    Returns:
+        manifest (dict): manifest without partitions
+    """
+
+    return {
+        "version": MANIFEST_VERSION,
+        "batch": batch_name,
+        "partition_column": partition_column,
+        "selection": selection,
+        "created": _now(),
+        "partitions": {},
+    }
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Loads a manifest, returns None if it does not exist
+
+    Args:
+        manifest_path (str): path of the manifest
+
+    Returns:
+        manifest (dict): loaded manifest or None
+    """
+
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Manifest {manifest_path} has version {manifest.get('version')}, "
+                         f"expected {MANIFEST_VERSION}")
+
+    return manifest
+
+
+def write_manifest(manifest: dict, manifest_path: str) -> None:
+    """
+    Writes the manifest next to its destination, flushes it to disk and renames it,
+    so a crash leaves either the previous or the new manifest
+
+    Args:
+        manifest (dict): manifest to write
+        manifest_path (str): path of the manifest, its directory is created if needed
+    """
+
+    with atomic_file.atomic_path(manifest_path, durable=True) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+
+
+def settings_hash(config_dict: dict, password: str = "test") -> str:
+    """
+    Hashes the settings shared by every partition: the output settings of
+    config.json, the content of the template files and the password
+
+    Args:
+        config_dict (dict): loaded config.json
+        password (str): sheet password
+
+    Returns:
+        digest (str): hex digest of the settings
+    """
+
+    digest = hashlib.sha256()
+    settings = {name: config_dict.get(name) for name in OUTPUT_SETTINGS}
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(password.encode("utf-8"))
+
+    templates = config_dict.get("templates", template_registry.DEFAULT_TEMPLATES)
+    for template_path in sorted({template["path"] for template in templates.values()}):
+        with open(template_path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+def partition_hash(rows: pd.DataFrame, settings_digest: str) -> str:
+    """
+    Hashes the rows of a partition together with the shared settings
+
+    Args:
+        rows (pd.DataFrame): rows of the partition
+        settings_digest (str): result of settings_hash
+
+    Returns:
+        digest (str): hex digest of the partition inputs
+    """
+
+    digest = hashlib.sha256(settings_digest.encode("utf-8"))
+    digest.update(json.dumps([str(column) for column in rows.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def partition_keys(final_df: pd.DataFrame, partition_column: str) -> pd.Series:
+    """
+    Returns the partition key of every row
+
+    Args:
+        final_df (pd.DataFrame): transformed data with spreadsheet headers
+        partition_column (str): header to partition by
+
+    Returns:
+        keys (pd.Series): partition key of every row, MISSING_PARTITION for rows without a value
+
+    Raises:
+        ValueError: if the column is missing, or holds MISSING_PARTITION next to missing values
+    """
+
+    if partition_column not in final_df.columns:
+        raise ValueError(f"Partition column: {partition_column} not found in the extract.")
+
+    keys = final_df[partition_column].astype("string")
+    missing = keys.isna()
+    if missing.any() and (keys[~missing] == MISSING_PARTITION).any():
+        raise ValueError(f"Partition column: {partition_column} holds the value {MISSING_PARTITION}, "
+                         f"which is the key of rows without a value")
+
+    return keys.fillna(MISSING_PARTITION)
+
+
+def iter_partitions(final_df: pd.DataFrame, partition_column: str):
+    """
+    Splits the dataframe by the values of the partition column, in sorted order of the keys
+
+    Args:
+        final_df (pd.DataFrame): transformed data with spreadsheet headers
+        partition_column (str): header to partition by
+
+    Yields:
+        key (str): partition key, MISSING_PARTITION for rows without a value
+        rows (pd.DataFrame): rows of the partition in extract order
+    """
+
+    keys = partition_keys(final_df, partition_column)
+    for key in sorted(keys.unique()):
+        yield key, final_df[(keys == key).to_numpy()].reset_index(drop=True)
+
+
+def output_file_name(batch_name: str, key: str, output_name: str = None) -> str:
+    """
+    Returns the file name of a partition, suffixed with the template name when the
+    registry has several templates. Keys that are not valid file names are
+    sanitized and suffixed with a hash of the key, so "A B" and "A_B" differ.
+
+    Args:
+        batch_name (str): name of the batch
+        key (str): partition key
+        output_name (str): template name from populate_templates
+
+    Returns:
+        file_name (str): file name ending with .xlsx
+    """
+
+    safe_key = re.sub(r"[^A-Za-z0-9._-]+", "_", key).strip("_") or "_"
+    if safe_key != key:
+        safe_key += "_" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:KEY_HASH_DIGITS]
+
+    if output_name is None:
+        return f"{batch_name}_{safe_key}.xlsx"
+    return f"{batch_name}_{safe_key}_{output_name}.xlsx"
+
+
+def check_file_names(batch_name: str, keys: list) -> None:
+    """
+    Checks that no two partitions are saved under the same file name, compared
+    without case for case-insensitive file systems
+
+    Args:
+        batch_name (str): name of the batch
+        keys (list): partition keys
+
+    Raises:
+        ValueError: listing the partitions whose file names collide
+    """
+
+    names = {}
+    for key in keys:
+        names.setdefault(output_file_name(batch_name, key).lower(), []).append(key)
+
+    collisions = [" and ".join(map(repr, colliding)) for colliding in names.values() if len(colliding) > 1]
+    if collisions:
+        raise ValueError("Partitions would be saved under the same file name: " + "; ".join(collisions))
+
+
+def requeue(manifest: dict, keys: list = None) -> list:
+    """
+    Marks partitions as pending so the next run generates them again
+
+    Args:
+        manifest (dict): loaded manifest
+        keys (list): partition keys to requeue, every partition if None
+
+    Returns:
+        requeued (list): requeued partition keys
+    """
+
+    if keys is None:
+        keys = list(manifest["partitions"])
+
+    for key in keys:
+        if key not in manifest["partitions"]:
+            raise ValueError(f"Partition: {key} not found in the manifest.")
+        manifest["partitions"][key]["status"] = "pending"
+
+    return keys
+
+
+def run_batch(final_df: pd.DataFrame, config_dict: dict, partition_column: str, batch_name: str,
+              manifest_path: str = None, sheets_directory: str = None, password: str = "test",
+              metrics=None, plan: dict = None, selection: dict = None) -> dict:
+    """
+    Generates one set of CTS files per partition of the extract, skipping the
+    partitions completed by an earlier run with the same inputs. A failed partition
+    is recorded in the manifest and the batch continues with the next one.
+
+    The manifest records the claim selection of the batch. A run with another
+    selection is rejected, since it would replace the partition files of the
+    batch with files holding only the selected rows.
+
+    Args:
+        final_df (pd.DataFrame): transformed data with spreadsheet headers
+        config_dict (dict): loaded config.json
+        partition_column (str): header to partition by
+        batch_name (str): name of the batch, prefix of every output file
+        manifest_path (str): path of the manifest, defaults to <batch_name>.manifest.json
+                             in the sheets directory
+        sheets_directory (str): directory to save to, defaults to generated_sheets
+        password (str): password used to protect every sheet
+        metrics (run_metrics.RunMetrics): receives the rows, cells, styles and files written
+        plan (dict): compiled plan from config_compiler, see template_registry.populate_templates
+        selection (dict): claim selection final_df was read with, see setup_dataframe.select_claims
+
+    Returns:
+        manifest (dict): manifest after the run
+
+    Raises:
+        ValueError: if the manifest belongs to another batch, partition column or selection
+    """
+
+    if sheets_directory is None:
+        sheets_directory = os.path.join(os.path.abspath(os.getcwd()), "generated_sheets")
+    if manifest_path is None:
+        manifest_path = os.path.join(sheets_directory, f"{batch_name}.manifest.json")
+
+    manifest = load_manifest(manifest_path) or new_manifest(batch_name, partition_column, selection)
+    if manifest["partition_column"] != partition_column or manifest["batch"] != batch_name:
+        raise ValueError(f"Manifest {manifest_path} belongs to batch {manifest['batch']} partitioned by "
+                         f"{manifest['partition_column']}")
+
+    # Selections are compared as JSON, the manifest holds lists where the caller may pass tuples
+    if json.loads(json.dumps(manifest.get("selection"))) != json.loads(json.dumps(selection)):
+        raise ValueError(f"Manifest {manifest_path} belongs to a batch with the selection "
+                         f"{manifest.get('selection')}, got {selection}. Use another name or --manifest.")
+
+    save_config = config_dict.get("save", {})
+    settings_digest = settings_hash(config_dict, password)
+
+    # Colliding file names would delete each other's outputs on every rerun
+    check_file_names(batch_name, partition_keys(final_df, partition_column).unique().tolist())
+
+    for key, rows in iter_partitions(final_df, partition_column):
+        input_hash = partition_hash(rows, settings_digest)
+        entry = manifest["partitions"].get(key)
+
+        # Completed with the same inputs and the files are still there
+        if (entry is not None and entry["status"] == "done" and entry["input_hash"] == input_hash
+                and all(os.path.exists(path) for path in entry["outputs"])):
+            continue
+
+        # Remove the files of an interrupted, failed, changed or requeued partition
+        if entry is not None:
+            for path in entry["outputs"]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        entry = {"input_hash": input_hash, "rows": rows.shape[0], "outputs": [], "status": "running",
+                 "started": _now()}
+        manifest["partitions"][key] = entry
+
+        try:
+            workbooks = template_registry.populate_templates(rows, config_dict, password, metrics=metrics, plan=plan)
+
+            # Record the outputs before saving, so a crash while saving leaves no untracked file
+            file_names = {}
+            for output_name in workbooks:
+                file_names[output_name] = output_file_name(batch_name, key,
+                                                           output_name if len(workbooks) > 1 else None)
+            entry["outputs"] = [os.path.join(sheets_directory, name) for name in file_names.values()]
+            write_manifest(manifest, manifest_path)
+
+            for output_name, workbook in workbooks.items():
+                save_path = export_excel.save_workbook(workbook, file_names[output_name],
+                                                       compresslevel=save_config.get("compresslevel", 6),
+                                                       workers=save_config.get("workers"),
+                                                       sheets_directory=sheets_directory,
+                                                       precompressed=template_blob.precompressed_parts(
+                                                           save_config.get("compresslevel", 6)))
+                if metrics is not None:
+                    metrics.add("files_written")
+                    metrics.add("bytes_written", os.path.getsize(save_path))
+
+            entry["status"] = "done"
+            if metrics is not None:
+                metrics.add("rows", rows.shape[0])
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = f"{type(e).__name__}: {e}"
+
+        entry["finished"] = _now()
+        write_manifest(manifest, manifest_path)
+
+    return manifest
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.job_manifest")
+    parser.add_argument("manifest", type=str, help="Path of the job manifest")
+    parser.add_argument("--requeue", nargs="*", metavar="PARTITION",
+                        help="Requeue the given partitions, or every partition if none are given")
+    args = parser.parse_args()
+
+    batch_manifest = load_manifest(args.manifest)
+    if batch_manifest is None:
+        raise ValueError(f"Manifest {args.manifest} does not exist")
+
+    if args.requeue is not None:
+        requeued = requeue(batch_manifest, args.requeue or None)
+        write_manifest(batch_manifest, args.manifest)
+        print(f"Requeued {len(requeued)} partitions")
+
+    for partition_key, partition in batch_manifest["partitions"].items():
+        print(f"{partition_key:<30}{partition['status']:<10}{partition['rows']:>8}  {', '.join(partition['outputs'])}")
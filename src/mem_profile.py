@@ -0,0 +1,582 @@
+"""
+Module: mem_profile
+Description: This module profiles the allocations of a generation run. While a profile
+             is running, tracemalloc traces every allocation of the process and each
+             stage of run_metrics.RunMetrics (config, setup, export, save) is enclosed
+             in a pair of snapshots. For every stage the report lists:
+                peak_bytes: highest traced memory above the start of the stage
+                net_bytes: memory still allocated at the end of the stage
+                sites: top allocation sites (file:line) by memory retained at the end
+                       of the stage
+                objects: openpyxl Cell, Alignment, Protection and StyleArray objects
+                         created, in total and per 1,000 rows
+
+             Grouping the snapshots while tracemalloc traces the grouping itself is
+             several times slower, so the snapshots are dumped to a temporary
+             directory during the run and compared once tracing has stopped.
+
+             Allocations freed before the end of a stage do not appear in the sites,
+             their cost shows in peak_bytes and in the object counts. Only the main
+             process is traced, row_pipeline and save workers running in other
+             processes are not.
+
+             Two reports, e.g. before and after a memory optimization, are compared
+             stage by stage. Growth of the peak or of the objects per 1,000 rows above
+             a threshold is reported as a regression.
+
+             Settings under "memprofile" in config.json:
+                directory: directory of the reports and comparisons
+                top_sites: allocation sites listed per stage
+                frames: frames stored per traced allocation
+                baseline: report compared with every run, null to compare with the
+                          latest report in the directory
+                max_regression: growth in percent reported as a regression
+
+             Usage:
+                python main.py -n claims.xlsx --memprofile
+                python -m src.mem_profile before.memprofile.json after.memprofile.json
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import datetime
+import tempfile
+import importlib
+import sysconfig
+import contextlib
+import tracemalloc
+from src import atomic_file
+
+# Report format version
+REPORT_VERSION = 1
+
+# Defaults of the "memprofile" settings
+DEFAULT_DIRECTORY = "logs/memprofile"
+DEFAULT_TOP_SITES = 15
+DEFAULT_FRAMES = 1
+DEFAULT_MAX_REGRESSION = 10.0
+
+# Suffix of the report files, the baseline search only considers these
+REPORT_SUFFIX = ".memprofile.json"
+
+# openpyxl classes whose instances are counted, "module:class"
+TRACKED_CLASSES = (
+    "openpyxl.cell.cell:Cell",
+    "openpyxl.styles.alignment:Alignment",
+    "openpyxl.styles.protection:Protection",
+    "openpyxl.styles.cell_style:StyleArray",
+)
+
+# Standard library files are named relative to this directory
+STDLIB_DIRECTORY = sysconfig.get_paths()["stdlib"]
+
+# Allocation sites of the profiler itself, left out of the stage measurements
+EXCLUDED_FILES = (
+    tracemalloc.__file__,
+    __file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+
+def _site(frame: tracemalloc.Frame) -> str:
+    """
+    Helper function naming an allocation site as file:line, relative to the
+    site-packages, standard library or working directory
+    """
+
+    filename = frame.filename
+    if "site-packages" in filename:
+        filename = filename.split("site-packages", 1)[1].lstrip("/\\")
+    elif filename.startswith(STDLIB_DIRECTORY):
+        filename = os.path.relpath(filename, STDLIB_DIRECTORY)
+    elif os.path.isabs(filename) and filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+
+    return f"{filename}:{frame.lineno}"
+
+
+class ObjectCounter:
+    def __init__(self, classes: tuple = TRACKED_CLASSES):
+        """
+        Counts the instances created of a set of classes by wrapping their
+        constructors. The constructors are restored by uninstall.
+
+        Args:
+            classes (tuple): "module:class" names, see TRACKED_CLASSES
+
+        Attributes:
+            counts (dict): class name -> instances created since install
+        """
+
+        self.classes = classes
+        self.counts = {}
+        self._originals = []
+
+    def install(self) -> None:
+        """
+        Wraps the constructor of every class
+        """
+
+        for name in self.classes:
+            module_name, class_name = name.split(":")
+            cls = getattr(importlib.import_module(module_name), class_name)
+            self.counts[class_name] = 0
+
+            # StyleArray is an array subclass built in __new__, the others are built in __init__
+            method = "__new__" if "__new__" in vars(cls) else "__init__"
+            self._originals.append((cls, method, vars(cls).get(method)))
+            setattr(cls, method, self._wrap(class_name, method, getattr(cls, method) if method == "__init__"
+                                            else vars(cls)[method]))
+
+    def uninstall(self) -> None:
+        """
+        Restores the original constructors
+        """
+
+        # A constructor inherited from a base class is restored by removing the wrapper
+        for cls, method, original in reversed(self._originals):
+            if original is None:
+                delattr(cls, method)
+            else:
+                setattr(cls, method, original)
+        self._originals = []
+
+    def _wrap(self, class_name: str, method: str, original):
+        """
+        Helper function returning a constructor counting its calls
+        """
+
+        counts = self.counts
+
+        if method == "__new__":
+            function = original.__func__ if isinstance(original, staticmethod) else original
+
+            def counted_new(cls, *args, **kwargs):
+                counts[class_name] += 1
+                return function(cls, *args, **kwargs)
+
+            return staticmethod(counted_new)
+
+        def counted_init(instance, *args, **kwargs):
+            counts[class_name] += 1
+            original(instance, *args, **kwargs)
+
+        return counted_init
+
+
+class MemoryProfile:
+    def __init__(self, name: str, top_sites: int = DEFAULT_TOP_SITES, frames: int = DEFAULT_FRAMES):
+        """
+        Initializes the allocation profile of one run.
+
+        Args:
+            name (str): name of the generated file
+            top_sites (int): allocation sites kept per stage
+            frames (int): frames stored per traced allocation
+
+        Attributes:
+            stages (dict): stage name -> runs, peak_bytes, net_bytes, sites and objects,
+                           added up over the runs of a stage
+            counter (ObjectCounter): openpyxl objects created
+        """
+
+        self.name = name
+        self.top_sites = top_sites
+        self.frames = frames
+        self.started = None
+        self.stages = {}
+        self.counter = ObjectCounter()
+        self._depth = 0
+        self._directory = None
+        self._snapshots = []
+
+    def start(self) -> None:
+        """
+        Starts tracing allocations and counting openpyxl objects
+        """
+
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+        self._directory = tempfile.mkdtemp(prefix="memprofile_")
+        self.counter.install()
+        tracemalloc.start(self.frames)
+
+    def stop(self) -> None:
+        """
+        Stops tracing, restores the openpyxl constructors and groups the allocation
+        sites of the snapshots dumped by every stage
+        """
+
+        tracemalloc.stop()
+        self.counter.uninstall()
+
+        try:
+            for name, before_path, after_path in self._snapshots:
+                self._record_sites(name, tracemalloc.Snapshot.load(before_path),
+                                   tracemalloc.Snapshot.load(after_path))
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._snapshots = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Measures the allocations of the enclosed block. A stage nested in another
+        stage is attributed to the outer one.
+
+        Args:
+            name (str): name of the stage
+        """
+
+        if self._depth or not tracemalloc.is_tracing():
+            yield
+            return
+
+        self._depth += 1
+        counts_before = dict(self.counter.counts)
+        paths = [os.path.join(self._directory, f"{len(self._snapshots)}_{side}.snapshot")
+                 for side in ("before", "after")]
+
+        # The snapshot is released once dumped, the peak is measured from the memory left
+        tracemalloc.take_snapshot().dump(paths[0])
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - traced_before
+            tracemalloc.take_snapshot().dump(paths[1])
+            self._depth -= 1
+
+            stage = self.stages.setdefault(name, {"runs": 0, "peak_bytes": 0, "net_bytes": 0, "sites": {},
+                                                  "objects": dict.fromkeys(self.counter.counts, 0)})
+            stage["runs"] += 1
+            stage["peak_bytes"] = max(stage["peak_bytes"], peak)
+            for class_name, count in self.counter.counts.items():
+                stage["objects"][class_name] += count - counts_before.get(class_name, 0)
+            self._snapshots.append((name, *paths))
+
+    def _record_sites(self, name: str, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> None:
+        """
+        Helper function adding the allocation sites of one run of a stage to its totals
+        """
+
+        stage = self.stages[name]
+
+        # Sites are grouped by file and line, the first frame of the traceback is the allocation
+        for stat in after.compare_to(before, "lineno"):
+            frame = stat.traceback[0]
+            if frame.filename in EXCLUDED_FILES:
+                continue
+
+            stage["net_bytes"] += stat.size_diff
+            if stat.size_diff or stat.count_diff:
+                site = stage["sites"].setdefault(_site(frame), [0, 0])
+                site[0] += stat.size_diff
+                site[1] += stat.count_diff
+
+    def report(self, rows: int, status: str = "ok") -> dict:
+        """
+        Returns the profile as a JSON serializable dict, once the profile has stopped
+
+        Args:
+            rows (int): rows written by the run, objects are also reported per 1,000 rows
+            status (str): "ok" if the run completed, "error" otherwise, see run_metrics.RunMetrics
+
+        Returns:
+            report (dict): run identification and the measurements of every stage
+        """
+
+        stages = {}
+        for name, stage in self.stages.items():
+            sites = sorted(stage["sites"].items(), key=lambda item: item[1][0], reverse=True)[:self.top_sites]
+            stages[name] = {
+                "runs": stage["runs"],
+                "peak_bytes": stage["peak_bytes"],
+                "net_bytes": stage["net_bytes"],
+                "sites": [{"site": site, "size_bytes": size, "count": count} for site, (size, count) in sites],
+                "objects": dict(stage["objects"]),
+                "objects_per_1k_rows": {class_name: count * 1000 / rows if rows else None
+                                        for class_name, count in stage["objects"].items()},
+            }
+
+        return {
+            "version": REPORT_VERSION,
+            "name": self.name,
+            "started": self.started,
+            "status": status,
+            "rows": rows,
+            "frames": self.frames,
+            "stages": stages,
+        }
+
+
+def write_report(report: dict, report_path: str) -> None:
+    """
+    Writes a report or a comparison next to its destination and renames it
+
+    Args:
+        report (dict or str): result of MemoryProfile.report, or a formatted comparison
+        report_path (str): path of the file, its directory is created if needed
+    """
+
+    with atomic_file.atomic_path(report_path) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            if isinstance(report, str):
+                f.write(report)
+            else:
+                json.dump(report, f, indent=4)
+
+
+def load_report(report_path: str) -> dict:
+    """
+    Loads a report written by write_report
+
+    Args:
+        report_path (str): path of the report
+
+    Returns:
+        report (dict): result of MemoryProfile.report
+
+    Raises:
+        ValueError: if the file is not a report of this version
+    """
+
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+
+    if not isinstance(report, dict) or report.get("version") != REPORT_VERSION:
+        raise ValueError(f"{report_path} is not a version {REPORT_VERSION} allocation report")
+
+    return report
+
+
+def find_baseline(directory: str, exclude: str = None) -> str:
+    """
+    Returns the most recently written report of a completed run in a directory.
+    Reports of failed runs stop at the failing stage and are never a baseline.
+
+    Args:
+        directory (str): directory of the reports
+        exclude (str): report of the current run
+
+    Returns:
+        report_path (str): path of the latest other report, None if there is none
+    """
+
+    candidates = [path for path in glob.glob(os.path.join(directory, f"*{REPORT_SUFFIX}"))
+                  if exclude is None or os.path.abspath(path) != os.path.abspath(exclude)]
+
+    for path in sorted(candidates, key=os.path.getmtime, reverse=True):
+        try:
+            if load_report(path).get("status") == "ok":
+                return path
+        except (OSError, ValueError):
+            continue
+
+    return None
+
+
+def _change(baseline, candidate):
+    """
+    Helper function returning the relative change in percent, None if it is undefined
+    """
+
+    if baseline is None or candidate is None or baseline == 0:
+        return None
+    return (candidate - baseline) * 100 / baseline
+
+
+def compare_reports(baseline: dict, candidate: dict, max_regression: float = DEFAULT_MAX_REGRESSION) -> dict:
+    """
+    Compares two reports stage by stage
+
+    Args:
+        baseline (dict): report of the reference run
+        candidate (dict): report of the run being checked
+        max_regression (float): growth in percent of a stage peak or of objects per
+                                1,000 rows reported as a regression
+
+    Returns:
+        comparison (dict): per stage measurements of both runs with their change,
+                           the allocation sites that changed the most and the list
+                           of regressions
+    """
+
+    stages = {}
+    regressions = []
+
+    for name in list(dict.fromkeys([*baseline["stages"], *candidate["stages"]])):
+        before = baseline["stages"].get(name, {})
+        after = candidate["stages"].get(name, {})
+
+        # Peak and retained memory
+        measurements = {}
+        for key in ("peak_bytes", "net_bytes"):
+            measurements[key] = [before.get(key), after.get(key), _change(before.get(key), after.get(key))]
+
+        # openpyxl objects are compared per 1,000 rows so that runs of different sizes compare
+        objects_before = before.get("objects_per_1k_rows", {})
+        objects_after = after.get("objects_per_1k_rows", {})
+        objects = {}
+        for class_name in dict.fromkeys([*objects_before, *objects_after]):
+            value_before, value_after = objects_before.get(class_name), objects_after.get(class_name)
+            objects[class_name] = [value_before, value_after, _change(value_before, value_after)]
+
+        for label, (value_before, value_after, change) in [("peak_bytes", measurements["peak_bytes"]),
+                                                            *objects.items()]:
+            grew_from_zero = not value_before and value_after and value_before is not None
+            if (change is not None and change > max_regression) or grew_from_zero:
+                regressions.append({"stage": name, "measure": label, "baseline": value_before,
+                                    "candidate": value_after, "change": change})
+
+        # Sites listed in either report, ordered by the change of their retained memory
+        sites_before = {site["site"]: site["size_bytes"] for site in before.get("sites", [])}
+        sites_after = {site["site"]: site["size_bytes"] for site in after.get("sites", [])}
+        sites = [[site, sites_before.get(site, 0), sites_after.get(site, 0)]
+                 for site in dict.fromkeys([*sites_before, *sites_after])]
+        sites.sort(key=lambda site: abs(site[2] - site[1]), reverse=True)
+
+        stages[name] = {**measurements, "objects_per_1k_rows": objects, "sites": sites}
+
+    return {
+        "baseline": {"name": baseline.get("name"), "started": baseline.get("started"), "rows": baseline.get("rows")},
+        "candidate": {"name": candidate.get("name"), "started": candidate.get("started"),
+                      "rows": candidate.get("rows")},
+        "max_regression": max_regression,
+        "stages": stages,
+        "regressions": regressions,
+    }
+
+
+def format_comparison(comparison: dict, top_sites: int = 10) -> str:
+    """
+    Formats a comparison as a Markdown report
+
+    Args:
+        comparison (dict): result of compare_reports
+        top_sites (int): changed allocation sites listed per stage
+
+    Returns:
+        text (str): tables of the measurements and sites of every stage
+    """
+
+    def number(value, scale=1.0, digits=1):
+        return "-" if value is None else f"{value / scale:,.{digits}f}"
+
+    def change(value):
+        return "-" if value is None else f"{value:+.1f}%"
+
+    baseline, candidate = comparison["baseline"], comparison["candidate"]
+    lines = [
+        "# Allocation profile comparison",
+        "",
+        f"Baseline:  {baseline['name']} ({baseline['started']}, {baseline['rows']} rows)",
+        f"Candidate: {candidate['name']} ({candidate['started']}, {candidate['rows']} rows)",
+    ]
+
+    for name, stage in comparison["stages"].items():
+        lines += ["", f"## Stage {name}", "", "| Measure | Baseline | Candidate | Change |", "|---|---:|---:|---:|"]
+        for key, label in (("peak_bytes", "Peak (MB)"), ("net_bytes", "Retained (MB)")):
+            value_before, value_after, value_change = stage[key]
+            lines.append(f"| {label} | {number(value_before, 1e6, 2)} | {number(value_after, 1e6, 2)} "
+                         f"| {change(value_change)} |")
+        for class_name, (value_before, value_after, value_change) in stage["objects_per_1k_rows"].items():
+            lines.append(f"| {class_name} per 1k rows | {number(value_before)} | {number(value_after)} "
+                         f"| {change(value_change)} |")
+
+        if stage["sites"]:
+            lines += ["", "| Site | Baseline (KB) | Candidate (KB) |", "|---|---:|---:|"]
+            for site, size_before, size_after in stage["sites"][:top_sites]:
+                lines.append(f"| {site} | {number(size_before, 1e3)} | {number(size_after, 1e3)} |")
+
+    lines += ["", f"## Regressions (more than {comparison['max_regression']:g}% growth)", ""]
+    if comparison["regressions"]:
+        for regression in comparison["regressions"]:
+            scale, unit = (1e6, " MB") if regression["measure"].endswith("_bytes") else (1.0, " per 1k rows")
+            lines.append(f"- {regression['stage']} {regression['measure']}: "
+                         f"{number(regression['baseline'], scale, 2)}{unit} -> "
+                         f"{number(regression['candidate'], scale, 2)}{unit} ({change(regression['change'])})")
+    else:
+        lines.append("None")
+
+    return "\n".join(lines) + "\n"
+
+
+def save_run(report: dict, memprofile_config: dict, baseline_path: str = None) -> tuple:
+    """
+    Writes the report of a run and its comparison with a baseline report. The
+    report is named after the workbook and the start of the run, e.g.
+    claims.20261019-143000.memprofile.json, so earlier reports are kept. Failed
+    runs are reported but not compared, their stages are incomplete.
+
+    Args:
+        report (dict): result of MemoryProfile.report
+        memprofile_config (dict): "memprofile" entry of config.json
+        baseline_path (str): report to compare with, defaults to memprofile.baseline
+                             or the latest report in memprofile.directory
+
+    Returns:
+        report_path (str): path of the written report
+        comparison_path (str): path of the written comparison, None without a baseline or for a failed run
+    """
+
+    directory = memprofile_config.get("directory") or DEFAULT_DIRECTORY
+
+    # The start time keeps the report of a rerun with the same name from replacing the previous one
+    name = os.path.splitext(os.path.basename(report["name"]))[0]
+    started = datetime.datetime.fromisoformat(report["started"]) if report.get("started") else datetime.datetime.now()
+    stem = f"{name}.{started.strftime('%Y%m%d-%H%M%S')}"
+    report_path = os.path.join(directory, f"{stem}{REPORT_SUFFIX}")
+    attempt = 1
+    while os.path.exists(report_path):
+        report_path = os.path.join(directory, f"{stem}-{attempt}{REPORT_SUFFIX}")
+        attempt += 1
+
+    # The baseline is chosen before the report of this run is written
+    baseline_path = baseline_path or memprofile_config.get("baseline") or find_baseline(directory, report_path)
+    write_report(report, report_path)
+
+    if baseline_path is None or report.get("status") != "ok":
+        return report_path, None
+
+    comparison = compare_reports(load_report(baseline_path), report,
+                                 memprofile_config.get("max_regression", DEFAULT_MAX_REGRESSION))
+    comparison_path = report_path[:-len(".json")] + ".compare.md"
+    write_report(format_comparison(comparison), comparison_path)
+
+    return report_path, comparison_path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.mem_profile",
+                                     description="Compare the allocation reports of two runs of main.py --memprofile")
+    parser.add_argument("baseline", type=str, help="Report of the reference run")
+    parser.add_argument("candidate", type=str, help="Report of the run being checked")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="Growth in percent of a stage peak or of objects per 1k rows counted as a regression")
+    parser.add_argument("--output", type=str, help="Write the Markdown report to this file instead of stdout")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    result = compare_reports(load_report(args.baseline), load_report(args.candidate), args.max_regression)
+    text = format_comparison(result)
+
+    if args.output:
+        write_report(text, args.output)
+        print(f"Comparison written to {args.output}")
+    else:
+        print(text, end="")
+
+    if args.fail_on_regression and result["regressions"]:
+        sys.exit(1)
@@ -13,7 +13,7 @@ Description: This module handles the implementation of Data Validation and forma
 
 Author: Urban Halpern
 Original Creation: 2024-12-16
-Latest Revision: 2025-01-16
+Latest Revision: 2026-10-19
 """
 
 import os
@@ -23,6 +23,7 @@ from openpyxl import load_workbook
 from openpyxl.styles import PatternFill, Border, Side, Font, Alignment, Protection
 from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.formatting.rule import FormulaRule
+from src.shared_formula import fill_shared_formula, formula_pattern
 
 
 class CustomSpreadsheet:
@@ -197,7 +198,9 @@ class CustomSpreadsheet:
     def add_value_formula(self, value_formula: str, col: str,):
         """
         Adds a value formula to a specified column in the sheet object. A value formula
-        is a formula applied to a cell that calculates the value in that cell.
+        is a formula applied to a cell that calculates the value in that cell. The column
+        is written as an Excel shared formula, stored once with the range it applies to,
+        unless the formula has relative references that are not row placeholders.
         Example formula: =FLOOR($M{row}*0.17,0.01)
 
         Args:
@@ -208,11 +211,24 @@ class CustomSpreadsheet:
         if not re.search(r"\{row\}", value_formula):
             raise ValueError(f"The provided formula: {value_formula} does not contain a 'row' placeholder.")
 
+        # The keyword argument row represents placeholders in the formula string that will be replaced by the row
+        first_formula = value_formula.format(row=2)
+
+        # Excel shifts every relative reference of a shared formula, so it is only used when
+        # all of them are row placeholders
+        try:
+            shareable = formula_pattern(first_formula, 2) == value_formula
+        except ValueError:
+            shareable = False
+
+        if shareable:
+            fill_shared_formula(self.sheet, col, first_formula, 2, self.range)
+            return
+
         # Start iterating at 2 to skip the header row. Excel rows start at 1
         for row_num in range(2, self.range + 1):
 
             # Apply the formula to each row in the column.
-            # The keyword argument row represents placeholders in the formula string that will be replaced by row_num
             self.sheet[f'{col}{row_num}'] = value_formula.format(row=row_num)
             
     def add_data_validation(self, formula: str,
@@ -0,0 +1,227 @@
+"""
+Module: money
+Description: This module holds the fixed-point money representation of the extract.
+             The money columns listed under "money_columns" in config.json are read as
+             int64 cents right after the fetch and stay integers through the
+             transforms. Totals and shares are computed in integer arithmetic and the
+             cents are converted to display values only when a file is written, so
+             every amount reconciles to the cent with the source.
+
+             FixedPoint evaluates the template formulas exactly: values are integers
+             scaled by a power of ten, rates like 0.17 are exact decimals and FLOOR is
+             an integer floor division. Division is the one inexact operation, its
+             quotient keeps DIVISION_DIGITS more decimals than the dividend. Rows
+             divided by zero are missing, as a #DIV/0! only fails its own cell.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+import pandas as pd
+
+# Cents per currency unit
+CENTS = 100
+
+# Decimals a quotient keeps beyond those of the dividend, rounded half away from zero
+DIVISION_DIGITS = 6
+
+
+def _decimal_cents(value):
+    """
+    Helper function converting one amount to cents. Strings and decimals are parsed
+    exactly, so "1.005" is 101 cents and not the 100 of the nearest float.
+    """
+
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, str):
+        if not value.strip():
+            return None
+        try:
+            value = Decimal(value.strip())
+        except ArithmeticError:
+            raise ValueError(f"Unable to parse the amount {value!r}") from None
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            raise ValueError(f"Unable to parse the amount {value}")
+        return int((value * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    scaled = float(value) * CENTS
+    return int(np.sign(scaled) * np.floor(np.abs(scaled) + 0.5))
+
+
+def to_cents(values: pd.Series) -> pd.Series:
+    """
+    Converts display amounts to int64 cents, rounding half away from zero. Decimal
+    strings and Decimal objects are rounded exactly, floats from their binary value.
+    Columns with missing amounts become the nullable Int64 dtype, Arrow-backed
+    columns stay Arrow-backed.
+
+    Args:
+        values (pd.Series): amounts as floats, integers, decimal strings or Decimal objects
+
+    Returns:
+        cents (pd.Series): amounts in cents
+
+    Raises:
+        ValueError: if an amount is not a number
+    """
+
+    arrow = isinstance(values.dtype, pd.ArrowDtype)
+
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        amounts = values.astype("Float64")
+        scaled = amounts.to_numpy(dtype="float64", na_value=np.nan) * CENTS
+        cents = pd.Series(np.sign(scaled) * np.floor(np.abs(scaled) + 0.5), index=values.index, name=values.name)
+    else:
+        # Text and object columns are parsed one amount at a time
+        cents = pd.Series([_decimal_cents(value) for value in values], index=values.index, name=values.name,
+                          dtype="Int64")
+
+    if arrow:
+        return cents.astype("int64[pyarrow]")
+    if cents.isna().any():
+        return cents.astype("Int64")
+    return cents.astype("int64")
+
+
+def from_cents(cents: pd.Series) -> pd.Series:
+    """
+    Converts cents to display amounts, the nearest float to every exact amount
+
+    Args:
+        cents (pd.Series): amounts in cents
+
+    Returns:
+        amounts (pd.Series): float64 amounts, Float64 if amounts are missing
+    """
+
+    if cents.isna().any():
+        return cents.astype("Float64") / CENTS
+    return cents.astype("int64") / CENTS
+
+
+def _missing(*operands: "FixedPoint"):
+    """
+    Helper function combining the missing masks of the operands of an operation
+    """
+
+    masks = [operand.missing for operand in operands if operand.missing is not None]
+    if not masks:
+        return None
+    return np.logical_or.reduce(np.broadcast_arrays(*masks)) if len(masks) > 1 else masks[0]
+
+
+class FixedPoint:
+    """
+    Exact decimal values: integers scaled by 10 ** -scale. Money operands are in
+    cents, rates are plain numbers. Adding a rate to an amount is rejected since the
+    units would not match. missing marks the values without a result (divided by
+    zero), None if every value has one.
+    """
+
+    def __init__(self, values, scale: int = 0, money: bool = True, missing=None):
+        self.values = values
+        self.scale = scale
+        self.money = money
+        self.missing = missing
+
+    @classmethod
+    def rate(cls, text: str) -> "FixedPoint":
+        """
+        Exact rate from a decimal literal, e.g. "0.17" -> 17 scaled by 10 ** -2
+        """
+
+        sign, digits, exponent = Decimal(text).as_tuple()
+        value = int("".join(map(str, digits))) * (-1 if sign else 1)
+        if exponent > 0:
+            return cls(value * 10 ** exponent, 0, money=False)
+        return cls(value, -exponent, money=False)
+
+    def _rescale(self, scale: int):
+        return self.values * 10 ** (scale - self.scale)
+
+    def __add__(self, other: "FixedPoint") -> "FixedPoint":
+        if self.money != other.money:
+            raise ValueError("Cannot add an amount and a rate")
+        scale = max(self.scale, other.scale)
+        return FixedPoint(self._rescale(scale) + other._rescale(scale), scale, self.money, _missing(self, other))
+
+    def __sub__(self, other: "FixedPoint") -> "FixedPoint":
+        return self + (-other)
+
+    def __neg__(self) -> "FixedPoint":
+        return FixedPoint(-self.values, self.scale, self.money, self.missing)
+
+    def __pos__(self) -> "FixedPoint":
+        return self
+
+    def __mul__(self, other: "FixedPoint") -> "FixedPoint":
+        if self.money and other.money:
+            raise ValueError("Cannot multiply two amounts")
+        return FixedPoint(self.values * other.values, self.scale + other.scale, self.money or other.money,
+                          _missing(self, other))
+
+    def __truediv__(self, other: "FixedPoint") -> "FixedPoint":
+        if other.money and not self.money:
+            raise ValueError("Cannot divide a rate by an amount")
+
+        # Rows divided by zero are missing, the other rows are still computed
+        zero = np.asarray(other.values) == 0
+        missing = _missing(self, other)
+        if np.any(zero):
+            missing = zero if missing is None else np.logical_or(missing, zero)
+
+        # a / b = (A * 10 ** (scale_b + digits) / B) * 10 ** -(scale_a + digits)
+        numerator = self.values * 10 ** (other.scale + DIVISION_DIGITS)
+        denominator = np.where(zero, 1, np.abs(other.values))
+        quotient = np.sign(numerator) * np.sign(other.values) * ((np.abs(numerator) * 2 + denominator)
+                                                                  // (denominator * 2))
+        return FixedPoint(quotient, self.scale + DIVISION_DIGITS, self.money and not other.money, missing)
+
+    def floor(self, significance: "FixedPoint") -> "FixedPoint":
+        """
+        Rounds an amount down to a multiple of the significance, like the FLOOR
+        function of Excel. The significance is an amount, e.g. 0.01 for whole cents.
+        """
+
+        if significance.money:
+            raise ValueError("The significance of FLOOR must be a number")
+
+        # The significance is given in currency units, the amount in cents
+        step = FixedPoint(significance.values * CENTS, significance.scale)
+        scale = max(self.scale, step.scale)
+        return FixedPoint((self._rescale(scale) // step._rescale(scale)) * step.values, step.scale,
+                          missing=self.missing)
+
+    def to_cents(self):
+        """
+        Returns the values as whole cents, rounded half away from zero if the
+        scale is finer than a cent. Missing values are returned as 0, see missing.
+        """
+
+        if self.scale == 0:
+            return np.where(self.missing, 0, self.values) if self.missing is not None else self.values
+        half = 10 ** self.scale // 2
+        cents = np.sign(self.values) * ((np.abs(self.values) + half) // 10 ** self.scale)
+        return np.where(self.missing, 0, cents) if self.missing is not None else cents
+
+
+def total(*amounts: FixedPoint) -> FixedPoint:
+    """
+    Sums amounts exactly, like the SUM function of Excel
+
+    Args:
+        amounts (FixedPoint): amounts to add
+
+    Returns:
+        total (FixedPoint): exact sum
+    """
+
+    result = amounts[0]
+    for amount in amounts[1:]:
+        result = result + amount
+    return result
@@ -0,0 +1,262 @@
+"""
+Module: row_capacity
+Description: This module sizes a populated template sheet to the rows it holds. The
+             template pre-formats a fixed block of rows with styles, formulas, data
+             validation, conditional formatting and a table, so small extracts carry
+             thousands of empty formatted rows and large extracts overflow the block.
+
+             Every range is fitted to the data rows plus a number of slack rows left
+             for manual entry:
+                - rows below the capacity are removed from the sheet
+                - rows past the pre-formatted block receive the styles of its last row
+                - formula columns are filled with one shared formula each
+                - validation, conditional formatting and table ranges are clipped to
+                  the capacity, ranges ending on the last pre-formatted row grow with it
+
+             Settings under "row_capacity" in config.json:
+                slack_rows: empty formatted rows kept after the data
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import copy
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.datavalidation import DataValidationList
+from src.shared_formula import fill_shared_formula, next_shared_index
+
+# Slack rows used when config.json has no "row_capacity" entry
+DEFAULT_SLACK_ROWS = 50
+
+
+def get_slack_rows(config_dict: dict) -> int:
+    """
+    Returns the number of slack rows configured in config.json
+
+    Args:
+        config_dict (dict): loaded config.json
+
+    Returns:
+        slack_rows (int): empty formatted rows kept after the data
+    """
+
+    return config_dict.get("row_capacity", {}).get("slack_rows", DEFAULT_SLACK_ROWS)
+
+
+def capacity_last_row(num_rows: int, slack_rows: int) -> int:
+    """
+    Returns the last formatted row of a sheet holding num_rows data rows below the
+    header row. A sheet always keeps one data row, a table cannot be empty.
+
+    Args:
+        num_rows (int): number of data rows
+        slack_rows (int): empty formatted rows kept after the data
+
+    Returns:
+        last_row (int): one-based index of the last formatted row
+    """
+
+    return max(num_rows + slack_rows + 1, 2)
+
+
+def _column_runs(columns: list) -> list:
+    """
+    Helper function grouping sorted column indexes into (first, last) runs of adjacent columns
+    """
+
+    runs = []
+    for column in columns:
+        if runs and runs[-1][1] == column - 1:
+            runs[-1][1] = column
+        else:
+            runs.append([column, column])
+
+    return runs
+
+
+def columns_past_block(range_lists: list, template_last_row: int) -> set:
+    """
+    Returns the columns whose ranges continue past the pre-formatted block. Ranges
+    of these columns are not grown, the ranges past the block already cover them.
+
+    Args:
+        range_lists (list): MultiCellRange of every rule of the sheet
+        template_last_row (int): last pre-formatted row of the template
+
+    Returns:
+        columns (set): one-based column indexes
+    """
+
+    columns = set()
+    for ranges in range_lists:
+        for cell_range in ranges.ranges:
+            if cell_range.min_row <= template_last_row + 1 <= cell_range.max_row:
+                columns.update(range(cell_range.min_col, cell_range.max_col + 1))
+
+    return columns
+
+
+def fit_ranges(ranges: MultiCellRange, last_row: int, template_last_row: int,
+               covered_columns: set = frozenset()) -> MultiCellRange:
+    """
+    Fits the ranges of a rule to the capacity of the sheet. Ranges starting below
+    the capacity are dropped and the others are clipped to it. When the capacity
+    exceeds the pre-formatted block, ranges ending on its last row are grown to the
+    capacity, except for the columns in covered_columns.
+
+    Args:
+        ranges (MultiCellRange): ranges of a data validation or conditional format
+        last_row (int): last formatted row, see capacity_last_row
+        template_last_row (int): last pre-formatted row of the template
+        covered_columns (set): columns already covered past the block, see columns_past_block
+
+    Returns:
+        fitted (MultiCellRange): fitted ranges, empty if no range is left
+    """
+
+    fitted = MultiCellRange()
+    for cell_range in ranges.ranges:
+        if cell_range.min_row > last_row:
+            continue
+
+        grow = cell_range.max_row == template_last_row and last_row > template_last_row
+        uncovered = [column for column in range(cell_range.min_col, cell_range.max_col + 1)
+                     if column not in covered_columns]
+
+        # Grow the whole range when none of its columns is covered past the block
+        if grow and len(uncovered) == cell_range.max_col - cell_range.min_col + 1:
+            fitted.add(CellRange(min_col=cell_range.min_col, min_row=cell_range.min_row,
+                                 max_col=cell_range.max_col, max_row=last_row))
+            continue
+
+        fitted.add(CellRange(min_col=cell_range.min_col, min_row=cell_range.min_row,
+                             max_col=cell_range.max_col, max_row=min(cell_range.max_row, last_row)))
+
+        if grow:
+            for first, last in _column_runs(uncovered):
+                fitted.add(CellRange(min_col=first, min_row=template_last_row + 1, max_col=last, max_row=last_row))
+
+    return fitted
+
+
+def fit_data_validations(data_validations: DataValidationList, last_row: int,
+                         template_last_row: int) -> DataValidationList:
+    """
+    Returns copies of the data validations fitted to the capacity of the sheet.
+    Validations without a range left are dropped.
+
+    Args:
+        data_validations (DataValidationList): validations of the template sheet
+        last_row (int): last formatted row, see capacity_last_row
+        template_last_row (int): last pre-formatted row of the template
+
+    Returns:
+        fitted (DataValidationList): fitted validations
+    """
+
+    covered_columns = columns_past_block([validation.sqref for validation in data_validations.dataValidation],
+                                         template_last_row)
+
+    fitted = DataValidationList(disablePrompts=data_validations.disablePrompts,
+                                xWindow=data_validations.xWindow, yWindow=data_validations.yWindow)
+    for validation in data_validations.dataValidation:
+        sqref = fit_ranges(validation.sqref, last_row, template_last_row, covered_columns)
+        if sqref.ranges:
+            validation = copy.copy(validation)
+            validation.sqref = sqref
+            fitted.append(validation)
+
+    return fitted
+
+
+def fit_conditional_formatting(conditional_formatting: ConditionalFormattingList, last_row: int,
+                               template_last_row: int) -> ConditionalFormattingList:
+    """
+    Returns the conditional formatting fitted to the capacity of the sheet. The rules
+    are shared with the template sheet, formats without a range left are dropped.
+
+    Args:
+        conditional_formatting (ConditionalFormattingList): formatting of the template sheet
+        last_row (int): last formatted row, see capacity_last_row
+        template_last_row (int): last pre-formatted row of the template
+
+    Returns:
+        fitted (ConditionalFormattingList): fitted formatting
+    """
+
+    covered_columns = columns_past_block([formatting.sqref for formatting in conditional_formatting],
+                                         template_last_row)
+
+    fitted = ConditionalFormattingList()
+    for formatting in conditional_formatting:
+        sqref = fit_ranges(formatting.sqref, last_row, template_last_row, covered_columns)
+        if sqref.ranges:
+            for rule in formatting.rules:
+                fitted.add(str(sqref), rule)
+
+    return fitted
+
+
+def fit_tables(sheet, last_row: int) -> None:
+    """
+    Ends the tables of the sheet and their filters on the last formatted row
+
+    Args:
+        sheet (openpyxl.worksheet.worksheet.Worksheet): sheet with the tables
+        last_row (int): last formatted row, see capacity_last_row
+    """
+
+    for table in sheet.tables.values():
+        table_range = CellRange(table.ref)
+        table_range.max_row = max(last_row, table_range.min_row + 1)
+        table.ref = table_range.coord
+        if table.autoFilter is not None:
+            table.autoFilter.ref = table.ref
+
+
+def fit_sheet(sheet, layout: dict, num_rows: int, slack_rows: int = DEFAULT_SLACK_ROWS) -> int:
+    """
+    Sizes a loaded template sheet to num_rows data rows plus slack_rows before the
+    data is inserted. Protection is applied afterwards with the returned capacity.
+
+    Args:
+        sheet (openpyxl.worksheet.worksheet.Worksheet): template sheet
+        layout (dict): compiled layout of the sheet from template_registry
+        num_rows (int): number of data rows that will be inserted
+        slack_rows (int): empty formatted rows kept after the data
+
+    Returns:
+        last_row (int): last formatted row of the sheet
+    """
+
+    template_last_row = layout["max_row"]
+    last_row = capacity_last_row(num_rows, slack_rows)
+
+    # Remove the pre-formatted rows below the capacity
+    for key in [key for key in sheet._cells if key[0] > last_row]:
+        del sheet._cells[key]
+    for row in [row for row in sheet.row_dimensions if row > last_row]:
+        del sheet.row_dimensions[row]
+
+    # Format the rows past the pre-formatted block like its last row
+    if last_row > template_last_row:
+        styles = {column: cell._style for (row, column), cell in sheet._cells.items()
+                  if row == template_last_row and cell.has_style}
+        for row in range(template_last_row + 1, last_row + 1):
+            for column, style in styles.items():
+                sheet.cell(row=row, column=column)._style = copy.copy(style)
+
+    # One shared formula per formula column replaces the formula of every row
+    si = next_shared_index(sheet)
+    for column_letter, formula in layout["formulas"].items():
+        fill_shared_formula(sheet, column_letter, formula, 2, last_row, si)
+        si += 1
+
+    sheet.data_validations = fit_data_validations(sheet.data_validations, last_row, template_last_row)
+    sheet.conditional_formatting = fit_conditional_formatting(sheet.conditional_formatting, last_row,
+                                                              template_last_row)
+    fit_tables(sheet, last_row)
+
+    return last_row
@@ -0,0 +1,517 @@
+"""
+Module: row_pipeline
+Description: This module is a pandas-free generation path for the plain case of renaming
+             headers, parsing dates and writing values. Rows are read with a sqlite3
+             cursor whose row factory places every database field at its template column
+             and parses ISO dates with datetime.date.fromisoformat. The rows are streamed
+             into a write-only worksheet that reproduces the template sheet (header row,
+             column widths, cell styles, formula columns, data validation, conditional
+             formatting, table and protection), so memory stays constant in the number
+             of rows. The ranges of the sheet are sized to the written rows plus the
+             slack rows of row_capacity. The cover sheet of the template is not copied.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import io
+import os
+import copy
+import shutil
+import datetime
+import tempfile
+import warnings
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from et_xmlfile import xmlfile
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.styles import Protection
+from openpyxl.utils import column_index_from_string, get_column_letter
+from src import export_excel, row_capacity, setup_dataframe, template_blob
+from src.shared_formula import SharedFormula, formula_pattern
+from src.template_registry import compile_layout
+
+# Value of a slack row in the rows passed to the writers, see write_rows
+SLACK_ROW = None
+
+
+def build_row_factory(field_names: list, mapping_dict: dict, date_columns: list, headers: dict):
+    """
+    Builds a sqlite3 row factory that returns each row as a list ordered by the
+    template columns. Fields without a template column are dropped and date
+    fields are parsed into datetime.date objects.
+
+    Args:
+        field_names (list): database fields in query order
+        mapping_dict (dict): database_fields_to_headers from config.json
+        date_columns (list): headers of the date columns
+        headers (dict): header -> column letter from the compiled layout
+
+    Returns:
+        row_factory (callable): (cursor, row) -> list of template width
+    """
+
+    width = max(column_index_from_string(letter) for letter in headers.values())
+
+    placements = []
+    date_positions = []
+    for source, field in enumerate(field_names):
+        header = mapping_dict.get(field, field)
+        letter = headers.get(header)
+
+        # Raise error if the column was not found in the sheet.
+        if letter is None:
+            raise ValueError(f'Specified Column: {header} not found in sheet.')
+
+        target = column_index_from_string(letter) - 1
+        placements.append((target, source))
+        if header in date_columns:
+            date_positions.append(target)
+
+    fromisoformat = datetime.date.fromisoformat
+
+    def row_factory(cursor, row):
+        values = [None] * width
+        for target, source in placements:
+            values[target] = row[source]
+        for target in date_positions:
+            value = values[target]
+            if value:
+                values[target] = fromisoformat(value[:10])
+        return values
+
+    return row_factory
+
+
+def iter_claim_rows(connection_string: str, mapping_dict: dict, date_columns: list, headers: dict,
+                    sqlite_profile: dict = None, selection: dict = None):
+    """
+    Yields the claims of the source table as template-ordered lists
+
+    Args:
+        connection_string (str): path to the SQLite database
+        mapping_dict (dict): database_fields_to_headers from config.json
+        date_columns (list): headers of the date columns
+        headers (dict): header -> column letter from the compiled layout
+        sqlite_profile (dict): connection settings, see setup_dataframe.connect_sqlite
+        selection (dict): filters pushed down into the query, see setup_dataframe.select_claims
+
+    Yields:
+        row (list): values ordered by template column
+    """
+
+    connection = setup_dataframe.connect_sqlite(connection_string, sqlite_profile)
+    try:
+        cursor = connection.execute(*setup_dataframe.select_claims(connection, selection))
+        field_names = [description[0] for description in cursor.description]
+        cursor.row_factory = build_row_factory(field_names, mapping_dict, date_columns, headers)
+
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        connection.close()
+
+
+def _style_prototype(sheet, source_cell, formatting: dict = None, header: str = None, unlocked: bool = False):
+    """
+    Helper function registering the style of a template cell in the write-only
+    workbook and returning its style array, which is copied onto every written cell.
+    The formats of the header are applied with export_excel.get_format and unlocked
+    cells get the protection of export_excel.unlock_column, like the DataFrame route.
+    """
+
+    cell = WriteOnlyCell(sheet)
+    cell.font = copy.copy(source_cell.font)
+    cell.fill = copy.copy(source_cell.fill)
+    cell.border = copy.copy(source_cell.border)
+    cell.number_format = source_cell.number_format
+    cell.alignment = copy.copy(source_cell.alignment)
+    cell.protection = copy.copy(source_cell.protection)
+
+    if header is not None:
+        export_excel.get_format(cell, formatting, header)
+    if unlocked:
+        cell.protection = Protection(locked=False)
+
+    return cell._style
+
+
+def block_formulas(patterns: list, first_row: int, last_row: int, first_si: int) -> tuple:
+    """
+    Returns the formula cell values of a block of rows. Every formula column of the
+    block is one shared formula: the first row holds the formula and the range, the
+    other rows reference it by index.
+
+    Args:
+        patterns (list): formula pattern of every column or None
+        first_row (int): first row of the block
+        last_row (int): last row of the block
+        first_si (int): shared formula index of the first formula column
+
+    Returns:
+        masters (list): value of every formula column in the first row, None elsewhere
+        dependents (list): value of every formula column in the other rows, None elsewhere
+    """
+
+    masters = [None] * len(patterns)
+    dependents = [None] * len(patterns)
+
+    si = first_si
+    for idx, pattern in enumerate(patterns):
+        if pattern is None:
+            continue
+
+        formula = pattern.format(row=first_row)
+        if last_row == first_row:
+            masters[idx] = formula
+        else:
+            letter = get_column_letter(idx + 1)
+            masters[idx] = SharedFormula(si, ref=f"{letter}{first_row}:{letter}{last_row}", text=formula)
+            dependents[idx] = SharedFormula(si)
+        si += 1
+
+    return masters, dependents
+
+
+def _iter_blocks(rows, block_size: int):
+    """
+    Helper function splitting the rows into lists of block_size rows, yielding the
+    index, first row and rows of every block
+    """
+
+    rows = iter(rows)
+    for block_index in itertools.count():
+        block = list(itertools.islice(rows, block_size))
+        if not block:
+            return
+        yield block_index, block_index * block_size + 2, block
+
+
+def _build_cells(sheet, values: list, row_idx: int, prototypes: tuple, formulas: list) -> list:
+    """
+    Helper function building the cells of one data row, or of a slack row if values
+    is SLACK_ROW. The style is set before the value so that binding a value never
+    registers a style of its own.
+    """
+
+    data_prototypes, slack_prototypes = prototypes
+    if values is SLACK_ROW:
+        values = [None] * len(slack_prototypes)
+        prototypes = slack_prototypes
+    else:
+        prototypes = data_prototypes
+
+    cells = []
+    for idx, prototype in enumerate(prototypes):
+        formula = formulas[idx]
+        cell = WriteOnlyCell(sheet)
+        cell._style = copy.copy(prototype)
+        cell.value = values[idx] if formula is None else formula
+        cells.append(cell)
+
+    return cells
+
+
+# State of a rendering process, set by _init_renderer
+_RENDERER = {}
+
+
+def _init_renderer(cell_styles: list, number_formats: list, prototypes: tuple, patterns: list) -> None:
+    """
+    Helper function preparing a rendering process with a copy of the parent's cell
+    styles and number formats, so that the style ids written by the process match
+    the parent's
+    """
+
+    workbook = Workbook(write_only=True)
+    workbook._cell_styles = IndexedList(cell_styles)
+    workbook._number_formats = IndexedList(number_formats)
+    sheet = workbook.create_sheet()
+
+    _RENDERER.update(sheet=sheet, writer=WorksheetWriter(sheet, out=io.BytesIO()), prototypes=prototypes,
+                     patterns=patterns, num_styles=len(cell_styles))
+
+
+def _render_block(start_row: int, rows: list, first_si: int) -> bytes:
+    """
+    Helper function rendering a block of rows into <row> XML fragments with the
+    same writer openpyxl uses for appended rows
+    """
+
+    sheet = _RENDERER["sheet"]
+    writer = _RENDERER["writer"]
+    masters, dependents = block_formulas(_RENDERER["patterns"], start_row, start_row + len(rows) - 1, first_si)
+
+    buffer = io.BytesIO()
+    with xmlfile(buffer) as xf:
+        for row_idx, values in enumerate(rows, start=start_row):
+            formulas = masters if row_idx == start_row else dependents
+            cells = _build_cells(sheet, values, row_idx, _RENDERER["prototypes"], formulas)
+            writer.write_row(xf, sheet._values_to_row(cells, row_idx), row_idx)
+
+    # A new style would have an id unknown to the parent workbook
+    if len(sheet.parent._cell_styles) != _RENDERER["num_styles"]:
+        raise ValueError("A cell value changed the style of its column, rows cannot be rendered in parallel")
+
+    return buffer.getvalue()
+
+
+def render_partitioned(rows, output, cell_styles: list, number_formats: list, prototypes: tuple,
+                       patterns: list, workers: int = None, block_size: int = 5000) -> int:
+    """
+    Splits the rows into contiguous blocks, renders the blocks into <row> XML in
+    parallel processes and writes the fragments to output in row order. At most
+    two blocks per process are in flight, so memory does not grow with the rows.
+
+    Strings are written inline by openpyxl, so only the style ids have to agree
+    between the processes. Shared formula indexes follow from the block index.
+
+    Args:
+        rows (iterable): template-ordered rows from iter_claim_rows
+        output: binary file receiving the fragments
+        cell_styles (list): cell styles registered in the parent workbook
+        number_formats (list): custom number formats registered in the parent workbook
+        prototypes (tuple): style of every column in data rows and in slack rows, see write_rows
+        patterns (list): formula pattern of every column or None
+        workers (int): number of rendering processes, None uses every core
+        block_size (int): rows per block
+
+    Returns:
+        num_rows (int): number of rows rendered
+    """
+
+    workers = workers or os.cpu_count()
+    num_formulas = sum(pattern is not None for pattern in patterns)
+
+    num_rows = 0
+    pending = collections.deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_renderer,
+                             initargs=(cell_styles, number_formats, prototypes, patterns)) as executor:
+        for block_index, start_row, block in _iter_blocks(rows, block_size):
+            pending.append(executor.submit(_render_block, start_row, block, block_index * num_formulas))
+            num_rows += len(block)
+
+            # Write finished blocks in order once enough blocks are queued
+            while len(pending) >= 2 * workers:
+                output.write(pending.popleft().result())
+
+        while pending:
+            output.write(pending.popleft().result())
+
+    return num_rows
+
+
+def _splice_rows(sheet_path: str, fragments) -> None:
+    """
+    Helper function inserting the rendered rows before the end of sheetData in a
+    closed write-only sheet. The sheet holds only the header row at this point.
+    """
+
+    with open(sheet_path, "rb") as f:
+        content = f.read()
+
+    head, tail = content.split(b"</sheetData>", 1)
+
+    fragments.seek(0)
+    with open(sheet_path, "wb") as f:
+        f.write(head)
+        shutil.copyfileobj(fragments, f)
+        f.write(b"</sheetData>")
+        f.write(tail)
+
+
+def write_rows(rows, template_workbook, config_dict: dict, password: str = "test",
+               sheet_name: str = "MAP or COFA", workers: int = 1, block_size: int = 5000, metrics=None,
+               plan_template: dict = None) -> tuple:
+    """
+    Streams template-ordered rows into a write-only workbook that mirrors the
+    template sheet. Rows are flushed to a temporary file as they are appended,
+    the workbook is saved with export_excel.save_workbook.
+
+    The formula columns of every block of rows are written as shared formulas,
+    see block_formulas. With more than one worker the rows are rendered by
+    render_partitioned and the sheet is closed before returning. The saved file
+    is identical to the one written by a single worker with the same block size.
+
+    Args:
+        rows (iterable): template-ordered rows from iter_claim_rows
+        template_workbook (openpyxl.workbook.Workbook): loaded template
+        config_dict (dict): loaded config.json
+        password (str): sheet password
+        sheet_name (str): template sheet to mirror
+        workers (int): number of rendering processes, None uses every core
+        block_size (int): rows per block and per shared formula
+        metrics (run_metrics.RunMetrics): receives the cells written and styles created
+        plan_template (dict): compiled template from config_compiler, its layout and formatting
+                              are used instead of compiling the template sheet
+
+    Returns:
+        workbook (openpyxl.workbook.Workbook): write-only workbook, ready to save
+        num_rows (int): number of data rows written, without the slack rows
+    """
+
+    template_sheet = template_workbook[sheet_name]
+    if plan_template is not None:
+        layout = plan_template["layout"]
+        formatting = plan_template["formatting"]
+    else:
+        layout = compile_layout(template_sheet, config_dict["unprotected_columns"])
+        formatting = config_dict["formatting"]
+    letters_to_headers = {letter: header for header, letter in layout["headers"].items()}
+    width = max(column_index_from_string(letter) for letter in layout["headers"].values())
+
+    workbook = Workbook(write_only=True)
+
+    # Share the differential styles so the dxf ids of copied rules and tables stay valid
+    workbook._differential_styles = template_workbook._differential_styles
+
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.freeze_panes = template_sheet.freeze_panes
+    sheet.protection = copy.copy(template_sheet.protection)
+    sheet.protection.enable()
+    sheet.protection.password = password
+
+    # Column and header dimensions must be set before the first row is written
+    for letter, dimension in template_sheet.column_dimensions.items():
+        sheet.column_dimensions[letter].width = dimension.width
+        sheet.column_dimensions[letter].hidden = dimension.hidden
+    sheet.row_dimensions[1].height = template_sheet.row_dimensions[1].height
+
+    header_cells = []
+    for source_cell in template_sheet[1][:width]:
+        cell = WriteOnlyCell(sheet, value=source_cell.value)
+        cell._style = copy.copy(_style_prototype(sheet, source_cell))
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    # One style per column, copied onto every written cell. Like insert_into_template, the
+    # formats of config.json only apply to the values written in data rows, formula
+    # columns, entry columns and slack rows keep the template style.
+    written_headers = set(config_dict["database_fields_to_headers"].values())
+    data_prototypes = []
+    slack_prototypes = []
+    patterns = []
+    for idx in range(width):
+        letter = get_column_letter(idx + 1)
+        header = letters_to_headers.get(letter)
+        source_cell = template_sheet.cell(row=2, column=idx + 1)
+        unlocked = letter in layout["unlock_columns"]
+        formula = layout["formulas"].get(letter)
+
+        slack_prototypes.append(_style_prototype(sheet, source_cell, unlocked=unlocked))
+        if header in written_headers and formula is None:
+            data_prototypes.append(_style_prototype(sheet, source_cell, formatting, header, unlocked))
+        else:
+            data_prototypes.append(slack_prototypes[-1])
+
+        patterns.append(formula_pattern(formula, 2) if formula else None)
+
+    # Register the column styles up front so that every writer assigns the same style ids
+    for prototype in data_prototypes + slack_prototypes:
+        workbook._cell_styles.add(prototype)
+    prototypes = (data_prototypes, slack_prototypes)
+
+    # Empty formatted rows for manual entry follow the data rows
+    slack_rows = row_capacity.get_slack_rows(config_dict)
+    rows = itertools.chain(rows, itertools.repeat(SLACK_ROW, slack_rows))
+
+    if workers == 1:
+        num_rows = 0
+        num_formulas = sum(pattern is not None for pattern in patterns)
+        for block_index, start_row, block in _iter_blocks(rows, block_size):
+            masters, dependents = block_formulas(patterns, start_row, start_row + len(block) - 1,
+                                                 block_index * num_formulas)
+            for row_idx, values in enumerate(block, start=start_row):
+                formulas = masters if row_idx == start_row else dependents
+                sheet.append(_build_cells(sheet, values, row_idx, prototypes, formulas))
+            num_rows += len(block)
+        fragments = None
+    else:
+        fragments = tempfile.TemporaryFile()
+        num_rows = render_partitioned(rows, fragments, list(workbook._cell_styles),
+                                      list(workbook._number_formats), prototypes, patterns, workers, block_size)
+
+    num_rows -= slack_rows
+    last_row = row_capacity.capacity_last_row(num_rows, slack_rows)
+    last_letter = get_column_letter(width)
+
+    # Validation and conditional formatting ranges are fitted to the written rows
+    sheet.data_validations = row_capacity.fit_data_validations(template_sheet.data_validations, last_row,
+                                                               layout["max_row"])
+    sheet.conditional_formatting = row_capacity.fit_conditional_formatting(template_sheet.conditional_formatting,
+                                                                           last_row, layout["max_row"])
+
+    # Resize the tables to the written rows, the copied tables already have their columns
+    for table in template_sheet.tables.values():
+        table = copy.deepcopy(table)
+        table.ref = f"A1:{last_letter}{last_row}"
+        if table.autoFilter is not None:
+            table.autoFilter.ref = table.ref
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            sheet.add_table(table)
+
+    if metrics is not None:
+        metrics.add("cells_written", num_rows * width)
+        metrics.add("styles_created", len(workbook._cell_styles))
+
+    # Write the tail of the sheet, then place the rendered rows after the header row
+    if fragments is not None:
+        sheet.close()
+        _splice_rows(sheet._writer.out, fragments)
+        fragments.close()
+
+    return workbook, num_rows
+
+
+def generate_lean(connection_string: str, config_dict: dict, password: str = "test",
+                  template_path: str = None, sheet_name: str = "MAP or COFA", workers: int = None,
+                  block_size: int = None, metrics=None, selection: dict = None, plan_template: dict = None) -> tuple:
+    """
+    Runs the pandas-free pipeline from the database to a populated workbook
+
+    Args:
+        connection_string (str): path to the SQLite database
+        config_dict (dict): loaded config.json
+        password (str): sheet password
+        template_path (str): path to the template, defaults to CTS_Example_Template.xlsx
+        sheet_name (str): template sheet to mirror
+        workers (int): number of rendering processes, defaults to row_pipeline.workers in config.json
+        block_size (int): rows per block, defaults to row_pipeline.block_size in config.json
+        metrics (run_metrics.RunMetrics): receives the cells written and styles created
+        selection (dict): filters pushed down into the query, see setup_dataframe.select_claims
+        plan_template (dict): compiled template from config_compiler.lean_template, replaces
+                              template_path and sheet_name
+
+    Returns:
+        workbook (openpyxl.workbook.Workbook): write-only workbook, ready to save
+        num_rows (int): number of rows written
+    """
+
+    pipeline_config = config_dict.get("row_pipeline", {})
+    if workers is None:
+        workers = pipeline_config.get("workers", 1)
+    if block_size is None:
+        block_size = pipeline_config.get("block_size", 5000)
+
+    if plan_template is not None:
+        template_path, sheet_name = plan_template["path"], plan_template["sheet"]
+        template_workbook = template_blob.load_template(template_path, config_dict)
+        layout = plan_template["layout"]
+    else:
+        template_workbook = template_blob.load_template(template_path, config_dict)
+        layout = compile_layout(template_workbook[sheet_name], config_dict["unprotected_columns"])
+
+    rows = iter_claim_rows(connection_string, config_dict["database_fields_to_headers"],
+                           config_dict["date_columns"], layout["headers"], config_dict.get("sqlite"), selection)
+
+    return write_rows(rows, template_workbook, config_dict, password, sheet_name, workers, block_size, metrics,
+                      plan_template)
@@ -0,0 +1,245 @@
+"""
+Module: run_metrics
+Description: This module collects per-run metrics of a generation job: stage timings,
+             row, cell and style counts, bytes written, extract cache hits and misses
+             and the peak resident memory of the process and its worker processes. At
+             the end of the run the metrics are appended to a JSON lines log and can be
+             written to a Prometheus node exporter textfile.
+
+             Settings under "metrics" in config.json:
+                json_log: path of the JSON lines log, null to disable
+                prometheus_textfile: path of the .prom file, null to disable
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+import contextlib
+from src import atomic_file
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Prefix of every Prometheus metric name
+METRIC_PREFIX = "cts_generation"
+
+# Counters reported by every run, in output order
+COUNTERS = ("rows", "cells_written", "styles_created", "bytes_written", "files_written", "cache_hits",
+            "cache_misses")
+
+
+def get_peak_rss(children: bool = False) -> int:
+    """
+    Returns the peak resident set size of the process in bytes, or None where the
+    resource module is not available
+
+    Args:
+        children (bool): add the peak of the largest child process that has exited,
+                         e.g. a worker of a process pool that has been shut down
+
+    Returns:
+        peak_rss (int): peak resident memory in bytes
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak += resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+class RunMetrics:
+    def __init__(self, name: str):
+        """
+        Initializes the metrics of one run.
+
+        Args:
+            name (str): name of the generated file
+
+        Attributes:
+            started (float): unix time at the start of the run
+            stages (dict): stage name -> seconds, in execution order
+            counters (dict): counter name -> value, see COUNTERS
+            status (str): "ok" once the run has completed, "error" otherwise
+            error (str): exception that ended a failed run
+            profiler (mem_profile.MemoryProfile): allocation profile measured around every
+                                                  stage, None unless main.py --memprofile
+        """
+
+        self.name = name
+        self.started = time.time()
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.status = "error"
+        self.error = None
+        self.profiler = None
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Times the enclosed block as a stage, and profiles its allocations when a
+        profiler is attached. Time spent in a stage that runs several times is added up.
+
+        Args:
+            name (str): name of the stage
+        """
+
+        profile = self.profiler.stage(name) if self.profiler is not None else contextlib.nullcontext()
+
+        start = time.perf_counter()
+        try:
+            with profile:
+                yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add(self, counter: str, value: int = 1) -> None:
+        """
+        Increments a counter
+
+        Args:
+            counter (str): name of the counter, one of COUNTERS
+            value (int): amount to add
+        """
+
+        self.counters[counter] += value
+
+    def as_dict(self) -> dict:
+        """
+        Returns the metrics as a JSON serializable dict
+
+        Returns:
+            metrics (dict): run identification, status, stage timings and counters
+        """
+
+        total = time.perf_counter() - self._start
+        rows = self.counters["rows"]
+
+        return {
+            "name": self.name,
+            "started": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "status": self.status,
+            "error": self.error,
+            "total_seconds": total,
+            "stages": dict(self.stages),
+            **self.counters,
+            "rows_per_second": rows / total if total > 0 else None,
+            # Workers of the run have exited by now, the largest one is included
+            "peak_rss_bytes": get_peak_rss(children=True),
+        }
+
+
+def append_json_line(metrics: dict, log_path: str) -> None:
+    """
+    Appends the metrics of a run as one line to a JSON lines log
+
+    Args:
+        metrics (dict): result of RunMetrics.as_dict
+        log_path (str): path of the log, its directory is created if needed
+    """
+
+    log_dir = os.path.dirname(log_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(metrics) + "\n")
+
+
+def format_prometheus(metrics: dict) -> str:
+    """
+    Formats the metrics of a run in the Prometheus text exposition format
+
+    Args:
+        metrics (dict): result of RunMetrics.as_dict
+
+    Returns:
+        text (str): gauges of the last run
+    """
+
+    lines = []
+
+    def gauge(name, help_text, samples):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{METRIC_PREFIX}_{name}{label_text} {value}")
+
+    gauge("success", "1 if the last run completed", [({}, int(metrics["status"] == "ok"))])
+    gauge("last_run_timestamp_seconds", "Start of the last run",
+          [({}, int(datetime.datetime.fromisoformat(metrics["started"]).timestamp()))])
+    gauge("duration_seconds", "Duration of the last run", [({}, metrics["total_seconds"])])
+    gauge("stage_duration_seconds", "Duration of each stage of the last run",
+          [({"stage": stage}, seconds) for stage, seconds in metrics["stages"].items()])
+
+    for counter in COUNTERS:
+        gauge(counter, f"{counter.replace('_', ' ').capitalize()} in the last run", [({}, metrics[counter])])
+
+    if metrics["rows_per_second"] is not None:
+        gauge("rows_per_second", "Throughput of the last run", [({}, metrics["rows_per_second"])])
+    if metrics["peak_rss_bytes"] is not None:
+        gauge("peak_rss_bytes", "Peak resident memory of the last run", [({}, metrics["peak_rss_bytes"])])
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(metrics: dict, textfile_path: str) -> None:
+    """
+    Writes the metrics to a node exporter textfile. The file is written next to
+    its destination and renamed, so the exporter never reads a partial file.
+
+    Args:
+        metrics (dict): result of RunMetrics.as_dict
+        textfile_path (str): path of the .prom file, its directory is created if needed
+    """
+
+    with atomic_file.atomic_path(textfile_path) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(format_prometheus(metrics))
+
+
+def emit(run: RunMetrics, metrics_config: dict) -> dict:
+    """
+    Writes the metrics of a run to the outputs enabled in config.json. emit runs
+    after failed runs too, so an output that cannot be written is reported on
+    stderr instead of raising over the error of the run.
+
+    Args:
+        run (RunMetrics): metrics of the finished run
+        metrics_config (dict): "metrics" entry of config.json
+
+    Returns:
+        metrics (dict): the written metrics
+    """
+
+    metrics = run.as_dict()
+
+    outputs = [(append_json_line, metrics_config.get("json_log")),
+               (write_prometheus_textfile, metrics_config.get("prometheus_textfile"))]
+    for write, path in outputs:
+        if not path:
+            continue
+        try:
+            write(metrics, path)
+        except Exception as e:
+            print(f"Run metrics not written to {path}: {type(e).__name__}: {e}", file=sys.stderr)
+
+    return metrics
@@ -8,32 +8,276 @@ Description: This module handles the creation of a pandas dataframe from a
 
 Author: Urban Halpern
 Original Creation: 2025-01-17
-Latest Revision: 2025-01-21
+Latest Revision: 2026-10-19
 """
 
 import os
+import zlib
 import sqlite3
+import pathlib
+import datetime
 import pandas as pd
+from src import money
 
-def create_dataframe(connection_string: str) -> pd.DataFrame:
+# Accepted values for the dtype_backend argument of create_dataframe
+DTYPE_BACKENDS = ("numpy", "pyarrow")
+
+# Query used to read the claims extract
+QUERY = "SELECT * FROM medical_data;"
+
+# Filters of a selection, see select_claims
+SELECTION_KEYS = ("accounts", "service_from", "service_to", "payers", "shard")
+
+# Account lists longer than this are joined through a temporary table instead of
+# being bound one placeholder per account
+ACCOUNT_TEMP_TABLE_THRESHOLD = 500
+
+# Connection settings for reading the claims source, overridden by "sqlite" in config.json
+DEFAULT_SQLITE_PROFILE = {
+    "read_only": True,
+    "immutable": False,
+    "mmap_size": 268435456,
+    "cache_size_kib": 65536,
+}
+
+
+def connect_sqlite(database_path: str, profile: dict = None, **kwargs) -> sqlite3.Connection:
+    """
+    Opens the SQLite claims source with a read tuned connection profile:
+        read_only: opens the URI with mode=ro, a missing file raises instead of
+                   creating an empty database
+        immutable: skips all locking and change detection. Only safe for a local
+                   mirror that is not written while it is open.
+        mmap_size: bytes of the file read through memory mapping instead of read calls
+        cache_size_kib: size of the page cache
+
+    Args:
+        database_path (str): path to the SQLite database
+        profile (dict): settings overriding DEFAULT_SQLITE_PROFILE
+        kwargs: passed to sqlite3.connect, e.g. check_same_thread
+
+    Returns:
+        connection (sqlite3.Connection): open connection
+    """
+
+    profile = {**DEFAULT_SQLITE_PROFILE, **(profile or {})}
+
+    parameters = []
+    if profile["read_only"]:
+        parameters.append("mode=ro")
+    if profile["immutable"]:
+        parameters.append("immutable=1")
+
+    uri = pathlib.Path(database_path).absolute().as_uri()
+    if parameters:
+        uri += "?" + "&".join(parameters)
+
+    connection = sqlite3.connect(uri, uri=True, **kwargs)
+    connection.execute(f"PRAGMA mmap_size={int(profile['mmap_size'])};")
+
+    # A negative cache_size is a size in KiB instead of a number of pages
+    connection.execute(f"PRAGMA cache_size=-{int(profile['cache_size_kib'])};")
+
+    return connection
+
+
+def shard_of(account, num_shards: int) -> int:
+    """
+    Returns the zero based shard of a claim account. The shard only depends on the
+    account number, so every claim of an account lands in the same shard on every run.
+
+    Args:
+        account: control/account number of the claim
+        num_shards (int): number of shards
+
+    Returns:
+        shard (int): shard index between 0 and num_shards - 1
+    """
+
+    text = "" if account is None else str(account)
+    return zlib.crc32(text.encode("utf-8")) % num_shards
+
+
+def select_claims(connection: sqlite3.Connection, selection: dict = None, table: str = "medical_data") -> tuple:
+    """
+    Builds the claims query of a selection. Every filter is pushed down into the
+    query as bound parameters, filters are combined with AND:
+        accounts: control/account numbers. Lists longer than ACCOUNT_TEMP_TABLE_THRESHOLD
+                  are loaded into temp.selected_accounts and joined.
+        service_from, service_to: inclusive date of service window, ISO dates
+        payers: values of the tpl column
+        shard: [n, m] selects the n-th of m shards (1 <= n <= m), see shard_of
+
+    Filtered rows are returned in table order, like the unfiltered extract. The
+    temporary table and the shard function are created on the connection.
+
+    Args:
+        connection (sqlite3.Connection): connection the query will run on
+        selection (dict): filters, None or {} to read every claim
+        table (str): table the extract is read from
+
+    Returns:
+        query (str): SQL query with ? placeholders
+        params (list): values bound to the placeholders
+
+    Raises:
+        ValueError: if a filter is unknown, empty or out of range
+    """
+
+    selection = {key: value for key, value in (selection or {}).items() if value is not None}
+    if not selection:
+        return f"SELECT * FROM {table};", []
+
+    unknown = sorted(set(selection) - set(SELECTION_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown selection filters: {unknown}. Expected any of {SELECTION_KEYS}")
+
+    conditions = []
+    params = []
+
+    # Account list, bound directly or joined through a temporary table
+    if "accounts" in selection:
+        accounts = [str(account) for account in selection["accounts"]]
+        if not accounts:
+            raise ValueError("Selection has an empty account list")
+
+        if len(accounts) > ACCOUNT_TEMP_TABLE_THRESHOLD:
+            connection.execute("DROP TABLE IF EXISTS temp.selected_accounts;")
+            connection.execute("CREATE TEMP TABLE selected_accounts (control_account_number TEXT PRIMARY KEY);")
+            connection.executemany("INSERT OR IGNORE INTO temp.selected_accounts VALUES (?);",
+                                   [(account,) for account in accounts])
+            conditions.append("control_account_number IN "
+                              "(SELECT control_account_number FROM temp.selected_accounts)")
+        else:
+            conditions.append(f"control_account_number IN ({', '.join('?' * len(accounts))})")
+            params.extend(accounts)
+
+    # Date of service window, dates are stored as ISO text. The end is compared with the
+    # next day so that timestamps on the last day are still included.
+    window = {key: datetime.date.fromisoformat(str(selection[key]))
+              for key in ("service_from", "service_to") if key in selection}
+
+    if len(window) == 2 and window["service_from"] > window["service_to"]:
+        raise ValueError(f"Selection window starts after it ends: {window['service_from']} > {window['service_to']}")
+
+    if "service_from" in window:
+        conditions.append("date_of_service >= ?")
+        params.append(window["service_from"].isoformat())
+    if "service_to" in window:
+        conditions.append("date_of_service < ?")
+        params.append((window["service_to"] + datetime.timedelta(days=1)).isoformat())
+
+    # Payers
+    if "payers" in selection:
+        payers = [str(payer) for payer in selection["payers"]]
+        if not payers:
+            raise ValueError("Selection has an empty payer list")
+        conditions.append(f"tpl IN ({', '.join('?' * len(payers))})")
+        params.extend(payers)
+
+    # Shard n of m, hashed on the account number
+    if "shard" in selection:
+        shard, num_shards = (int(value) for value in selection["shard"])
+        if not 1 <= shard <= num_shards:
+            raise ValueError(f"Invalid shard {shard} of {num_shards}, expected 1 <= n <= m")
+
+        connection.create_function("cts_shard", 2, shard_of, deterministic=True)
+        conditions.append("cts_shard(control_account_number, ?) = ?")
+        params.extend([num_shards, shard - 1])
+
+    return f"SELECT * FROM {table} WHERE {' AND '.join(conditions)} ORDER BY rowid;", params
+
+
+def create_dataframe(connection_string: str, dtype_backend: str = "numpy",
+                     connection: sqlite3.Connection = None, sqlite_profile: dict = None,
+                     selection: dict = None) -> pd.DataFrame:
     """
     Connects to MS SQL database and queries table information into dataframe.
     After reading in the data, close the connection to the SQL server
 
+    With dtype_backend="pyarrow" the columns are built as Arrow arrays instead of
+    object columns. If the adbc_driver_sqlite package is installed the result set
+    is fetched natively as an Arrow table, otherwise pandas converts the DB-API rows.
+
     Note: For now, made up data will be added into the spreadsheet
 
     Args:
         connection_string (str): in this case, it is just a path but represents sql server connection str
+        dtype_backend (str): "numpy" for the default pandas dtypes or "pyarrow" for Arrow-backed columns
+        connection (sqlite3.Connection): already open connection to reuse. It is left open
+                                         and connection_string is ignored.
+        sqlite_profile (dict): connection settings, see connect_sqlite
+        selection (dict): filters pushed down into the query, see select_claims
     Returns:
         raw_dataframe (pd.DataFrame): Dataframe that has the raw, un-formatted data
         from the SQL database. Each column will likely be objects.
     """
 
-    connection = sqlite3.connect(connection_string)
+    if dtype_backend not in DTYPE_BACKENDS:
+        raise ValueError(f"Unsupported dtype_backend: {dtype_backend}. Expected one of {DTYPE_BACKENDS}")
+
+    # Reuse the caller's connection
+    if connection is not None:
+        query, params = select_claims(connection, selection)
+        if dtype_backend == "pyarrow":
+            return pd.read_sql_query(query, connection, params=params, dtype_backend="pyarrow")
+        return pd.read_sql_query(query, connection, params=params)
+
+    if dtype_backend == "pyarrow":
+        return _read_arrow(connection_string, sqlite_profile, selection)
 
     # Query the database
-    query = "SELECT * FROM medical_data;"
-    df = pd.read_sql_query(query, connection)
+    connection = connect_sqlite(connection_string, sqlite_profile)
+    try:
+        query, params = select_claims(connection, selection)
+        df = pd.read_sql_query(query, connection, params=params)
+    finally:
+        connection.close()
+
+    return df
+
+
+def _read_arrow(connection_string: str, sqlite_profile: dict = None, selection: dict = None) -> pd.DataFrame:
+    """
+    Reads the claims into a dataframe with Arrow-backed columns. Uses the ADBC
+    SQLite driver when available so no per-row python objects are created.
+    Selections need the shard function and temporary table of select_claims and
+    always read through sqlite3.
+
+    Args:
+        connection_string (str): path to the SQLite database
+        sqlite_profile (dict): connection settings of the fallback, see connect_sqlite
+        selection (dict): filters pushed down into the query, see select_claims
+    Returns:
+        df (pd.DataFrame): dataframe with pd.ArrowDtype columns
+    """
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("dtype_backend='pyarrow' requires the pyarrow package") from e
+
+    try:
+        from adbc_driver_sqlite import dbapi as adbc_sqlite
+    except ImportError:
+        adbc_sqlite = None
+
+    # Native columnar fetch
+    if adbc_sqlite is not None and not selection:
+        with adbc_sqlite.connect(connection_string) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(QUERY)
+                table = cursor.fetch_arrow_table()
+
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    # Fallback: pandas builds the Arrow arrays from the DB-API rows
+    connection = connect_sqlite(connection_string, sqlite_profile)
+    try:
+        query, params = select_claims(connection, selection)
+        df = pd.read_sql_query(query, connection, params=params, dtype_backend="pyarrow")
+    finally:
+        connection.close()
 
     return df
 
@@ -73,12 +317,38 @@ def format_date_columns(df: pd.DataFrame, column_names_list: list) -> pd.DataFra
 
     # Format each date column in place
     for name in column_names_list:
+
+        # Keep Arrow-backed columns in Arrow memory instead of converting to numpy
+        if isinstance(df[name].dtype, pd.ArrowDtype):
+            df[name] = df[name].astype("timestamp[ns][pyarrow]")
+            continue
+
         # Convert columns to datetime
         df[name] = pd.to_datetime(df[name])
 
     return df
 
 
+def format_money_columns(df: pd.DataFrame, column_names_list: list) -> pd.DataFrame:
+    """
+    The MONEY columns of the SQL table arrive as floats. For exact totals and
+    shares, these columns are converted to int64 cents, see money.to_cents. The
+    cents are converted back to display values when the spreadsheet is written.
+
+    Args:
+        df (pd.DataFrame): dataframe with money columns to convert
+        column_names_list (list): list of all the column names (str) holding amounts
+    Returns:
+        formatted_money (pd.DataFrame): df with the columns in cents
+    """
+
+    # Convert each money column in place
+    for name in column_names_list:
+        df[name] = money.to_cents(df[name])
+
+    return df
+
+
 def insert_headers(df: pd.DataFrame, columns_to_insert: dict) -> pd.DataFrame:
     """
     !! DEPRECATED !!
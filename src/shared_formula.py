@@ -0,0 +1,142 @@
+"""
+Module: shared_formula
+Description: This module writes Excel shared formulas with openpyxl. A shared formula
+             is stored once in the first cell of a range together with the range and
+             an index, the other cells only reference the index:
+
+                <c r="L2"><f t="shared" ref="L2:L5000" si="0">SUM(M2,P2,Q2,S2)</f></c>
+                <c r="L3"><f t="shared" si="0"/></c>
+
+             openpyxl writes the attributes of array formulas as they are, so
+             SharedFormula subclasses ArrayFormula and is written by the stock cell
+             writers. Workbooks read back with openpyxl translate the shared formula
+             into the formula of every cell. formula_pattern turns the formula of a
+             template row into the {row} pattern used by config.json.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import re
+from openpyxl.compat import safe_string
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.worksheet.formula import ArrayFormula
+from openpyxl.utils import column_index_from_string
+
+
+# Cell reference inside a range operand, the row is relative unless preceded by $
+CELL_REFERENCE = re.compile(r"(\$?[A-Za-z]{1,3})(\$?)(\d+)")
+
+
+def formula_pattern(formula: str, origin_row: int) -> str:
+    """
+    Converts a formula of the template's first data row into a pattern with a
+    {row} placeholder, the same convention as value_formula in config.json.
+    Only relative references to the origin row are supported.
+
+    Args:
+        formula (str): formula such as =FLOOR($M2*0.17,0.01)
+        origin_row (int): row the formula was read from
+
+    Returns:
+        pattern (str): formula such as =FLOOR($M{row}*0.17,0.01)
+
+    Raises:
+        ValueError: if the formula has a relative reference to another row
+    """
+
+    def replace_reference(match):
+        column, absolute, row = match.groups()
+        if absolute or int(row) != origin_row:
+            if not absolute:
+                raise ValueError(f"Formula {formula} references row {row}, expected only row {origin_row}")
+            return match.group(0)
+        return f"{column}{{row}}"
+
+    pieces = ["="]
+    for token in Tokenizer(formula).items:
+        value = token.value.replace("{", "{{").replace("}", "}}")
+        if token.type == Token.OPERAND and token.subtype == Token.RANGE:
+            value = CELL_REFERENCE.sub(replace_reference, value)
+        pieces.append(value)
+
+    return "".join(pieces)
+
+
+class SharedFormula(ArrayFormula):
+
+    t = "shared"
+
+    def __init__(self, si: int, ref: str = None, text: str = None):
+        """
+        Initializes a cell of a shared formula.
+
+        Args:
+            si (int): index of the shared formula, unique within the sheet
+            ref (str): range of the shared formula, only set on the master cell
+            text (str): formula of the master cell starting with "=", None for the other cells
+        """
+
+        super().__init__(ref, text)
+        self.si = si
+
+    def __iter__(self):
+        for k in ["t", "ref", "si"]:
+            v = getattr(self, k)
+            if v is not None:
+                yield k, safe_string(v)
+
+
+def next_shared_index(sheet) -> int:
+    """
+    Returns the first shared formula index that is not used in the sheet
+
+    Args:
+        sheet (openpyxl.worksheet.worksheet.Worksheet): sheet to look in
+
+    Returns:
+        si (int): unused shared formula index
+    """
+
+    indexes = [cell.value.si for cell in sheet._cells.values() if isinstance(cell.value, SharedFormula)]
+    return max(indexes, default=-1) + 1
+
+
+def fill_shared_formula(sheet, column_letter: str, formula: str, first_row: int, last_row: int,
+                        si: int = None) -> int:
+    """
+    Fills a column range with one shared formula. The formula is the formula of the
+    first row, Excel shifts its relative references for the other rows.
+
+    Args:
+        sheet (openpyxl.worksheet.worksheet.Worksheet): sheet to fill
+        column_letter (str): column to fill
+        formula (str): formula of first_row starting with "="
+        first_row (int): master row of the formula
+        last_row (int): last row to fill
+        si (int): shared formula index, defaults to the next unused index of the sheet
+
+    Returns:
+        si (int): shared formula index used
+    """
+
+    if si is None:
+        si = next_shared_index(sheet)
+
+    column = column_index_from_string(column_letter)
+
+    # A range of one cell is written as a plain formula
+    if last_row <= first_row:
+        sheet.cell(row=first_row, column=column).value = formula
+        return si
+
+    sheet.cell(row=first_row, column=column).value = SharedFormula(
+        si, ref=f"{column_letter}{first_row}:{column_letter}{last_row}", text=formula)
+
+    # The other cells hold no state of their own and share one instance
+    dependent = SharedFormula(si)
+    for row in range(first_row + 1, last_row + 1):
+        sheet.cell(row=row, column=column).value = dependent
+
+    return si
@@ -0,0 +1,312 @@
+"""
+Module: template_blob
+Description: This module pre-extracts a template into a single read-only blob file that
+             every worker process maps into memory instead of parsing the xlsx. The
+             blob holds the parsed template as a pickle and every part the template
+             serializes to, together with its deflated payload. The operating system
+             shares the mapped pages between the processes, so a worker no longer keeps
+             a private copy of the template and starts without parsing XML.
+
+             A fresh copy of the template is unpickled straight from the mapping for
+             every job. When a workbook is saved, the parts that are unchanged from the
+             template (theme, untouched sheets, relationships) are copied from the blob
+             without being compressed again, see xlsx_package.write_package.
+
+             Blobs are named after the template content, the openpyxl version and the
+             compression level, so a changed template or library builds a new blob.
+             Blobs are written next to their destination and renamed, concurrent
+             workers building the same blob produce identical files.
+
+             Settings under "template_blob" in config.json:
+                directory: directory of the blob files
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import io
+import os
+import mmap
+import json
+import zlib
+import pickle
+import struct
+import hashlib
+import openpyxl
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.table import TableList
+from src import atomic_file, export_excel, xlsx_package
+
+# Blob format version, part of the blob name
+BLOB_VERSION = 1
+
+# Start of every blob, followed by the header length and the JSON header
+MAGIC = b"CTSBLOB1"
+PREAMBLE = struct.Struct("<8sQ")
+
+# Directory of the blob files when config.json has no "template_blob" entry
+DEFAULT_DIRECTORY = "cache/templates"
+
+# Blobs opened by this process, keyed by blob path
+_OPEN_BLOBS = {}
+
+
+def _rebuild_table_list(tables: dict) -> TableList:
+    """
+    Helper function rebuilding a TableList from its name to table mapping
+    """
+
+    table_list = TableList()
+    dict.update(table_list, tables)
+    return table_list
+
+
+class _TemplatePickler(pickle.Pickler):
+    """
+    Pickler for parsed openpyxl workbooks. The default pickling of two openpyxl
+    containers loses data:
+        IndexedList is restored through append(), which drops duplicate styles and
+        shifts the style ids that cells refer to.
+        TableList overrides items() to return table refs instead of the tables.
+    Both are pickled through their constructors instead.
+    """
+
+    def reducer_override(self, obj):
+        if type(obj) is IndexedList:
+            return IndexedList, (list(obj),)
+        if type(obj) is TableList:
+            return _rebuild_table_list, (dict(dict.items(obj)),)
+        return NotImplemented
+
+
+def snapshot_workbook(workbook) -> bytes:
+    """
+    Pickles a parsed workbook so that independent copies can be restored cheaply
+
+    Args:
+        workbook (openpyxl.workbook.Workbook): workbook to snapshot
+
+    Returns:
+        snapshot (bytes): pickled workbook
+    """
+
+    buffer = io.BytesIO()
+    _TemplatePickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(workbook)
+    return buffer.getvalue()
+
+
+def restore_workbook(snapshot: bytes):
+    """
+    Restores an independent copy of a workbook pickled with snapshot_workbook
+
+    Args:
+        snapshot (bytes): pickled workbook, any bytes-like object such as a memoryview
+
+    Returns:
+        workbook (openpyxl.workbook.Workbook): restored workbook
+    """
+
+    return pickle.loads(snapshot)
+
+
+def blob_path(template_path: str, directory: str, compresslevel: int = 6) -> str:
+    """
+    Returns the path of the blob of a template
+
+    Args:
+        template_path (str): path to the template
+        directory (str): directory of the blob files
+        compresslevel (int): zlib compression level of the stored payloads
+
+    Returns:
+        path (str): blob path named after the template content and openpyxl version
+    """
+
+    digest = hashlib.sha256(f"{BLOB_VERSION}:{openpyxl.__version__}:{compresslevel}".encode("utf-8"))
+    with open(template_path, "rb") as f:
+        digest.update(f.read())
+
+    stem = os.path.splitext(os.path.basename(template_path))[0]
+    return os.path.join(directory, f"{stem}-{digest.hexdigest()[:16]}.blob")
+
+
+def build_blob(template_path: str, path: str, compresslevel: int = 6) -> str:
+    """
+    Parses the template once and writes its blob
+
+    Args:
+        template_path (str): path to the template
+        path (str): destination of the blob, see blob_path
+        compresslevel (int): zlib compression level of the stored payloads
+
+    Returns:
+        path (str): destination of the blob
+    """
+
+    workbook = export_excel.load_template(template_path)
+
+    sections = [("snapshot", snapshot_workbook(workbook))]
+    parts = {}
+    for name, _, data in xlsx_package.serialize_workbook(workbook):
+        parts[name] = {"crc": zlib.crc32(data), "level": compresslevel}
+        sections.append((f"data:{name}", data))
+        sections.append((f"payload:{name}", xlsx_package.deflate(data, compresslevel)))
+
+    # Offsets are relative to the end of the header
+    offsets = {}
+    position = 0
+    for name, data in sections:
+        offsets[name] = [position, len(data)]
+        position += len(data)
+
+    header = json.dumps({"version": BLOB_VERSION, "template": os.path.basename(template_path),
+                         "sections": offsets, "parts": parts}).encode("utf-8")
+
+    with atomic_file.atomic_path(path, durable=True) as temp_path:
+        with open(temp_path, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, len(header)))
+            f.write(header)
+            for _, data in sections:
+                f.write(data)
+
+    return path
+
+
+class TemplateBlob:
+    def __init__(self, path: str):
+        """
+        Maps a blob read-only
+
+        Args:
+            path (str): path of the blob, see build_blob
+
+        Attributes:
+            path (str): path of the blob
+            parts (dict): part name -> crc and compression level of the stored payload
+        """
+
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, header_length = PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a template blob")
+
+        header = json.loads(self._map[PREAMBLE.size:PREAMBLE.size + header_length])
+        if header["version"] != BLOB_VERSION:
+            self._map.close()
+            raise ValueError(f"Template blob {path} has version {header['version']}, expected {BLOB_VERSION}")
+
+        self._view = memoryview(self._map)
+        self._start = PREAMBLE.size + header_length
+        self._sections = header["sections"]
+        self.parts = header["parts"]
+
+    def section(self, name: str) -> memoryview:
+        """
+        Returns a section of the blob without copying it
+
+        Args:
+            name (str): "snapshot", "data:<part>" or "payload:<part>"
+
+        Returns:
+            section (memoryview): read-only view into the mapping
+        """
+
+        offset, length = self._sections[name]
+        return self._view[self._start + offset:self._start + offset + length]
+
+    def workbook(self):
+        """
+        Restores an independent copy of the parsed template from the mapping
+
+        Returns:
+            workbook (openpyxl.workbook.Workbook): template ready to populate
+        """
+
+        return restore_workbook(self.section("snapshot"))
+
+    def precompressed(self, compresslevel: int) -> dict:
+        """
+        Returns the stored payloads of the template parts compressed at the level
+
+        Args:
+            compresslevel (int): zlib compression level of the package
+
+        Returns:
+            precompressed (dict): (name, crc) -> (data, payload), see xlsx_package.write_package
+        """
+
+        return {(name, part["crc"]): (self.section(f"data:{name}"), self.section(f"payload:{name}"))
+                for name, part in self.parts.items() if part["level"] == compresslevel}
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+
+def open_blob(template_path: str, directory: str, compresslevel: int = 6) -> TemplateBlob:
+    """
+    Returns the mapped blob of a template, building it first if needed. A blob is
+    mapped once per process.
+
+    Args:
+        template_path (str): path to the template, defaults to CTS_Example_Template.xlsx
+                             in the working directory
+        directory (str): directory of the blob files
+        compresslevel (int): zlib compression level of the stored payloads
+
+    Returns:
+        blob (TemplateBlob): mapped blob
+    """
+
+    if template_path is None:
+        template_path = os.path.join(os.path.abspath(os.getcwd()), "CTS_Example_Template.xlsx")
+
+    path = blob_path(template_path, directory, compresslevel)
+
+    if path not in _OPEN_BLOBS:
+        if not os.path.exists(path):
+            build_blob(template_path, path, compresslevel)
+        _OPEN_BLOBS[path] = TemplateBlob(path)
+
+    return _OPEN_BLOBS[path]
+
+
+def load_template(template_path: str, config_dict: dict):
+    """
+    Returns a fresh copy of the template restored from its blob in the
+    template_blob.directory of config.json
+
+    Args:
+        template_path (str): path to the template
+        config_dict (dict): loaded config.json
+
+    Returns:
+        workbook (openpyxl.workbook.Workbook): template ready to populate
+    """
+
+    directory = config_dict.get("template_blob", {}).get("directory", DEFAULT_DIRECTORY)
+    compresslevel = config_dict.get("save", {}).get("compresslevel", 6)
+    return open_blob(template_path, directory, compresslevel).workbook()
+
+
+def precompressed_parts(compresslevel: int = 6) -> dict:
+    """
+    Returns the stored payloads of every blob mapped by this process
+
+    Args:
+        compresslevel (int): zlib compression level of the package
+
+    Returns:
+        precompressed (dict): (name, crc) -> (data, payload), see xlsx_package.write_package
+    """
+
+    precompressed = {}
+    for blob in _OPEN_BLOBS.values():
+        precompressed.update(blob.precompressed(compresslevel))
+
+    return precompressed
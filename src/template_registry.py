@@ -0,0 +1,281 @@
+"""
+Module: template_registry
+Description: This module handles the template registry defined under "templates" in
+             config.json. Each entry names a template file, the sheet to populate and
+             an optional route that selects the rows of the dataframe belonging to that
+             sheet. The layout of every sheet (header columns, formula columns, columns
+             to unlock) is compiled once per template file version and cached, and all
+             sheets are populated from a single pass over the dataframe. Every sheet is
+             sized to its rows with row_capacity before the rows are inserted.
+
+             Example entry:
+                "COFA": {
+                    "path": "COFA_Template.xlsx",
+                    "sheet": "MAP or COFA",
+                    "route": {"column": "TPL", "in": ["Medicare"]}
+                }
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import pandas as pd
+from src import export_excel, row_capacity, template_blob
+
+# Template used when config.json has no "templates" entry
+DEFAULT_TEMPLATES = {
+    "MAP or COFA": {"path": "CTS_Example_Template.xlsx", "sheet": "MAP or COFA"}
+}
+
+# Compiled layouts keyed by (template path, modification time, sheet, unprotected columns)
+_LAYOUT_CACHE = {}
+
+
+def compile_layout(sheet, unprotected_columns: list) -> dict:
+    """
+    Compiles the parts of a template sheet that every generation needs
+
+    Args:
+        sheet (openpyxl.worksheet.worksheet.Worksheet): template sheet
+        unprotected_columns (list): headers of the columns to unlock
+
+    Returns:
+        layout (dict): with the keys
+                       headers (dict): header -> column letter
+                       formulas (dict): column letter -> formula of the first data row
+                       unlock_columns (list): column letters to unlock
+                       max_row (int): last pre-formatted row of the template
+    """
+
+    headers = {}
+    formulas = {}
+    for header_cell, first_cell in sheet.iter_cols(min_row=1, max_row=2):
+        if header_cell.value is not None:
+            headers[header_cell.value] = header_cell.column_letter
+        if first_cell.data_type == "f":
+            formulas[first_cell.column_letter] = first_cell.value
+
+    unlock_columns = []
+    for column in unprotected_columns:
+        # Raise error if the column was not found in the sheet.
+        if column not in headers:
+            raise ValueError(f'Specified Column: {column} not found in sheet.')
+        unlock_columns.append(headers[column])
+
+    return {
+        "headers": headers,
+        "formulas": formulas,
+        "unlock_columns": unlock_columns,
+        "max_row": sheet.max_row,
+    }
+
+
+def get_layout(workbook, template_path: str, sheet_name: str, unprotected_columns: list) -> dict:
+    """
+    Returns the compiled layout of a template sheet, compiling it on first use.
+    The cache is invalidated when the template file changes.
+
+    Args:
+        workbook (openpyxl.workbook.Workbook): loaded template
+        template_path (str): path the template was loaded from
+        sheet_name (str): name of the sheet
+        unprotected_columns (list): headers of the columns to unlock
+
+    Returns:
+        layout (dict): compiled layout, see compile_layout
+    """
+
+    key = (os.path.abspath(template_path), os.stat(template_path).st_mtime_ns, sheet_name,
+           tuple(unprotected_columns))
+
+    if key not in _LAYOUT_CACHE:
+        _LAYOUT_CACHE[key] = compile_layout(workbook[sheet_name], unprotected_columns)
+
+    return _LAYOUT_CACHE[key]
+
+
+def route_mask(df: pd.DataFrame, route: dict) -> pd.Series:
+    """
+    Evaluates a route predicate on the dataframe
+
+    Args:
+        df (pd.DataFrame): dataframe with spreadsheet headers
+        route (dict): {"column": header} with one of "equals", "in" or "not_in"
+
+    Returns:
+        mask (pd.Series): True for the rows selected by the route
+    """
+
+    column = df[route["column"]]
+
+    if "equals" in route:
+        return column == route["equals"]
+    if "in" in route:
+        return column.isin(route["in"])
+    if "not_in" in route:
+        return ~column.isin(route["not_in"])
+
+    raise ValueError(f"Route on {route['column']} needs one of 'equals', 'in' or 'not_in'")
+
+
+def route_rows(final_df: pd.DataFrame, templates: dict) -> dict:
+    """
+    Selects the rows of every template. Rows go to every template whose route
+    matches. A template with "default": true receives the rows no other route
+    matched, and a template without a route receives all rows.
+
+    Args:
+        final_df (pd.DataFrame): dataframe with spreadsheet headers
+        templates (dict): "templates" entry of config.json
+
+    Returns:
+        rows (dict): template name -> selected rows, in registry order
+    """
+
+    # Evaluate every route once against the dataframe
+    masks = {}
+    matched = pd.Series(False, index=final_df.index)
+    for name, template in templates.items():
+        route = template.get("route")
+        if route is not None:
+            masks[name] = route_mask(final_df, route)
+            matched |= masks[name]
+
+    rows = {}
+    for name, template in templates.items():
+        if name in masks:
+            rows[name] = final_df[masks[name].to_numpy()]
+        elif template.get("default", False):
+            rows[name] = final_df[~matched.to_numpy()]
+        else:
+            rows[name] = final_df
+
+    return rows
+
+
+def duplicate_templates(templates: dict) -> list:
+    """
+    Lists the registry entries that would write over each other: two entries with
+    the same template file and sheet, or two different template files with the
+    same file name, which would be saved under the same output name
+
+    Args:
+        templates (dict): "templates" entry of config.json
+
+    Returns:
+        problems (list): one message per duplicate, empty if there is none
+    """
+
+    problems = []
+    sheets = {}
+    paths = {}
+    for name, template in templates.items():
+        template_path = os.path.abspath(template["path"])
+        sheet_key = (template_path, template.get("sheet", "MAP or COFA"))
+        if sheet_key in sheets:
+            problems.append(f"Templates {sheets[sheet_key]} and {name} both populate sheet {sheet_key[1]} "
+                            f"of {template['path']}")
+        sheets.setdefault(sheet_key, name)
+
+        output_name = os.path.splitext(os.path.basename(template_path))[0]
+        if paths.setdefault(output_name, template_path) != template_path:
+            problems.append(f"Templates {paths[output_name]} and {template_path} have the same output name "
+                            f"{output_name}")
+
+    return problems
+
+
+def output_names(templates: dict) -> dict:
+    """
+    Returns the output name of every registry entry, the file name of its template
+    without extension. Entries sharing a template file share the output name.
+
+    Args:
+        templates (dict): "templates" entry of config.json
+
+    Returns:
+        names (dict): template name -> output name
+
+    Raises:
+        ValueError: if entries would write over each other, see duplicate_templates
+    """
+
+    problems = duplicate_templates(templates)
+    if problems:
+        raise ValueError("Invalid template registry:\n  " + "\n  ".join(problems))
+
+    return {name: os.path.splitext(os.path.basename(template["path"]))[0] for name, template in templates.items()}
+
+
+def populate_templates(final_df: pd.DataFrame, config_dict: dict, password: str = "test", metrics=None,
+                       plan: dict = None) -> dict:
+    """
+    Routes the rows of the dataframe to the templates in the registry and populates
+    every sheet. Templates sharing a file are populated as sheets of one workbook.
+    Registries whose entries would write over each other are rejected.
+
+    Every template is restored from its shared blob, see template_blob.load_template.
+    The rows of every template are selected with route_rows. The money columns of
+    config.json must hold cents, see setup_dataframe.format_money_columns.
+
+    Args:
+        final_df (pd.DataFrame): transformed data with spreadsheet headers
+        config_dict (dict): loaded config.json
+        password (str): password used to protect every sheet
+        metrics (run_metrics.RunMetrics): receives the cells written and styles created
+        plan (dict): compiled plan from config_compiler, its layouts and formatting are used
+                     instead of compiling the template sheets
+
+    Returns:
+        workbooks (dict): output name (template file name without extension) -> workbook
+
+    Raises:
+        ValueError: if two entries populate the same sheet or two template files share a name
+    """
+
+    templates = config_dict.get("templates", DEFAULT_TEMPLATES)
+    unprotected_columns = config_dict["unprotected_columns"]
+    slack_rows = row_capacity.get_slack_rows(config_dict)
+
+    # Output names are unique per template file, see output_names
+    names = output_names(templates)
+
+    workbooks = {}
+    template_styles = {}
+    for name, rows in route_rows(final_df, templates).items():
+        template = templates[name]
+        template_path = template["path"]
+        output_name = names[name]
+
+        if output_name not in workbooks:
+            workbooks[output_name] = template_blob.load_template(template_path, config_dict)
+            template_styles[output_name] = len(workbooks[output_name]._cell_styles)
+        workbook = workbooks[output_name]
+
+        sheet_name = template.get("sheet", "MAP or COFA")
+        if plan is not None:
+            layout = plan["templates"][name]["layout"]
+            formatting = plan["templates"][name]["formatting"]
+        else:
+            layout = get_layout(workbook, template_path, sheet_name, unprotected_columns)
+            formatting = config_dict["formatting"]
+
+        # Size the pre-formatted rows to the routed rows before inserting them
+        last_row = row_capacity.fit_sheet(workbook[sheet_name], layout, rows.shape[0], slack_rows)
+
+        export_excel.insert_into_template(rows.reset_index(drop=True), formatting,
+                                          workbook=workbook, sheet_name=sheet_name, layout=layout,
+                                          money_columns=config_dict.get("money_columns", []))
+        export_excel.protection_handler(workbook, unprotected_columns, password, last_row - 1,
+                                        sheet_name=sheet_name, layout=layout)
+
+        if metrics is not None:
+            metrics.add("cells_written", rows.size)
+
+    if metrics is not None:
+        for output_name, workbook in workbooks.items():
+            metrics.add("styles_created", len(workbook._cell_styles) - template_styles[output_name])
+
+    return workbooks
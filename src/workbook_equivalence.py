@@ -0,0 +1,642 @@
+"""
+Module: workbook_equivalence
+Description: This module checks that two xlsx files render the same workbook, so that a
+             faster writer can be verified against the per-cell insert_into_template
+             route. The worksheet XML of both packages is read in chunks of CHUNK_SIZE,
+             the complete rows of every chunk are parsed with ET.fromstring and the
+             cells are compared in lockstep as the rows are yielded. Memory depends on
+             the chunk size, the shared string table (read with iterparse) and the
+             styles, not on the number of rows. The elements after sheetData
+             (validations, conditional formats) are parsed in one piece.
+
+             Compared for every cell, including the cells that only one file writes:
+                value: numbers, strings, booleans and errors, formulas as written
+                       (shared formulas are expanded to the formula of every cell)
+                number_format, alignment, protection, font, fill and border: resolved
+                       through the cell, row and column styles
+             Compared for every sheet:
+                sheet_protection: attributes of <sheetProtection>
+                data_validation: the cells covered by every validation rule
+                conditional_format: the cells covered by every rule and its format
+
+             Ranges are compared by the cells they cover, so a rule written as
+             "A2:A10" matches the same rule written as "A2:A5 A6:A10". Priorities of
+             conditional formatting rules and ids of styles are not compared.
+
+             Usage:
+                python -m src.workbook_equivalence reference.xlsx candidate.xlsx [--sheets "MAP or COFA"]
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import re
+import sys
+import zipfile
+import argparse
+import posixpath
+import collections
+import xml.etree.ElementTree as ET
+from openpyxl.formula.translate import Translator
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.styles.numbers import BUILTIN_FORMATS
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+# Namespaces of the spreadsheet parts
+MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIPS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_RELATIONSHIPS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Cell children, see SheetStream
+V, F, IS = f"{MAIN}v", f"{MAIN}f", f"{MAIN}is"
+
+# Cell attributes compared by the harness, in the order they are reported
+CELL_ATTRIBUTES = ("value", "number_format", "alignment", "protection", "font", "fill", "border")
+
+# Cell reference such as $AB12, and a reference or range of them
+COORDINATE = re.compile(r"(\$?[A-Z]{1,3})\$?(\d+)")
+SIMPLE_RANGE = re.compile(r"\$?[A-Z]{1,3}\$?\d+(:\$?[A-Z]{1,3}\$?\d+)?")
+DIGITS = "0123456789"
+
+# Worksheet root and sheetData start tags, with the namespace prefix of the writer if any
+ROOT = re.compile(rb"<((?:[\w.-]+:)?)worksheet\b[^>]*>")
+SHEET_DATA = re.compile(rb"<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>")
+
+# Bytes of the worksheet XML read at a time
+CHUNK_SIZE = 1 << 20
+
+# Defaults of the <protection> element of a cell format
+PROTECTION_DEFAULTS = {"locked": "1", "hidden": "0"}
+
+# Attributes of a validation or formatting rule that are not part of the rule
+IGNORED_RULE_ATTRIBUTES = {"sqref", "priority", "dxfId", "{http://schemas.microsoft.com/office/spreadsheetml/2014/revision}uid"}
+
+
+def _canonical(element) -> str:
+    """
+    Helper function returning an element as canonical XML, attributes sorted
+    """
+
+    if element is None:
+        return ""
+    return ET.canonicalize(ET.tostring(element, encoding="unicode"), strip_text=True)
+
+
+def _flag(value: str) -> str:
+    """
+    Helper function normalizing the boolean spellings of OOXML attributes
+    """
+
+    return {"true": "1", "false": "0"}.get(value, value)
+
+
+def _sheet_parts(archive: zipfile.ZipFile) -> dict:
+    """
+    Helper function returning the worksheet part of every sheet name
+    """
+
+    relationships = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for relationship in relationships.iter(f"{PACKAGE_RELATIONSHIPS}Relationship"):
+        target = relationship.get("Target")
+        target = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+        targets[relationship.get("Id")] = target
+
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    return {sheet.get("name"): targets[sheet.get(f"{RELATIONSHIPS}id")]
+            for sheet in workbook.iter(f"{MAIN}sheet")}
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> list:
+    """
+    Helper function streaming the shared string table, rich text runs are joined into
+    plain text and phonetic hints are left out
+    """
+
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == f"{MAIN}si":
+                runs = [element] + element.findall(f"{MAIN}r")
+                strings.append("".join(run.findtext(f"{MAIN}t") or "" for run in runs))
+                element.clear()
+
+    return strings
+
+
+class PackageStyles:
+    def __init__(self, archive: zipfile.ZipFile):
+        """
+        Resolves the cell formats of a package into comparable values
+
+        Args:
+            archive (zipfile.ZipFile): open xlsx package
+
+        Attributes:
+            cell_formats (list): rendered (number_format, alignment, protection, font, fill, border)
+                                 of every cell format id
+            differential_formats (list): canonical XML of every differential format used
+                                         by conditional formatting
+        """
+
+        self.cell_formats = [("General", (), tuple(sorted(PROTECTION_DEFAULTS.items())), "", "", "")]
+        self.differential_formats = []
+        if "xl/styles.xml" not in archive.namelist():
+            return
+
+        root = ET.fromstring(archive.read("xl/styles.xml"))
+
+        def children(name, child):
+            parent = root.find(f"{MAIN}{name}")
+            return [] if parent is None else parent.findall(f"{MAIN}{child}")
+
+        # Differential formats have number formats of their own, only the table of the cell formats is read
+        number_formats = dict(BUILTIN_FORMATS)
+        for number_format in children("numFmts", "numFmt"):
+            number_formats[int(number_format.get("numFmtId"))] = number_format.get("formatCode")
+
+        fonts = [_canonical(font) for font in children("fonts", "font")]
+        fills = [_canonical(fill) for fill in children("fills", "fill")]
+        borders = [_canonical(border) for border in children("borders", "border")]
+        self.differential_formats = [_canonical(dxf) for dxf in children("dxfs", "dxf")]
+
+        def pick(items, index):
+            index = int(index or 0)
+            return items[index] if index < len(items) else ""
+
+        cell_formats = []
+        for xf in children("cellXfs", "xf"):
+            alignment = xf.find(f"{MAIN}alignment")
+            protection = dict(PROTECTION_DEFAULTS)
+            if xf.find(f"{MAIN}protection") is not None:
+                protection.update({key: _flag(value) for key, value in xf.find(f"{MAIN}protection").items()})
+
+            cell_formats.append((
+                number_formats.get(int(xf.get("numFmtId", 0)), "General"),
+                () if alignment is None else tuple(sorted((key, _flag(value)) for key, value in alignment.items())),
+                tuple(sorted(protection.items())),
+                pick(fonts, xf.get("fontId")),
+                pick(fills, xf.get("fillId")),
+                pick(borders, xf.get("borderId")),
+            ))
+
+        if cell_formats:
+            self.cell_formats = cell_formats
+
+    def render(self, style_id: int) -> tuple:
+        """
+        Returns the rendered format of a cell format id, the default format if it does not exist
+
+        Args:
+            style_id (int): index into cellXfs
+
+        Returns:
+            rendered (tuple): number_format, alignment, protection, font, fill and border
+        """
+
+        if style_id < len(self.cell_formats):
+            return self.cell_formats[style_id]
+        return self.cell_formats[0]
+
+
+def parse_ranges(sqref: str) -> dict:
+    """
+    Converts a space separated list of ranges into the merged row intervals of every column
+
+    Args:
+        sqref (str): ranges such as "A2:A10 C2:D10"
+
+    Returns:
+        columns (dict): column index -> sorted, merged [first_row, last_row] intervals
+    """
+
+    intervals = {}
+    for reference in sqref.split():
+        first, _, last = reference.partition(":")
+        first_column, first_row = COORDINATE.fullmatch(first).groups()
+        last_column, last_row = COORDINATE.fullmatch(last or first).groups()
+
+        for column in range(column_index_from_string(first_column.lstrip("$")),
+                            column_index_from_string(last_column.lstrip("$")) + 1):
+            intervals.setdefault(column, []).append((int(first_row), int(last_row)))
+
+    return {column: _merge_intervals(column_intervals) for column, column_intervals in intervals.items()}
+
+
+def _merge_intervals(intervals: list) -> list:
+    """
+    Helper function merging overlapping and adjacent row intervals
+    """
+
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+
+    return merged
+
+
+def _union_ranges(rules: dict, key: tuple, sqref: str) -> None:
+    """
+    Helper function adding the cells of a range to the cells covered by a rule
+    """
+
+    covered = rules.setdefault(key, {})
+    for column, intervals in parse_ranges(sqref).items():
+        covered[column] = _merge_intervals(covered.get(column, []) + intervals)
+
+
+def expand_shared_formula(formula: str, origin: str):
+    """
+    Compiles the master formula of a shared formula into a function returning the
+    formula of any cell of its range, the formula Excel shows in that cell
+
+    Args:
+        formula (str): formula of the master cell starting with "="
+        origin (str): coordinate of the master cell
+
+    Returns:
+        expand (callable): (row, column) -> formula of the cell
+    """
+
+    origin_column, origin_row = COORDINATE.fullmatch(origin).groups()
+    origin_column, origin_row = column_index_from_string(origin_column), int(origin_row)
+
+    # Literal text, (column, column absolute, row, row absolute) references, or
+    # operands that are translated with openpyxl (sheet names, whole columns, tables)
+    pieces = ["="]
+    for token in Tokenizer(formula).items:
+        if token.type != Token.OPERAND or token.subtype != Token.RANGE:
+            pieces.append(token.value)
+        elif not SIMPLE_RANGE.fullmatch(token.value):
+            pieces.append((token.value,))
+        else:
+            for position, reference in enumerate(token.value.split(":")):
+                column, row = COORDINATE.fullmatch(reference).groups()
+                if position:
+                    pieces.append(":")
+                pieces.append((column_index_from_string(column.lstrip("$")), column.startswith("$"),
+                               int(row), reference[len(column)] == "$"))
+
+    def expand(row: int, column: int) -> str:
+        row_delta, column_delta = row - origin_row, column - origin_column
+        text = []
+        for piece in pieces:
+            if type(piece) is str:
+                text.append(piece)
+            elif len(piece) == 1:
+                text.append(Translator.translate_range(piece[0], row_delta, column_delta))
+            else:
+                piece_column, column_absolute, piece_row, row_absolute = piece
+                text.append(f"${get_column_letter(piece_column)}" if column_absolute
+                            else get_column_letter(piece_column + column_delta))
+                text.append(f"${piece_row}" if row_absolute else str(piece_row + row_delta))
+        return "".join(text)
+
+    return expand
+
+
+class SheetStream:
+    def __init__(self, archive: zipfile.ZipFile, part: str, styles: PackageStyles, shared_strings: list):
+        """
+        Streams the rows of a worksheet. The sheet level settings are collected
+        while streaming and are complete once the rows are exhausted.
+
+        The part is read in chunks and cut after the last complete row. The rows of
+        a chunk are parsed in one call, which is much faster than an event per element.
+
+        Args:
+            archive (zipfile.ZipFile): open xlsx package
+            part (str): path of the worksheet part
+            styles (PackageStyles): resolved formats of the package
+            shared_strings (list): shared string table of the package
+
+        Attributes:
+            sheet_protection (tuple): sorted attributes of <sheetProtection>, None if unprotected
+            data_validations (dict): rule -> cells covered, see parse_ranges
+            conditional_formats (dict): (rule, format) -> cells covered
+        """
+
+        self.archive = archive
+        self.part = part
+        self.styles = styles
+        self.shared_strings = shared_strings
+
+        self.sheet_protection = None
+        self.data_validations = {}
+        self.conditional_formats = {}
+
+        # Column formats, see cell_style
+        self._columns = []
+
+        # Row index -> format id of the rows with a custom format that are still needed
+        self._row_styles = collections.OrderedDict()
+
+        # Shared formula index -> expand function of the master formula
+        self._shared_formulas = {}
+
+    def cell_style(self, row: int, column: int) -> int:
+        """
+        Returns the format id of a cell the sheet does not write: the format of its
+        row if the row has a custom format, else the format of its column. Rows
+        before the requested row are forgotten, cells must be asked for in order.
+
+        Args:
+            row (int): row index
+            column (int): column index
+
+        Returns:
+            style_id (int): format id of the cell, 0 if neither has one
+        """
+
+        while self._row_styles and next(iter(self._row_styles)) < row:
+            self._row_styles.popitem(last=False)
+        if row in self._row_styles:
+            return self._row_styles[row]
+
+        for first, last, style_id in self._columns:
+            if first <= column <= last:
+                return style_id
+        return 0
+
+    def _value(self, cell, row: int, column: int):
+        """
+        Helper function returning the value of a cell, formulas take precedence over cached values
+        """
+
+        formula = value = inline = None
+        for child in cell:
+            if child.tag == V:
+                value = child.text
+            elif child.tag == F:
+                formula = child
+            elif child.tag == IS:
+                inline = child
+
+        if formula is not None:
+            text = formula.text
+            if formula.get("t") != "shared":
+                return f"={text or ''}"
+            if text is not None:
+                self._shared_formulas[formula.get("si")] = expand_shared_formula(
+                    f"={text}", f"{get_column_letter(column)}{row}")
+                return f"={text}"
+            return self._shared_formulas[formula.get("si")](row, column)
+
+        cell_type = cell.get("t", "n")
+        if inline is not None:
+            return "".join(text.text or "" for text in inline.iter(f"{MAIN}t"))
+        if value is None:
+            return None
+        if cell_type == "n":
+            return float(value)
+        if cell_type == "s":
+            return self.shared_strings[int(value)]
+        if cell_type == "b":
+            return value in ("1", "true")
+        return value
+
+    def _parse_row(self, element, row_idx: int) -> tuple:
+        """
+        Helper function returning the row index and the (column, value, format id) of
+        every cell of a <row> element
+        """
+
+        row_idx = int(element.get("r", row_idx))
+        if _flag(element.get("customFormat", "0")) == "1":
+            self._row_styles[row_idx] = int(element.get("s", 0))
+
+        cells = []
+        column = 0
+        for cell in element:
+            reference = cell.get("r")
+            column = column_index_from_string(reference.rstrip(DIGITS)) if reference else column + 1
+            cells.append((column, self._value(cell, row_idx, column), int(cell.get("s", 0))))
+
+        return row_idx, cells
+
+    def _read_settings(self, root) -> None:
+        """
+        Helper function collecting the column formats and sheet level settings of a
+        parsed part of the worksheet
+        """
+
+        for col in root.iter(f"{MAIN}col"):
+            self._columns.append((int(col.get("min")), int(col.get("max")), int(col.get("style", 0))))
+
+        for element in root.iter(f"{MAIN}sheetProtection"):
+            self.sheet_protection = tuple(sorted((key, _flag(value)) for key, value in element.items()))
+
+        for element in root.iter(f"{MAIN}dataValidation"):
+            rule = tuple(sorted((key, _flag(value)) for key, value in element.items()
+                                if key not in IGNORED_RULE_ATTRIBUTES))
+            formulas = tuple((child.tag, child.text) for child in element)
+            _union_ranges(self.data_validations, (rule, formulas), element.get("sqref", ""))
+
+        for element in root.iter(f"{MAIN}conditionalFormatting"):
+            for rule in element.iterfind(f"{MAIN}cfRule"):
+                attributes = tuple(sorted((key, _flag(value)) for key, value in rule.items()
+                                          if key not in IGNORED_RULE_ATTRIBUTES))
+                dxf_id = rule.get("dxfId")
+                dxf = self.styles.differential_formats[int(dxf_id)] if dxf_id is not None else ""
+                body = tuple(_canonical(child) for child in rule)
+                _union_ranges(self.conditional_formats, (attributes, body, dxf), element.get("sqref", ""))
+
+    def rows(self):
+        """
+        Yields the written rows of the worksheet in order
+
+        Yields:
+            row (tuple): row index and a list of (column index, value, format id)
+                         for every written cell
+        """
+
+        with self.archive.open(self.part) as f:
+            buffer = b""
+            while (sheet_data := SHEET_DATA.search(buffer)) is None:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    raise ValueError(f"{self.part} has no sheetData")
+                buffer += chunk
+
+            # The parts before and after the rows are parsed inside the root element
+            root = ROOT.search(buffer)
+            opening, closing = root.group(0), b"</" + root.group(1) + b"worksheet>"
+            prefix = sheet_data.group(1)
+            rows_opening, rows_closing = b"<" + prefix + b"sheetData>", b"</" + prefix + b"sheetData>"
+            row_closing = b"</" + prefix + b"row>"
+
+            self._read_settings(ET.fromstring(buffer[:sheet_data.start()] + closing))
+            buffer = buffer[sheet_data.end():]
+
+            row_idx = 0
+            while sheet_data.group(2) != b"/":
+                end = buffer.find(rows_closing)
+                if end >= 0:
+                    rows, buffer = buffer[:end], buffer[end + len(rows_closing):]
+                else:
+                    cut = buffer.rfind(row_closing)
+                    cut = cut + len(row_closing) if cut >= 0 else 0
+                    rows, buffer = buffer[:cut], buffer[cut:]
+
+                if rows.strip():
+                    for element in ET.fromstring(opening + rows_opening + rows + rows_closing + closing)[0]:
+                        row_idx, cells = self._parse_row(element, row_idx + 1)
+                        yield row_idx, cells
+
+                if end >= 0:
+                    break
+
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    raise ValueError(f"{self.part} ends inside sheetData")
+                buffer += chunk
+
+            self._read_settings(ET.fromstring(opening + buffer + f.read()))
+
+
+def compare_workbooks(reference_path: str, candidate_path: str, sheets: list = None,
+                      max_differences: int = 100) -> list:
+    """
+    Compares two xlsx files sheet by sheet and cell by cell
+
+    Args:
+        reference_path (str): workbook written by the reference implementation
+        candidate_path (str): workbook to verify
+        sheets (list): names of the sheets to compare, defaults to the sheets of the reference
+        max_differences (int): stop after this many differences, None to report all
+
+    Returns:
+        differences (list): (sheet, location, attribute, reference value, candidate value)
+                            tuples, empty when the workbooks are equivalent
+    """
+
+    differences = []
+
+    def report(*difference):
+        differences.append(difference)
+        return max_differences is not None and len(differences) >= max_differences
+
+    with zipfile.ZipFile(reference_path) as reference, zipfile.ZipFile(candidate_path) as candidate:
+        reference_parts = _sheet_parts(reference)
+        candidate_parts = _sheet_parts(candidate)
+        reference_styles, candidate_styles = PackageStyles(reference), PackageStyles(candidate)
+        reference_strings, candidate_strings = _shared_strings(reference), _shared_strings(candidate)
+
+        for sheet in sheets or list(reference_parts):
+            if sheet not in reference_parts or sheet not in candidate_parts:
+                if report(sheet, "", "sheet", sheet in reference_parts, sheet in candidate_parts):
+                    return differences
+                continue
+
+            reference_stream = SheetStream(reference, reference_parts[sheet], reference_styles, reference_strings)
+            candidate_stream = SheetStream(candidate, candidate_parts[sheet], candidate_styles, candidate_strings)
+            if _compare_sheets(sheet, reference_stream, candidate_stream, report):
+                return differences
+
+    return differences
+
+
+def _compare_sheets(sheet: str, reference: SheetStream, candidate: SheetStream, report) -> bool:
+    """
+    Helper function merging the rows and cells of two sheets in order and comparing
+    them, then the sheet level settings. Returns True once report asks to stop.
+    """
+
+    # Format ids are compared through their rendering once per pair of ids
+    formats_match = {}
+
+    def compare_cell(row, column, reference_cell, candidate_cell):
+        # A cell written by one file only is compared with the row or column format of the other
+        reference_value, reference_style = reference_cell or (None, reference.cell_style(row, column))
+        candidate_value, candidate_style = candidate_cell or (None, candidate.cell_style(row, column))
+
+        location = None
+        if reference_value != candidate_value:
+            location = f"{get_column_letter(column)}{row}"
+            if report(sheet, location, "value", reference_value, candidate_value):
+                return True
+
+        key = (reference_style, candidate_style)
+        if key not in formats_match:
+            formats_match[key] = reference.styles.render(reference_style) == candidate.styles.render(candidate_style)
+        if formats_match[key]:
+            return False
+
+        location = location or f"{get_column_letter(column)}{row}"
+        for attribute, reference_attribute, candidate_attribute in zip(
+                CELL_ATTRIBUTES[1:], reference.styles.render(reference_style), candidate.styles.render(candidate_style)):
+            if reference_attribute != candidate_attribute:
+                if report(sheet, location, attribute, reference_attribute, candidate_attribute):
+                    return True
+        return False
+
+    reference_rows, candidate_rows = reference.rows(), candidate.rows()
+    end = (sys.maxsize, [])
+    reference_row, candidate_row = next(reference_rows, end), next(candidate_rows, end)
+    while reference_row is not end or candidate_row is not end:
+        row = min(reference_row[0], candidate_row[0])
+
+        reference_cells = candidate_cells = []
+        if reference_row[0] == row:
+            reference_cells = reference_row[1]
+            reference_row = next(reference_rows, end)
+        if candidate_row[0] == row:
+            candidate_cells = candidate_row[1]
+            candidate_row = next(candidate_rows, end)
+
+        # Merge the cells of the row by column
+        i = j = 0
+        while i < len(reference_cells) or j < len(candidate_cells):
+            reference_column = reference_cells[i][0] if i < len(reference_cells) else sys.maxsize
+            candidate_column = candidate_cells[j][0] if j < len(candidate_cells) else sys.maxsize
+            column = min(reference_column, candidate_column)
+
+            reference_cell = candidate_cell = None
+            if reference_column == column:
+                reference_cell = reference_cells[i][1:]
+                i += 1
+            if candidate_column == column:
+                candidate_cell = candidate_cells[j][1:]
+                j += 1
+
+            if compare_cell(row, column, reference_cell, candidate_cell):
+                return True
+
+    if reference.sheet_protection != candidate.sheet_protection:
+        if report(sheet, "", "sheet_protection", reference.sheet_protection, candidate.sheet_protection):
+            return True
+
+    for attribute, reference_rules, candidate_rules in (
+            ("data_validation", reference.data_validations, candidate.data_validations),
+            ("conditional_format", reference.conditional_formats, candidate.conditional_formats)):
+        for rule in reference_rules.keys() | candidate_rules.keys():
+            if reference_rules.get(rule) != candidate_rules.get(rule):
+                if report(sheet, str(rule), attribute, reference_rules.get(rule), candidate_rules.get(rule)):
+                    return True
+
+    return False
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.workbook_equivalence")
+    parser.add_argument("reference", help="Workbook written by the reference implementation")
+    parser.add_argument("candidate", help="Workbook to verify")
+    parser.add_argument("--sheets", nargs="+", default=None, help="Sheets to compare, defaults to every sheet")
+    parser.add_argument("--max-differences", type=int, default=100)
+    args = parser.parse_args()
+
+    found = compare_workbooks(args.reference, args.candidate, args.sheets, args.max_differences)
+    for sheet_name, found_location, found_attribute, reference_value, candidate_value in found:
+        print(f"{sheet_name}!{found_location} {found_attribute}: {reference_value!r} != {candidate_value!r}")
+
+    if found:
+        sys.exit(1)
+    print("Workbooks are equivalent")
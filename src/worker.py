@@ -0,0 +1,273 @@
+"""
+Module: worker
+Description: This module implements a resident generation worker for small, on-demand
+             CTS requests. The worker imports pandas and openpyxl once, compiles the
+             configuration, maps the template blobs shared by all workers, keeps a
+             database connection open, and accepts generation jobs over a local Unix
+             socket or from a watched queue directory. Each job goes through the same
+             template_registry.populate_templates and save_workbook logic as main.py,
+             so the sheets are fitted to the rows the same way.
+
+             Usage:
+                python -m src.worker --socket /tmp/cts_worker.sock
+                python -m src.worker --queue-dir jobs
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import socketserver
+from src import auto_tune, config_compiler, export_excel, setup_dataframe, template_blob, template_registry
+
+
+class GenerationWorker:
+    def __init__(self, config_path: str = "config.json", connection_string: str = "data/medical_data.db",
+                 template_path: str = None, sheets_directory: str = None):
+        """
+        Initializes a worker with a warm template and database connection.
+
+        Args:
+            config_path (str): path to config.json
+            connection_string (str): path to the SQLite database
+            template_path (str): path to the template, replaces the templates of config.json
+                                 with this single template if given
+            sheets_directory (str): directory for generated files, defaults to generated_sheets
+
+        Attributes:
+            config_dict (dict): loaded configuration
+            connection (sqlite3.Connection): connection reused by every job
+            plan (dict): compiled plan of the configuration, see config_compiler.load_plan
+            templates (list): mapped template blobs shared with the other workers, restored
+                              for every job
+        """
+
+        with open(config_path, encoding="utf-8") as f:
+            self.config_dict = auto_tune.apply_profile(json.load(f))
+        if template_path is not None:
+            self.config_dict["templates"] = {"MAP or COFA": {"path": template_path, "sheet": "MAP or COFA"}}
+
+        # Long lived connection, so it must not be opened as immutable
+        sqlite_profile = dict(self.config_dict.get("sqlite", {}), immutable=False)
+        self.connection = setup_dataframe.connect_sqlite(connection_string, sqlite_profile, check_same_thread=False)
+        self.sheets_directory = sheets_directory
+
+        # Check the configuration once, every job reuses the compiled layouts
+        self.plan = config_compiler.load_plan(self.config_dict, connection_string)
+
+        # Workers map the same blobs instead of each parsing and holding the templates
+        self.compresslevel = self.config_dict.get("save", {}).get("compresslevel", 6)
+        blob_directory = self.config_dict.get("template_blob", {}).get("directory", template_blob.DEFAULT_DIRECTORY)
+        templates = self.config_dict.get("templates", template_registry.DEFAULT_TEMPLATES)
+        self.templates = [template_blob.open_blob(template["path"], blob_directory, self.compresslevel)
+                          for template in templates.values()]
+
+    def run_job(self, job: dict) -> dict:
+        """
+        Generates one CTS workbook
+
+        Args:
+            job (dict): job description with the keys
+                        name (str): file name ending with .xlsx
+                        password (str): sheet password, optional
+                        dtype_backend (str): "numpy" or "pyarrow", optional
+                        selection (dict): claims to include, see setup_dataframe.select_claims, optional
+
+        Returns:
+            result (dict): status, saved path (the first one when several templates are
+                           populated), saved paths, row count and job duration in seconds
+        """
+
+        start = time.perf_counter()
+
+        file_name = job.get("name")
+        if not file_name or not file_name.endswith(".xlsx"):
+            raise ValueError(f"Specified name: '{file_name}' is not formatted correctly. Filename should end with '.xlsx'")
+
+        # Setting Up Dataframe
+        raw_dataframe = setup_dataframe.create_dataframe(None, dtype_backend=job.get("dtype_backend", "numpy"),
+                                                         connection=self.connection, selection=job.get("selection"))
+        renamed_headers = setup_dataframe.transform_header(
+            raw_dataframe, mapping_dict=self.config_dict["database_fields_to_headers"])
+        final_df = setup_dataframe.format_date_columns(renamed_headers, self.config_dict["date_columns"])
+        money_columns = self.config_dict.get("money_columns", [])
+        final_df = setup_dataframe.format_money_columns(final_df, money_columns)
+        num_rows = final_df.shape[0]
+
+        if job.get("selection") and num_rows == 0:
+            raise ValueError(f"No claims match the selection {job['selection']}")
+
+        # Exporting Excel into fresh copies of the templates, routed and fitted like main.py
+        workbooks = template_registry.populate_templates(final_df, self.config_dict, job.get("password", "test"),
+                                                         plan=self.plan)
+
+        # Save Workbooks, suffixed with the template name when there are several
+        save_config = self.config_dict.get("save", {})
+        precompressed = template_blob.precompressed_parts(self.compresslevel)
+        save_paths = []
+        for output_name, workbook in workbooks.items():
+            workbook_name = file_name
+            if len(workbooks) > 1:
+                workbook_name = file_name.replace(".xlsx", f"_{output_name}.xlsx")
+
+            save_paths.append(export_excel.save_workbook(workbook, workbook_name,
+                                                         compresslevel=self.compresslevel,
+                                                         workers=save_config.get("workers"),
+                                                         sheets_directory=self.sheets_directory,
+                                                         precompressed=precompressed))
+
+        return {"status": "ok", "path": save_paths[0], "paths": save_paths, "rows": num_rows,
+                "seconds": time.perf_counter() - start}
+
+    def handle(self, job: dict) -> dict:
+        """
+        Runs a job and converts failures into an error result so the worker keeps running
+
+        Args:
+            job (dict): job description, see run_job
+
+        Returns:
+            result (dict): result of run_job or status "error" with the error message
+        """
+
+        try:
+            return self.run_job(job)
+        except Exception as e:
+            return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    def close(self):
+        self.connection.close()
+
+
+def serve_socket(worker: GenerationWorker, socket_path: str) -> None:
+    """
+    Accepts jobs on a Unix socket. Each connection sends one JSON encoded job
+    terminated by a newline and receives one JSON encoded result line. Jobs are
+    handled one at a time since they share the worker's template and connection.
+
+    Args:
+        worker (GenerationWorker): warm worker that runs the jobs
+        socket_path (str): path of the Unix socket to create
+    """
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            try:
+                result = worker.handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                result = {"status": "error", "error": f"Invalid job: {e}"}
+            self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+
+    # Remove a socket left behind by a previous worker
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    with socketserver.UnixStreamServer(socket_path, JobHandler) as server:
+        print(f"Worker listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+
+def submit_job(socket_path: str, job: dict, timeout: float = None) -> dict:
+    """
+    Client helper that sends a job to a worker started with serve_socket
+
+    Args:
+        socket_path (str): path of the worker's Unix socket
+        job (dict): job description, see GenerationWorker.run_job
+        timeout (float): seconds to wait for the result
+
+    Returns:
+        result (dict): result returned by the worker
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(job).encode("utf-8") + b"\n")
+
+        with client.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def watch_directory(worker: GenerationWorker, queue_dir: str, poll_interval: float = 0.5,
+                    once: bool = False) -> None:
+    """
+    Processes job files dropped into a queue directory. A job file `<id>.json` is
+    claimed by renaming it to `<id>.working`, its result is written to
+    `<id>.result.json` and the job file is finally renamed to `<id>.done` or
+    `<id>.failed`. Works on platforms without Unix sockets.
+
+    Args:
+        worker (GenerationWorker): warm worker that runs the jobs
+        queue_dir (str): directory to watch
+        poll_interval (float): seconds to wait between scans of an empty queue
+        once (bool): process the jobs currently queued and return
+    """
+
+    os.makedirs(queue_dir, exist_ok=True)
+
+    while True:
+        job_files = sorted(
+            (entry for entry in os.scandir(queue_dir)
+             if entry.name.endswith(".json") and not entry.name.endswith(".result.json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+
+        for entry in job_files:
+            job_id = entry.name[:-len(".json")]
+            working_path = os.path.join(queue_dir, f"{job_id}.working")
+
+            # Claim the job, another watcher may have been faster
+            try:
+                os.rename(entry.path, working_path)
+            except OSError:
+                continue
+
+            try:
+                with open(working_path, encoding="utf-8") as f:
+                    result = worker.handle(json.load(f))
+            except json.JSONDecodeError as e:
+                result = {"status": "error", "error": f"Invalid job: {e}"}
+
+            with open(os.path.join(queue_dir, f"{job_id}.result.json"), "w", encoding="utf-8") as f:
+                json.dump(result, f)
+
+            status = "done" if result["status"] == "ok" else "failed"
+            os.replace(working_path, os.path.join(queue_dir, f"{job_id}.{status}"))
+
+        if once:
+            return
+
+        if not job_files:
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog="python -m src.worker")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--socket", type=str, help="Path of the Unix socket to listen on")
+    source.add_argument("--queue-dir", type=str, help="Directory to watch for job files")
+    parser.add_argument("--config", type=str, default="config.json")
+    parser.add_argument("--db", type=str, default="data/medical_data.db")
+    args = parser.parse_args()
+
+    generation_worker = GenerationWorker(config_path=args.config, connection_string=args.db)
+    try:
+        if args.socket:
+            serve_socket(generation_worker, args.socket)
+        else:
+            watch_directory(generation_worker, args.queue_dir)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        generation_worker.close()
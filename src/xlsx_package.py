@@ -0,0 +1,342 @@
+"""
+Module: xlsx_package
+Description: This module writes the zip package of an xlsx workbook. openpyxl generates
+             the XML parts into an uncompressed spooled archive, then the parts are
+             streamed one at a time from the archive through deflate into a temporary
+             file that is moved into place atomically. Memory does not grow with the
+             size of the parts.
+
+             Large parts are cut into chunks of CHUNK_SIZE that are deflated in
+             parallel threads (zlib releases the GIL while compressing), each primed
+             with the last 32 KB of the previous chunk, and the chunk streams are
+             concatenated into one deflate stream as pigz does. The chunking does not
+             depend on the number of threads, so the output does not either.
+
+Author: Urban Halpern
+Original Creation: 2026-10-19
+Latest Revision: 2026-10-19
+"""
+
+import io
+import os
+import zlib
+import struct
+import zipfile
+import tempfile
+import contextlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from openpyxl.writer.excel import ExcelWriter
+from src import atomic_file
+
+# Zip record signatures and limits of the non zip64 format
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+CENTRAL_HEADER_SIGNATURE = 0x02014b50
+END_OF_CENTRAL_DIR_SIGNATURE = 0x06054b50
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+
+# Parts written by openpyxl are kept in memory up to this size before spilling to disk
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Uncompressed bytes deflated per task, and the window of deflate back references
+CHUNK_SIZE = 1024 * 1024
+DICTIONARY_SIZE = 32 * 1024
+
+
+class SpooledPart:
+    """
+    Part of a spooled archive, read in chunks only when the package is written
+    """
+
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo):
+        self.archive = archive
+        self.info = info
+        self.size = info.file_size
+        self.crc = info.CRC
+
+    def open(self):
+        return self.archive.open(self.info)
+
+    def read(self) -> bytes:
+        return self.archive.read(self.info)
+
+
+@contextlib.contextmanager
+def spool_workbook(workbook):
+    """
+    Generates the XML parts of a workbook with openpyxl into an uncompressed archive
+    that spills to disk above SPOOL_MAX_SIZE. The parts are valid until the context exits.
+
+    Args:
+        workbook (openpyxl.workbook.Workbook): workbook to serialize
+
+    Yields:
+        parts (list): (name, date_time, SpooledPart) tuple for every part in package order
+    """
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buffer:
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+            ExcelWriter(workbook, archive).save()
+
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as archive:
+            yield [(info.filename, info.date_time, SpooledPart(archive, info)) for info in archive.infolist()]
+
+
+def serialize_workbook(workbook) -> list:
+    """
+    Generates the XML parts of a workbook with openpyxl and reads them into memory.
+    Saving uses spool_workbook instead, which keeps the parts on disk.
+
+    Args:
+        workbook (openpyxl.workbook.Workbook): workbook to serialize
+
+    Returns:
+        parts (list): (name, date_time, data) tuple for every part in package order
+    """
+
+    with spool_workbook(workbook) as parts:
+        return [(name, date_time, part.read()) for name, date_time, part in parts]
+
+
+def deflate(data: bytes, compresslevel: int) -> bytes:
+    """
+    Returns the raw deflate stream of data as stored in a zip entry
+
+    Args:
+        data (bytes): uncompressed part
+        compresslevel (int): zlib compression level from 1 to 9
+
+    Returns:
+        payload (bytes): deflated part without zlib header
+    """
+
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _deflate_chunk(chunk: bytes, dictionary: bytes, compresslevel: int, last: bool) -> bytes:
+    """
+    Helper function deflating one chunk of a part. Chunks other than the last end on
+    a byte boundary without a final block, so the chunk streams can be concatenated.
+    """
+
+    if dictionary:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _part_size(data) -> int:
+    return data.size if isinstance(data, SpooledPart) else len(data)
+
+
+def _part_crc(data) -> int:
+    return data.crc if isinstance(data, SpooledPart) else zlib.crc32(data)
+
+
+def _open_part(data):
+    return data.open() if isinstance(data, SpooledPart) else io.BytesIO(data)
+
+
+def _deflate_stream(stream, compresslevel: int, executor: ThreadPoolExecutor, window: int):
+    """
+    Helper function deflating a stream chunk by chunk with at most window chunks in flight
+
+    Yields:
+        chunk (bytes): uncompressed chunk
+        payload (bytes): deflated chunk
+    """
+
+    pending = collections.deque()
+    dictionary = b""
+    chunk = stream.read(CHUNK_SIZE)
+    while True:
+        next_chunk = stream.read(CHUNK_SIZE)
+        last = not next_chunk
+        pending.append((chunk, executor.submit(_deflate_chunk, chunk, dictionary, compresslevel, last)))
+        dictionary = chunk[-DICTIONARY_SIZE:]
+
+        while pending and (last or len(pending) >= window):
+            done, future = pending.popleft()
+            yield done, future.result()
+
+        if last:
+            return
+        chunk = next_chunk
+
+
+def _deflate_bound(size: int) -> int:
+    """
+    Helper function returning an upper bound of the deflated size of a part,
+    zlib's compressBound plus the sync flush marker of every chunk
+    """
+
+    return size + (size >> 12) + (size >> 14) + 13 + 5 * (size // CHUNK_SIZE + 1)
+
+
+def write_package(parts: list, file_obj, compresslevel: int = 6, workers: int = None,
+                  precompressed: dict = None) -> None:
+    """
+    Writes the parts as a zip archive to an open, seekable binary file. A compresslevel
+    of 0 stores the parts uncompressed, which is useful for intermediate files.
+
+    The parts are written one at a time, the sizes and checksum of each local header
+    are filled in once its part is written, and the central directory is written
+    from the recorded offsets. Parts identical to a part in precompressed reuse its
+    payload instead of being compressed again. Whether the archive needs zip64
+    records is decided from the uncompressed sizes before anything is compressed,
+    such archives are written with zipfile.
+
+    Args:
+        parts (list): (name, date_time, data) tuples from spool_workbook or serialize_workbook,
+                      data is bytes or a SpooledPart
+        file_obj: writable and seekable binary file object
+        compresslevel (int): zlib compression level from 0 to 9
+        workers (int): number of compression threads, defaults to the cpu count
+        precompressed (dict): (name, crc32) -> (data, payload) of parts deflated at compresslevel,
+                              see template_blob.TemplateBlob.precompressed
+    """
+
+    if not 0 <= compresslevel <= 9:
+        raise ValueError(f"compresslevel must be between 0 and 9, got {compresslevel}")
+
+    sizes = [_part_size(data) for _, _, data in parts]
+    bound = sum(30 + 46 + 2 * len(name.encode("utf-8")) + (size if compresslevel == 0 else _deflate_bound(size))
+                for (name, _, _), size in zip(parts, sizes))
+    if bound >= ZIP32_LIMIT or len(parts) >= ZIP32_MAX_ENTRIES:
+        _write_package_zip64(parts, file_obj, compresslevel)
+        return
+
+    method = zipfile.ZIP_STORED if compresslevel == 0 else zipfile.ZIP_DEFLATED
+    version = 20
+    made_by = 3 << 8 | version  # unix, zip 2.0
+    external_attr = 0o600 << 16
+    workers = workers or os.cpu_count() or 1
+    header = struct.Struct("<IHHHHHIIIHH")
+
+    central_directory = []
+    start = file_obj.tell()
+    offset = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (name, date_time, data), size in zip(parts, sizes):
+            encoded_name = name.encode("utf-8")
+            flags = 0x800 if not name.isascii() else 0
+            dos_date, dos_time = _dos_date_time(date_time)
+
+            # Local file header, its checksum and compressed size are filled in below
+            file_obj.write(header.pack(LOCAL_HEADER_SIGNATURE, version, flags, method,
+                                       dos_time, dos_date, 0, 0, size, len(encoded_name), 0))
+            file_obj.write(encoded_name)
+
+            crc, compressed_size = _write_part_data(data, file_obj, compresslevel, executor, workers,
+                                                    (precompressed or {}).get((name, _part_crc(data))))
+
+            end = file_obj.tell()
+            file_obj.seek(start + offset)
+            file_obj.write(header.pack(LOCAL_HEADER_SIGNATURE, version, flags, method,
+                                       dos_time, dos_date, crc, compressed_size, size, len(encoded_name), 0))
+            file_obj.seek(end)
+
+            central_directory.append(
+                struct.pack("<IHHHHHHIIIHHHHHII", CENTRAL_HEADER_SIGNATURE, made_by, version, flags, method,
+                            dos_time, dos_date, crc, compressed_size, size, len(encoded_name), 0, 0, 0, 0,
+                            external_attr, offset) + encoded_name
+            )
+            offset += 30 + len(encoded_name) + compressed_size
+
+    central_directory = b"".join(central_directory)
+    file_obj.write(central_directory)
+    file_obj.write(struct.pack("<IHHHHIIH", END_OF_CENTRAL_DIR_SIGNATURE, 0, 0, len(parts), len(parts),
+                               len(central_directory), offset, 0))
+
+
+def _write_part_data(data, file_obj, compresslevel: int, executor: ThreadPoolExecutor, window: int,
+                     stored: tuple = None) -> tuple:
+    """
+    Helper function streaming the data of one part into the package
+
+    Returns:
+        crc (int): crc32 of the uncompressed part
+        compressed_size (int): number of bytes written
+    """
+
+    # A template part left unchanged reuses the payload deflated when the blob was built
+    if stored is not None and compresslevel != 0 and len(stored[0]) == _part_size(data):
+        part_data = data.read() if isinstance(data, SpooledPart) else data
+        if stored[0] == part_data:
+            file_obj.write(stored[1])
+            return zlib.crc32(part_data), len(stored[1])
+
+    crc = 0
+    compressed_size = 0
+    with _open_part(data) as stream:
+        if compresslevel == 0:
+            chunks = ((chunk, chunk) for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""))
+        else:
+            chunks = _deflate_stream(stream, compresslevel, executor, window)
+        for chunk, payload in chunks:
+            crc = zlib.crc32(chunk, crc)
+            file_obj.write(payload)
+            compressed_size += len(payload)
+
+    return crc, compressed_size
+
+
+def _dos_date_time(date_time: tuple) -> tuple:
+    """
+    Helper function converting a zipfile date_time tuple to the MS-DOS date and time fields
+    """
+
+    year, month, day, hour, minute, second = date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_date, dos_time
+
+
+def _write_package_zip64(parts: list, file_obj, compresslevel: int) -> None:
+    """
+    Helper function writing very large packages serially with zipfile, which handles zip64.
+    The parts are still streamed one chunk at a time.
+    """
+
+    method = zipfile.ZIP_STORED if compresslevel == 0 else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(file_obj, "w", method, allowZip64=True, compresslevel=compresslevel or None) as archive:
+        for name, date_time, data in parts:
+            info = zipfile.ZipInfo(name, date_time)
+            info.compress_type = method
+            info.external_attr = 0o600 << 16
+            info.file_size = _part_size(data)
+            with _open_part(data) as stream, archive.open(info, "w", force_zip64=True) as destination:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    destination.write(chunk)
+
+
+def save_atomic(parts: list, save_path: str, compresslevel: int = 6, workers: int = None,
+                precompressed: dict = None) -> str:
+    """
+    Writes the package to a temporary file in the destination directory and links
+    it into place with atomic_file. Linking fails if the destination exists, so two
+    writers can never overwrite each other and readers never see a partially written file.
+
+    Args:
+        parts (list): (name, date_time, data) tuples from spool_workbook or serialize_workbook
+        save_path (str): destination of the workbook
+        compresslevel (int): zlib compression level from 0 to 9
+        workers (int): number of compression threads
+        precompressed (dict): payloads of unchanged parts, see write_package
+
+    Returns:
+        save_path (str): destination of the workbook
+
+    Raises:
+        FileExistsError: if save_path already exists
+    """
+
+    with atomic_file.atomic_path(save_path, overwrite=False) as temp_path:
+        with open(temp_path, "wb") as f:
+            write_package(parts, f, compresslevel, workers, precompressed)
+
+    return save_path
@@ -0,0 +1,51 @@
+import os
+import pytest
+from src import atomic_file
+
+
+def test_atomic_path(tmp_path):
+    path = str(tmp_path / "nested" / "report.json")
+
+    with atomic_file.atomic_path(path) as temp_path:
+        assert os.path.dirname(temp_path) == os.path.dirname(path)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("first")
+
+    # A failed write leaves the previous file and no temporary file
+    with pytest.raises(RuntimeError):
+        with atomic_file.atomic_path(path) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write("partial")
+            raise RuntimeError("interrupted")
+
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "first"
+    assert os.listdir(tmp_path / "nested") == ["report.json"]
+
+
+def test_atomic_path_does_not_clobber(tmp_path, monkeypatch):
+    path = str(tmp_path / "export.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("existing")
+
+    with pytest.raises(FileExistsError):
+        with atomic_file.atomic_path(path, overwrite=False) as temp_path:
+            open(temp_path, "w").close()
+
+    # File systems without hard links fall back to a checked rename
+    def no_link(source, destination):
+        raise PermissionError("hard links are not supported")
+    monkeypatch.setattr(os, "link", no_link)
+
+    with pytest.raises(FileExistsError):
+        with atomic_file.atomic_path(path, overwrite=False) as temp_path:
+            open(temp_path, "w").close()
+
+    new_path = str(tmp_path / "new.csv")
+    with atomic_file.atomic_path(new_path, overwrite=False, durable=True) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("new")
+
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "existing"
+    assert sorted(os.listdir(tmp_path)) == ["export.csv", "new.csv"]
@@ -0,0 +1,69 @@
+import json
+import sqlite3
+from src import auto_tune
+
+
+def test_worker_candidates():
+    assert auto_tune.worker_candidates(1) == [1]
+    assert auto_tune.worker_candidates(6) == [1, 2, 4, 6]
+    assert auto_tune.worker_candidates(8) == [1, 2, 4, 8]
+
+
+def test_sample_database(tmp_path):
+    sample_path = str(tmp_path / "sample.db")
+    assert auto_tune.sample_database("data/test_medical_data.db", sample_path, 12) == 12
+
+    with sqlite3.connect("data/test_medical_data.db") as source, sqlite3.connect(sample_path) as sample:
+        assert sample.execute("SELECT * FROM medical_data;").fetchall() == \
+            source.execute("SELECT * FROM medical_data LIMIT 12;").fetchall()
+
+
+def test_best_result_respects_memory_limit():
+    results = [{"rows_per_second": 100, "peak_rss": 500, "settings": "fast"},
+               {"rows_per_second": 60, "peak_rss": 200, "settings": "lean"}]
+
+    assert auto_tune.best_result(results)["settings"] == "fast"
+    assert auto_tune.best_result(results, max_memory=300)["settings"] == "lean"
+    assert auto_tune.best_result(results, max_memory=100)["settings"] == "lean"
+
+
+def test_apply_profile(tmp_path):
+    profile_path = str(tmp_path / "profile.json")
+    config_dict = {"row_pipeline": {"workers": 1, "block_size": 5000}, "save": {"compresslevel": 6},
+                   "auto_tune": {"profile": profile_path, "overrides": {}}}
+
+    profile = {"version": auto_tune.PROFILE_VERSION, "machine": auto_tune.machine_id(),
+               "settings": {"row_pipeline": {"workers": 4, "block_size": 2500}, "save": {"workers": 2}}}
+    auto_tune.write_profile(profile, profile_path)
+
+    tuned = auto_tune.apply_profile(config_dict)
+    assert tuned["row_pipeline"] == {"workers": 4, "block_size": 2500}
+    assert tuned["save"] == {"compresslevel": 6, "workers": 2}
+    assert config_dict["row_pipeline"]["workers"] == 1
+
+    # Overrides win over the profile, and --no-profile keeps config.json
+    config_dict["auto_tune"]["overrides"] = {"row_pipeline": {"workers": 3}}
+    assert auto_tune.apply_profile(config_dict)["row_pipeline"] == {"workers": 3, "block_size": 2500}
+    assert auto_tune.apply_profile(config_dict, use_profile=False)["row_pipeline"] == {"workers": 3,
+                                                                                         "block_size": 5000}
+
+    # A profile measured on another machine is ignored
+    profile["machine"] = dict(profile["machine"], cpu_count=-1)
+    auto_tune.write_profile(profile, profile_path)
+    config_dict["auto_tune"]["overrides"] = {}
+    assert auto_tune.apply_profile(config_dict)["row_pipeline"]["workers"] == 1
+
+
+def test_tune_writes_settings(tmp_path):
+    with open("config.json", encoding="utf-8") as f:
+        config_dict = json.load(f)
+    config_dict["template_blob"] = {"directory": str(tmp_path / "templates")}
+
+    profile = auto_tune.tune("data/test_medical_data.db", config_dict, sample_rows=20, block_sizes=[10, 50],
+                             worker_counts=[1], repeat=1, log=lambda line: None)
+
+    assert profile["sample_rows"] == 20
+    assert profile["settings"]["save"] == {"workers": 1}
+    assert profile["settings"]["row_pipeline"]["block_size"] in (10, 50)
+    assert len(profile["results"]) == 3
+    assert all(result["rows"] == 20 and result["rows_per_second"] > 0 for result in profile["results"])
@@ -0,0 +1,63 @@
+import copy
+import pytest
+from src import config_compiler
+
+
+def test_load_plan_caches_valid_plans(config_dict, tmp_path, monkeypatch):
+    plan = config_compiler.load_plan(config_dict, "data/test_medical_data.db", cache_dir=str(tmp_path))
+
+    template = plan["templates"]["MAP or COFA"]
+    assert template["layout"]["headers"]["LAST NAME"] == "B"
+    assert template["layout"]["unlock_columns"] == ["M", "P", "S", "T", "U"]
+    assert template["formatting"]["DATE OF BIRTH"]["column"] == "E"
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # An unchanged configuration is not compiled again
+    def fail(*args):
+        raise AssertionError("compiled again")
+
+    monkeypatch.setattr(config_compiler, "compile_config", fail)
+    assert config_compiler.load_plan(config_dict, "data/test_medical_data.db", cache_dir=str(tmp_path)) == plan
+
+    # A changed configuration is
+    changed = dict(config_dict, date_columns=["DATE OF BIRTH"])
+    with pytest.raises(AssertionError):
+        config_compiler.load_plan(changed, "data/test_medical_data.db", cache_dir=str(tmp_path))
+
+
+def test_invalid_config_lists_every_problem(config_dict, tmp_path):
+    invalid = copy.deepcopy(config_dict)
+    invalid["database_fields_to_headers"]["missing_field"] = "LAST NAME"
+    invalid["date_columns"].append("NOT A HEADER")
+    invalid["formatting"]["NOT IN TEMPLATE"] = {"style_format": "0.00"}
+    invalid["formatting"]["MEDICAID ID"]["alignment"] = "middle"
+    invalid["unprotected_columns"].append("NOT IN TEMPLATE EITHER")
+    invalid["row_capacity"] = {"slack_rows": -1}
+    invalid["templates"] = {"MAP or COFA": {"path": "CTS_Example_Template.xlsx", "sheet": "MAP or COFA",
+                                            "route": {"column": "TPL"}},
+                            "Missing": {"path": "missing.xlsx"}}
+
+    with pytest.raises(ValueError) as error:
+        config_compiler.load_plan(invalid, "data/test_medical_data.db", cache_dir=str(tmp_path))
+
+    message = str(error.value)
+    for problem in ("missing_field", "NOT A HEADER", "NOT IN TEMPLATE", "middle", "NOT IN TEMPLATE EITHER",
+                    "slack_rows", "Route of template MAP or COFA", "missing.xlsx"):
+        assert problem in message
+
+    # Invalid plans are not cached
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_lean_template_rejects_routed_registries(config_dict):
+    plan = config_compiler.compile_config(config_dict)
+    assert config_compiler.lean_template(plan)["path"] == "CTS_Example_Template.xlsx"
+
+    routed = copy.deepcopy(config_dict)
+    routed["templates"]["MAP or COFA"]["route"] = {"column": "TPL", "in": ["Medicare"]}
+    with pytest.raises(ValueError, match="route"):
+        config_compiler.lean_template(config_compiler.compile_config(routed))
+
+    several = dict(plan, templates=dict(plan["templates"], Other=plan["templates"]["MAP or COFA"]))
+    with pytest.raises(ValueError, match="single template"):
+        config_compiler.lean_template(several)
@@ -0,0 +1,19 @@
+import json
+import pytest
+from src import setup_dataframe
+
+
+@pytest.fixture(scope="module")
+def config_dict():
+    with open("config.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def config_and_df(config_dict):
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+    df = setup_dataframe.format_money_columns(df, config_dict["money_columns"])
+
+    return config_dict, df
@@ -0,0 +1,65 @@
+import json
+import datetime
+import numpy as np
+import openpyxl
+import pytest
+from src import diff_workbooks, export_excel, setup_dataframe
+
+
+@pytest.fixture(scope="module")
+def workbook_pair(config_dict, tmp_path_factory):
+    """
+    Generates a CTS workbook from the test database and a returned copy that the
+    provider re-sorted, with a few user entries, one edited claim and one extra
+    row. Every claim gets its own date of service.
+    """
+
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+    df["DATE OF SERVICE"] = [datetime.date(2024, 6, 1) + datetime.timedelta(days=day) for day in range(len(df))]
+
+    directory = tmp_path_factory.mktemp("diff")
+    workbook = export_excel.insert_into_template(df, config_dict["formatting"])
+    generated = export_excel.save_workbook(workbook, "generated.xlsx", sheets_directory=str(directory))
+
+    # The returned rows are in reverse order, claim n of the generated sheet is on row 31 - n
+    returned_workbook = export_excel.insert_into_template(df.iloc[::-1].reset_index(drop=True),
+                                                          config_dict["formatting"])
+    sheet = returned_workbook["MAP or COFA"]
+    sheet["M31"] = 100.0         # AMOUNT DUE of the first claim, 1234567890 on 2024-06-01
+    sheet["M28"] = 25.0          # AMOUNT DUE of the fourth claim, 1234567890 on 2024-06-04
+    sheet["P30"] = 0             # SPEND DOWN of 0987654321 on 2024-06-02
+    sheet["A32"] = "1111111111"  # Row added by the provider
+    returned = str(directory / "returned.xlsx")
+    returned_workbook.save(returned)
+
+    return generated, returned
+
+
+def test_occurrence_keys():
+    keys = np.array(["b", "a", "b", "b", "a"], dtype=object)
+
+    assert diff_workbooks.occurrence_keys(keys).tolist() == ["b#0", "a#0", "b#1", "b#2", "a#1"]
+
+
+def test_diff_workbooks(workbook_pair, tmp_path):
+    generated, returned = workbook_pair
+
+    change_set = diff_workbooks.diff_workbooks(generated, returned, ["AMOUNT DUE", "SPEND DOWN", "NOTE"])
+
+    assert change_set["counts"] == {"AMOUNT DUE": 2, "SPEND DOWN": 1, "NOTE": 0}
+    assert change_set["added"] == ["1111111111 /  /  / #0"]
+    assert change_set["removed"] == []
+    assert change_set["changes"][0] == {"key": "1234567890 / 2024-06-01 / D1234 / MOD1#0", "column": "AMOUNT DUE",
+                                        "old": None, "new": 100.0}
+    assert change_set["changes"][1]["key"] == "1234567890 / 2024-06-04 / D1234 / MOD1#0"
+    assert change_set["changes"][2] == {"key": "0987654321 / 2024-06-02 / C4567 / MOD2#0", "column": "SPEND DOWN",
+                                        "old": 75, "new": 0}
+
+    # Both output formats
+    diff_workbooks.write_change_set(change_set, str(tmp_path / "changes.csv"))
+    diff_workbooks.write_change_set(change_set, str(tmp_path / "changes.json"))
+
+    assert len((tmp_path / "changes.csv").read_text().splitlines()) == 5
+    assert json.loads((tmp_path / "changes.json").read_text())["counts"]["AMOUNT DUE"] == 2
@@ -1,7 +1,10 @@
 import os
+import sys
+import zipfile
+import subprocess
 import pytest
 import openpyxl
-from src import export_excel
+from src import export_excel, workbook_equivalence
 
 class TestDataIngestion:
     @classmethod
@@ -43,3 +46,43 @@ class TestDataIngestion:
         protected_cell = self.test_worksheet["A1"]
 
         assert protected_cell.protection.locked is True
+
+    def test_save_workbook(self, tmp_path):
+
+        # Stored and deflated packages should both load back with the same data
+        for compresslevel in (0, 9):
+            name = f"saved_{compresslevel}.xlsx"
+            save_path = export_excel.save_workbook(self.test_workbook, name, compresslevel=compresslevel,
+                                                   sheets_directory=str(tmp_path))
+
+            with zipfile.ZipFile(save_path) as archive:
+                assert archive.testzip() is None
+
+            saved_sheet = openpyxl.load_workbook(save_path)["MAP or COFA"]
+            assert saved_sheet["B1"].value == self.test_worksheet["B1"].value
+
+        # No temporary files are left behind
+        assert sorted(os.listdir(tmp_path)) == ["saved_0.xlsx", "saved_9.xlsx"]
+
+        # Existing files are never overwritten
+        with pytest.raises(FileExistsError):
+            export_excel.save_workbook(self.test_workbook, "saved_0.xlsx", sheets_directory=str(tmp_path))
+
+    def test_column_formats_match_per_cell_formats(self, tmp_path):
+
+        # The script compares the insertion against get_format applied to every cell
+        result = subprocess.run([sys.executable, "dev_scripts/verify_formats.py", "--db", "data/test_medical_data.db"],
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout
+        assert "identical" in result.stdout
+
+        # A changed format is reported
+        workbook_a = openpyxl.load_workbook(os.path.join("tests", "CTS_Test.xlsx"))
+        workbook_b = openpyxl.load_workbook(os.path.join("tests", "CTS_Test.xlsx"))
+        workbook_b["MAP or COFA"]["C3"].number_format = "0.00"
+        path_a = export_excel.save_workbook(workbook_a, "a.xlsx", sheets_directory=str(tmp_path))
+        path_b = export_excel.save_workbook(workbook_b, "b.xlsx", sheets_directory=str(tmp_path))
+
+        differences = workbook_equivalence.compare_workbooks(path_a, path_b)
+        assert [(sheet, location, attribute) for sheet, location, attribute, _, _ in differences] == \
+            [("MAP or COFA", "C3", "number_format")]
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+from openpyxl.utils import column_index_from_string
+from src import export_excel, export_tabular, template_registry
+
+
+@pytest.fixture(scope="module")
+def config_and_df(config_and_df):
+    config_dict, df = config_and_df
+
+    workbook = export_excel.load_template("CTS_Example_Template.xlsx")
+    layout = template_registry.get_layout(workbook, "CTS_Example_Template.xlsx", "MAP or COFA",
+                                          config_dict["unprotected_columns"])
+
+    return config_dict, df, layout
+
+
+def test_compile_formula():
+    # Amounts in cents, blanks count as 0
+    columns = {"M": pd.Series([10000, pd.NA, 30], dtype="Int64"), "P": pd.Series([100, 200, 300]),
+               "Q": pd.Series([pd.NA, 100, 100], dtype="Int64"), "S": pd.Series([pd.NA] * 3, dtype="Int64")}
+
+    assert export_tabular.compile_formula("=SUM(M2,P2,Q2,S2)")(columns).tolist() == [10100, 300, 430]
+    assert export_tabular.compile_formula("=FLOOR($M2*0.17,0.01)")(columns).tolist() == [1700, 0, 5]
+
+    with pytest.raises(ValueError):
+        export_tabular.compile_formula("=VLOOKUP(M2,A1:B9,2)")
+    with pytest.raises(ValueError):
+        export_tabular.compile_formula("=M3*2")
+
+    # Division keeps enough decimals for the rounding to whole cents
+    assert export_tabular.compile_formula("=-M2/3+P2")(columns).tolist() == [-3233, 200, 290]
+
+    # Rows divided by zero are empty, the other rows are still computed
+    assert export_tabular.compile_formula("=P2*100/M2")(columns).tolist() == [1, pd.NA, 1000]
+
+    # Excel operators without an arithmetic meaning in Python are rejected with the formula
+    for formula in ("=M2^2", "=M2&P2", "=M2=P2", "=M2<>P2", "=M2>P2"):
+        with pytest.raises(ValueError, match="not supported"):
+            export_tabular.compile_formula(formula)
+
+
+def test_tabular_frame(config_and_df):
+    config_dict, df, layout = config_and_df
+
+    frame = export_tabular.tabular_frame(df, layout, config_dict["money_columns"])
+
+    # Same columns in the same order as the template header row
+    assert list(frame.columns) == sorted(layout["headers"],
+                                         key=lambda header: column_index_from_string(layout["headers"][header]))
+    assert frame.shape[0] == df.shape[0]
+    assert frame["LAST NAME"].tolist() == df["LAST NAME"].tolist()
+
+    # Empty entry columns count as 0 like in the workbook
+    assert frame["GRAND TOTAL"].tolist() == ((df["SPEND DOWN"] + df["TPL AMOUNT"]) / 100).tolist()
+    assert (frame["LOCAL SHARE"] == 0).all() and (frame["FEDERAL SHARE"] == 0).all()
+    assert frame["AMOUNT DUE"].isna().all()
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_export_csv(config_and_df, tmp_path, compression):
+    config_dict, df, _ = config_and_df
+
+    paths = export_tabular.export_tables(df, config_dict, "extract", "csv", compression,
+                                         sheets_directory=str(tmp_path))
+    assert paths == [str(tmp_path / export_tabular.output_path("extract", "csv", compression))]
+
+    # Small chunks produce the same file as a single chunk
+    frame = export_tabular.tabular_frame(df, config_and_df[2], config_dict["money_columns"])
+    chunked_path = str(tmp_path / "chunked.csv")
+    export_tabular.write_csv(frame, chunked_path, chunk_rows=7)
+
+    if compression == "zstd":
+        # pandas reads zstd through the zstandard package, pyarrow is the optional dependency here
+        pa = pytest.importorskip("pyarrow")
+        with pa.CompressedInputStream(pa.OSFile(paths[0]), "zstd") as stream:
+            result = pd.read_csv(stream, dtype=str, keep_default_na=False)
+    else:
+        result = pd.read_csv(paths[0], dtype=str, keep_default_na=False)
+    chunked = pd.read_csv(chunked_path, dtype=str, keep_default_na=False)
+    pd.testing.assert_frame_equal(result, chunked)
+
+    assert result.shape == (df.shape[0], len(config_and_df[2]["headers"]))
+    assert result.loc[0, "DATE OF BIRTH"] == df.loc[0, "DATE OF BIRTH"].strftime("%Y-%m-%d")
+
+    with pytest.raises(FileExistsError):
+        export_tabular.export_tables(df, config_dict, "extract", "csv", compression, sheets_directory=str(tmp_path))
+
+
+@pytest.mark.parametrize("compression", [None, "zstd"])
+def test_export_parquet(config_and_df, tmp_path, compression):
+    pq = pytest.importorskip("pyarrow.parquet")
+    config_dict, df, layout = config_and_df
+
+    path, = export_tabular.export_tables(df, config_dict, "extract", "parquet", compression,
+                                         sheets_directory=str(tmp_path))
+
+    metadata = pq.ParquetFile(path).metadata
+    schema = metadata.schema.to_arrow_schema()
+    assert schema.names == list(export_tabular.tabular_frame(df, layout, config_dict["money_columns"]).columns)
+    assert str(schema.field("DATE OF SERVICE").type) == "date32[day]"
+
+    # Text columns are dictionary encoded
+    column = schema.get_field_index("TPL")
+    assert "RLE_DICTIONARY" in metadata.row_group(0).column(column).encodings
+
+    table = pq.read_table(path).to_pandas()
+    assert table["GRAND TOTAL"].tolist() == ((df["SPEND DOWN"] + df["TPL AMOUNT"]) / 100).tolist()
@@ -0,0 +1,53 @@
+import os
+import shutil
+import sqlite3
+import pandas as pd
+import pytest
+from src import extract_cache, setup_dataframe
+
+pytest.importorskip("pyarrow")
+
+
+def test_cache_key():
+    key = extract_cache.cache_key("SELECT 1;", {"a": 1, "b": [1, 2]})
+
+    # Key should not depend on parameter order but should depend on the values
+    assert key == extract_cache.cache_key("SELECT 1;", {"b": [1, 2], "a": 1})
+    assert key != extract_cache.cache_key("SELECT 1;", {"a": 2, "b": [1, 2]})
+    assert key != extract_cache.cache_key("SELECT 2;", {"a": 1, "b": [1, 2]})
+
+
+def test_save_and_load_extract(tmp_path):
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.format_date_columns(df, ["date_of_service"])
+
+    marker = extract_cache.get_source_marker("data/test_medical_data.db")
+    key = extract_cache.cache_key(setup_dataframe.QUERY, {"db": "test"})
+
+    # Miss before anything is written
+    assert extract_cache.load_extract(str(tmp_path), key) is None
+
+    extract_cache.save_extract(df, str(tmp_path), key, source_marker=marker)
+    assert os.listdir(tmp_path) == [f"{key}.feather"]
+
+    # Hit returns an identical dataframe
+    cached = extract_cache.load_extract(str(tmp_path), key, ttl_seconds=60, source_marker=marker)
+    pd.testing.assert_frame_equal(cached, df)
+
+    # Stale on a changed source marker or an expired ttl
+    assert extract_cache.load_extract(str(tmp_path), key, source_marker="changed") is None
+    assert extract_cache.load_extract(str(tmp_path), key, ttl_seconds=-1) is None
+
+
+def test_source_marker_changes(tmp_path):
+    db_path = str(tmp_path / "medical_data.db")
+    shutil.copy("data/test_medical_data.db", db_path)
+
+    marker = extract_cache.get_source_marker(db_path)
+
+    connection = sqlite3.connect(db_path)
+    connection.execute("INSERT INTO medical_data (control_account_number, date_of_service) VALUES ('1', '2030-01-01');")
+    connection.commit()
+    connection.close()
+
+    assert extract_cache.get_source_marker(db_path) != marker
@@ -0,0 +1,38 @@
+import sqlite3
+import subprocess
+import sys
+
+
+def read_rows(database_path):
+    connection = sqlite3.connect(database_path)
+    try:
+        return connection.execute("SELECT * FROM medical_data").fetchall()
+    finally:
+        connection.close()
+
+
+def test_generation_is_reproducible(tmp_path):
+    paths = [str(tmp_path / name) for name in ("first.db", "second.db", "other_seed.db")]
+    seeds = ["5", "5", "6"]
+
+    for path, seed in zip(paths, seeds):
+        subprocess.run([sys.executable, "dev_scripts/generate_fake_database.py", "--db", path,
+                        "--rows", "2500", "--seed", seed, "--batch-size", "1000"], check=True, capture_output=True)
+
+    first, second, other_seed = (read_rows(path) for path in paths)
+
+    assert len(first) == 2500
+    assert first == second
+    assert first != other_seed
+
+    # Accounts span several consecutive claim lines with the same patient, also across batches
+    lines = {}
+    for row in first:
+        lines.setdefault(row[0], []).append(row)
+    assert 2500 / 6 < len(lines) < 2500 / 3
+    assert sum(len(rows) >= 2 for rows in lines.values()) >= len(lines) - 1
+    for rows in lines.values():
+        assert len({(row[1], row[2], row[3], row[4], row[5]) for row in rows}) == 1
+
+    accounts = [row[0] for row in first]
+    assert accounts == sorted(accounts)
@@ -0,0 +1,40 @@
+import shutil
+import sqlite3
+import pytest
+from src import index_advisor, setup_dataframe
+
+
+def test_connect_sqlite_read_only(tmp_path):
+    connection = setup_dataframe.connect_sqlite("data/test_medical_data.db")
+    try:
+        assert connection.execute("SELECT COUNT(*) FROM medical_data").fetchone()[0] > 0
+        assert connection.execute("PRAGMA cache_size").fetchone()[0] == -65536
+
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute("DELETE FROM medical_data")
+    finally:
+        connection.close()
+
+    # A read-only connection does not create a missing database
+    with pytest.raises(sqlite3.OperationalError):
+        setup_dataframe.connect_sqlite(str(tmp_path / "missing.db"))
+    assert not (tmp_path / "missing.db").exists()
+
+
+def test_advise(tmp_path):
+    database_path = str(tmp_path / "medical_data.db")
+    shutil.copy("data/test_medical_data.db", database_path)
+
+    connection = sqlite3.connect(database_path)
+    try:
+        advice = index_advisor.advise(connection)
+        assert all(entry["action"] == "recommended" for entry in advice)
+
+        advice = index_advisor.advise(connection, create=True)
+        assert all(entry["action"] == "created" for entry in advice)
+        assert all(index_advisor.uses_index(entry["plan"], "medical_data") for entry in advice)
+
+        # Nothing left to recommend once the indexes exist
+        assert all(entry["action"] == "ok" for entry in index_advisor.advise(connection))
+    finally:
+        connection.close()
@@ -0,0 +1,100 @@
+import sqlite3
+import datetime
+import pytest
+from src import export_excel, ingest_returns, setup_dataframe
+
+
+@pytest.fixture(scope="module")
+def returned_workbooks(config_dict, tmp_path_factory):
+    """
+    Generates CTS workbooks from the test database and fills in the user entry
+    columns the way a provider would. The claims of the test database only differ
+    in their position, so every row gets its own date of service. The second
+    workbook was re-sorted by the provider.
+    """
+
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+
+    directory = tmp_path_factory.mktemp("returned")
+    duplicated = export_excel.save_workbook(export_excel.insert_into_template(df, config_dict["formatting"]),
+                                            "duplicated.xlsx", sheets_directory=str(directory))
+
+    df["DATE OF SERVICE"] = [datetime.date(2024, 6, 1) + datetime.timedelta(days=day) for day in range(len(df))]
+
+    paths = []
+    for file_idx, claims in enumerate([df, df.iloc[::-1]]):
+        workbook = export_excel.insert_into_template(claims.reset_index(drop=True), config_dict["formatting"])
+        sheet = workbook["MAP or COFA"]
+
+        # Fill AMOUNT DUE and NOTE for every claim line, the amount follows the claim
+        for row, service_date in enumerate(claims["DATE OF SERVICE"], start=2):
+            sheet[f"M{row}"] = 10.5 * service_date.day + file_idx
+            sheet[f"U{row}"] = f"note {file_idx}"
+
+        paths.append(export_excel.save_workbook(workbook, f"returned_{file_idx}.xlsx",
+                                                sheets_directory=str(directory)))
+
+    return paths, duplicated, config_dict
+
+
+def test_header_to_field():
+    mapping = {"spend_down": "SPEND DOWN"}
+
+    assert ingest_returns.header_to_field("SPEND DOWN", mapping) == "spend_down"
+    assert ingest_returns.header_to_field("CONTROL/ACCOUNT #") == "control_account"
+    assert ingest_returns.header_to_field("AMOUNT DUE") == "amount_due"
+
+
+def test_read_returned_workbook(returned_workbooks):
+    paths, duplicated, _ = returned_workbooks
+
+    rows = ingest_returns.read_returned_workbook(paths[0], ["AMOUNT DUE", "NOTE"])
+
+    # Claims are identified by account, date of service, code and modifier
+    assert len(rows) == 30
+    assert rows[:2] == [
+        ("1234567890", "2024-06-01", "D1234", "MOD1", 10.5, "note 0", "returned_0.xlsx"),
+        ("0987654321", "2024-06-02", "C4567", "MOD2", 21.0, "note 0", "returned_0.xlsx"),
+    ]
+
+    with pytest.raises(ValueError, match="not found"):
+        ingest_returns.read_returned_workbook(paths[0], ["NOT IN SHEET"])
+
+    # The same claim on several rows cannot be matched to a claim line
+    with pytest.raises(ValueError, match="Duplicate claims in duplicated.xlsx"):
+        ingest_returns.read_returned_workbook(duplicated, ["AMOUNT DUE"])
+
+
+def test_ingest_returned_workbooks(returned_workbooks, tmp_path):
+    paths, _, config_dict = returned_workbooks
+    connection = sqlite3.connect(tmp_path / "returns.db")
+
+    def ingest(file_paths):
+        return ingest_returns.ingest_returned_workbooks(
+            file_paths, connection, config_dict["unprotected_columns"],
+            mapping_dict=config_dict["database_fields_to_headers"], batch_size=7, workers=2
+        )
+
+    # A claim returned in two workbooks of one ingest is an error and nothing is stored
+    with pytest.raises(ValueError, match="in returned_0.xlsx and returned_1.xlsx"):
+        ingest(paths)
+    assert connection.execute("SELECT name FROM sqlite_master WHERE name = 'cts_returns';").fetchone() is None
+
+    # A later ingest updates the claims, the values follow the claim after re-sorting
+    assert ingest(paths[:1]) == 30
+    assert ingest(paths[1:]) == 30
+    assert connection.execute("SELECT COUNT(*) FROM cts_returns;").fetchone() == (30,)
+
+    rows = connection.execute(
+        "SELECT control_account_number, date_of_service, amount_due, spend_down, note, source_file "
+        "FROM cts_returns WHERE date_of_service <= '2024-06-03' ORDER BY date_of_service;"
+    ).fetchall()
+    connection.close()
+
+    assert rows == [
+        ("1234567890", "2024-06-01", 11.5, 50, "note 1", "returned_1.xlsx"),
+        ("0987654321", "2024-06-02", 22.0, 75, "note 1", "returned_1.xlsx"),
+        ("5678901234", "2024-06-03", 32.5, 100, "note 1", "returned_1.xlsx"),
+    ]
@@ -0,0 +1,78 @@
+import os
+import pytest
+from src import job_manifest
+
+
+def test_write_manifest_is_atomic(tmp_path):
+    manifest_path = str(tmp_path / "batch.manifest.json")
+    manifest = job_manifest.new_manifest("batch", "TPL")
+
+    job_manifest.write_manifest(manifest, manifest_path)
+
+    assert job_manifest.load_manifest(manifest_path) == manifest
+    assert os.listdir(tmp_path) == ["batch.manifest.json"]
+    assert job_manifest.load_manifest(str(tmp_path / "missing.json")) is None
+
+
+def test_rerun_resumes_batch(config_and_df, tmp_path):
+    config_dict, df = config_and_df
+    manifest_path = str(tmp_path / "batch.manifest.json")
+
+    def run(final_df):
+        return job_manifest.run_batch(final_df, config_dict, "TPL", "batch", sheets_directory=str(tmp_path))
+
+    manifest = run(df)
+    partitions = manifest["partitions"]
+    assert sorted(partitions) == sorted(df["TPL"].unique())
+    assert all(entry["status"] == "done" for entry in partitions.values())
+    assert sum(entry["rows"] for entry in partitions.values()) == df.shape[0]
+    assert job_manifest.load_manifest(manifest_path) == manifest
+
+    # A rerun with the same inputs skips every partition
+    mtimes = {key: os.stat(entry["outputs"][0]).st_mtime_ns for key, entry in partitions.items()}
+    manifest = run(df)
+    assert {key: os.stat(entry["outputs"][0]).st_mtime_ns for key, entry in manifest["partitions"].items()} == mtimes
+
+    # Changed rows, an interrupted partition and a requeued partition are generated again
+    keys = sorted(partitions)
+    changed = df.copy()
+    changed.loc[changed["TPL"] == keys[0], "LAST NAME"] = "CHANGED"
+    manifest["partitions"][keys[1]]["status"] = "running"
+    job_manifest.requeue(manifest, [keys[2]])
+    job_manifest.write_manifest(manifest, manifest_path)
+
+    manifest = run(changed)
+    regenerated = [key for key, entry in manifest["partitions"].items()
+                   if os.stat(entry["outputs"][0]).st_mtime_ns != mtimes[key]]
+    assert sorted(regenerated) == keys[:3]
+    assert all(entry["status"] == "done" for entry in manifest["partitions"].values())
+
+    with pytest.raises(ValueError):
+        job_manifest.run_batch(df, config_dict, "LAST NAME", "batch", sheets_directory=str(tmp_path))
+
+    # A selected subset must not replace the partition files of the full batch
+    selection = {"accounts": [str(df["CONTROL/ACCOUNT #"].iloc[0])]}
+    with pytest.raises(ValueError, match="selection"):
+        job_manifest.run_batch(df.head(10), config_dict, "TPL", "batch", sheets_directory=str(tmp_path),
+                               selection=selection)
+    assert job_manifest.load_manifest(manifest_path)["selection"] is None
+
+
+def test_partition_file_names_do_not_collide(config_and_df, tmp_path):
+    config_dict, df = config_and_df
+
+    assert job_manifest.output_file_name("batch", "Medicare") == "batch_Medicare.xlsx"
+    assert job_manifest.output_file_name("batch", "A B") != job_manifest.output_file_name("batch", "A_B")
+    assert job_manifest.output_file_name("batch", job_manifest.MISSING_PARTITION) != \
+        job_manifest.output_file_name("batch", "missing")
+
+    # Keys only differing in case would share a file on case-insensitive file systems
+    cased = df.assign(TPL=["Medicare", "medicare", None] * 10)
+    with pytest.raises(ValueError, match="'Medicare' and 'medicare'"):
+        job_manifest.run_batch(cased, config_dict, "TPL", "batch", sheets_directory=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+    # The literal missing key cannot be told apart from rows without a value
+    literal = df.assign(TPL=[job_manifest.MISSING_PARTITION, None, "Medicare"] * 10)
+    with pytest.raises(ValueError, match="key of rows without a value"):
+        job_manifest.run_batch(literal, config_dict, "TPL", "batch", sheets_directory=str(tmp_path))
@@ -0,0 +1,38 @@
+import re
+import subprocess
+import sys
+
+
+def test_startup_budget():
+
+    # --help must not import pandas, numpy or openpyxl. The time budget is generous
+    # so that slow CI machines do not fail, the heavy module check is the real guard.
+    result = subprocess.run(
+        [sys.executable, "dev_scripts/benchmark_startup.py", "--runs", "3", "--budget-ms", "250"],
+        capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stdout
+
+
+def test_invalid_name_fails_fast():
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "main.py", "-n", "not_excel"],
+                            capture_output=True, text=True)
+
+    assert "ValueError" in result.stderr
+    assert not re.search(r"\|\s+pandas$", result.stderr, re.MULTILINE)
+
+
+def test_invalid_selection_fails_fast():
+
+    result = subprocess.run([sys.executable, "main.py", "-n", "selection.xlsx", "--shard", "3/2"],
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--shard" in result.stderr
+
+    result = subprocess.run([sys.executable, "main.py", "-n", "selection.xlsx",
+                             "--service-from", "2024-06-20", "--service-to", "2024-06-15"],
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--service-from" in result.stderr
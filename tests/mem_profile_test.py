@@ -0,0 +1,133 @@
+import copy
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.styles import Alignment, Protection
+from openpyxl.styles.cell_style import StyleArray
+from src import mem_profile, run_metrics
+
+
+def test_object_counter_counts_and_restores():
+    constructors = (Cell.__init__, Alignment.__init__, Protection.__init__, StyleArray.__new__)
+
+    sheet = openpyxl.Workbook().active
+
+    counter = mem_profile.ObjectCounter()
+    counter.install()
+    try:
+        for row in range(1, 11):
+            sheet.cell(row=row, column=1, value=row)
+        alignment = Alignment(horizontal="center")
+        copy.copy(alignment)
+        Protection(locked=False)
+        copy.copy(StyleArray())
+    finally:
+        counter.uninstall()
+
+    assert counter.counts["Cell"] == 10
+    assert counter.counts["Alignment"] == 2
+    assert counter.counts["Protection"] == 1
+    assert counter.counts["StyleArray"] == 2
+    assert (Cell.__init__, Alignment.__init__, Protection.__init__, StyleArray.__new__) == constructors
+
+
+def allocate(count):
+    return [bytes(1000) for _ in range(count)], [Alignment(horizontal="left") for _ in range(count)]
+
+
+def test_stages_report_sites_and_objects():
+    profile = mem_profile.MemoryProfile("profile.xlsx", top_sites=5)
+    metrics = run_metrics.RunMetrics("profile.xlsx")
+    metrics.profiler = profile
+
+    kept = []
+    profile.start()
+    try:
+        for _ in range(2):
+            with metrics.stage("export"):
+                kept.append(allocate(500))
+        with metrics.stage("save"):
+            allocate(200)
+    finally:
+        profile.stop()
+
+    report = profile.report(rows=250)
+    export, save = report["stages"]["export"], report["stages"]["save"]
+    assert export["runs"] == 2
+    assert export["objects"]["Alignment"] == 1000
+    assert export["objects_per_1k_rows"]["Alignment"] == 4000
+    assert export["net_bytes"] > 1_000_000
+    assert export["peak_bytes"] > 500_000
+
+    # The retained bytes are attributed to the line that allocated them
+    assert export["sites"][0]["site"].startswith("tests/mem_profile_test.py:")
+    assert export["sites"][0]["size_bytes"] > 1_000_000
+    assert len(export["sites"]) <= 5
+
+    # Freed memory does not remain in the stage, only in its peak
+    assert save["peak_bytes"] > 200_000
+    assert save["net_bytes"] < save["peak_bytes"]
+    assert metrics.stages.keys() == {"export", "save"}
+
+
+def make_report(name, peak, cells_per_row, started="2026-10-19T00:00:00", status="ok"):
+    return {"version": mem_profile.REPORT_VERSION, "name": name, "started": started, "status": status, "rows": 1000,
+            "stages": {"export": {"runs": 1, "peak_bytes": peak, "net_bytes": peak // 2,
+                                  "sites": [{"site": "src/export_excel.py:306", "size_bytes": peak // 4, "count": 1}],
+                                  "objects": {"Cell": cells_per_row * 1000},
+                                  "objects_per_1k_rows": {"Cell": cells_per_row * 1000}}}}
+
+
+def test_compare_reports():
+    baseline = make_report("before.xlsx", 10_000_000, 21)
+
+    comparison = mem_profile.compare_reports(baseline, make_report("after.xlsx", 6_000_000, 14))
+    assert comparison["stages"]["export"]["peak_bytes"] == [10_000_000, 6_000_000, -40.0]
+    assert comparison["regressions"] == []
+
+    comparison = mem_profile.compare_reports(baseline, make_report("after.xlsx", 12_000_000, 21), max_regression=10)
+    assert [(regression["measure"], regression["change"]) for regression in comparison["regressions"]] == \
+        [("peak_bytes", 20.0)]
+
+    text = mem_profile.format_comparison(comparison)
+    assert "| Peak (MB) | 10.00 | 12.00 | +20.0% |" in text
+    assert "- export peak_bytes:" in text
+
+
+def test_save_run_compares_with_latest_report(tmp_path):
+    memprofile_config = {"directory": str(tmp_path)}
+
+    report_path, comparison_path = mem_profile.save_run(make_report("first.xlsx", 10_000_000, 21), memprofile_config)
+    assert report_path == str(tmp_path / "first.20261019-000000.memprofile.json")
+    assert comparison_path is None
+
+    report_path, comparison_path = mem_profile.save_run(make_report("second.xlsx", 8_000_000, 21), memprofile_config)
+    assert mem_profile.load_report(report_path)["name"] == "second.xlsx"
+    with open(comparison_path, encoding="utf-8") as f:
+        assert "Baseline:  first.xlsx" in f.read()
+
+    # A failed run is reported but neither compared nor used as the next baseline
+    failed_path, comparison_path = mem_profile.save_run(
+        make_report("third.xlsx", 1_000_000, 21, status="error"), memprofile_config)
+    assert comparison_path is None
+    assert mem_profile.find_baseline(str(tmp_path)) == report_path
+    assert mem_profile.find_baseline(str(tmp_path), exclude=report_path) != failed_path
+
+
+def test_save_run_keeps_reports_of_reruns(tmp_path):
+    memprofile_config = {"directory": str(tmp_path)}
+
+    first_path, _ = mem_profile.save_run(make_report("claims.xlsx", 10_000_000, 21), memprofile_config)
+    second_path, comparison_path = mem_profile.save_run(
+        make_report("claims.xlsx", 8_000_000, 21, started="2026-10-19T01:00:00"), memprofile_config)
+
+    # A rerun under the same name is compared with the previous run, not with itself
+    assert second_path == str(tmp_path / "claims.20261019-010000.memprofile.json")
+    assert mem_profile.load_report(first_path)["stages"]["export"]["peak_bytes"] == 10_000_000
+    with open(comparison_path, encoding="utf-8") as f:
+        assert "| Peak (MB) | 10.00 | 8.00 | -20.0% |" in f.read()
+
+    # Runs started in the same second do not replace each other either
+    third_path, _ = mem_profile.save_run(
+        make_report("claims.xlsx", 9_000_000, 21, started="2026-10-19T01:00:00"), memprofile_config)
+    assert third_path == str(tmp_path / "claims.20261019-010000-1.memprofile.json")
+    assert len(list(tmp_path.glob("*.memprofile.json"))) == 3
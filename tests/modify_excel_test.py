@@ -83,6 +83,16 @@ class TestExcelModification:
         with pytest.raises(ValueError):
            self.spreadsheet.add_value_formula(value_formula=value_formula, col="value")
 
+        # Formulas referencing only the placeholder row are written as one shared formula
+        self.spreadsheet.add_value_formula(value_formula="=FLOOR($B{row}*0.17,0.01)", col="C")
+        assert dict(self.spreadsheet.sheet["C2"].value) == {"t": "shared", "ref": f"C2:C{self.row_range}", "si": "0"}
+        assert self.spreadsheet.sheet["C2"].value.text == "=FLOOR($B2*0.17,0.01)"
+        assert dict(self.spreadsheet.sheet[f"C{self.row_range}"].value) == {"t": "shared", "si": "0"}
+
+        # Other relative references would be shifted by Excel, those formulas are written per row
+        self.spreadsheet.add_value_formula(value_formula="=B{row}+A1", col="D")
+        assert self.spreadsheet.sheet["D3"].value == "=B3+A1"
+
     
     def test_add_protection(self):
         
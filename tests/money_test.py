@@ -0,0 +1,111 @@
+import math
+import sqlite3
+from decimal import Decimal, ROUND_FLOOR
+import numpy as np
+import pandas as pd
+import pytest
+from src import export_excel, export_tabular, money, setup_dataframe, template_registry
+
+
+def test_to_cents():
+    values = pd.Series([150.73, 0.29, -12.34, 1e9 + 0.01, 0.0])
+    assert money.to_cents(values).tolist() == [15073, 29, -1234, 100000000001, 0]
+    assert money.to_cents(values).dtype == "int64"
+
+    # Missing amounts keep the column nullable
+    with_missing = money.to_cents(pd.Series([1.5, None]))
+    assert with_missing.dtype == "Int64" and with_missing.isna().tolist() == [False, True]
+
+    assert money.from_cents(pd.Series([15073, 29])).tolist() == [150.73, 0.29]
+    assert money.to_cents(pd.Series(["12.34"])).tolist() == [1234]
+
+    # Strings and decimals round exactly, not from the nearest float
+    assert money.to_cents(pd.Series(["1.005", " -2.675", "0.125"])).tolist() == [101, -268, 13]
+    assert money.to_cents(pd.Series([Decimal("1.005"), None], dtype="object")).tolist() == [101, pd.NA]
+    assert money.to_cents(pd.Series(["1.005"], dtype="string[pyarrow]")).tolist() == [101]
+    with pytest.raises(ValueError):
+        money.to_cents(pd.Series(["12,34"]))
+
+
+def test_fixed_point():
+    amount = money.FixedPoint(np.array([300, 100, 1]))
+    rate = money.FixedPoint.rate("0.83")
+
+    assert (amount * rate).floor(money.FixedPoint.rate("0.01")).to_cents().tolist() == [249, 83, 0]
+    assert money.total(amount, amount).to_cents().tolist() == [600, 200, 2]
+    assert (amount * money.FixedPoint.rate("0.5")).to_cents().tolist() == [150, 50, 1]
+
+    with pytest.raises(ValueError):
+        amount + rate
+    with pytest.raises(ValueError):
+        amount * amount
+
+    # Quotients round half away from zero to whole cents
+    assert (amount / money.FixedPoint.rate("8")).to_cents().tolist() == [38, 13, 0]
+    assert (-amount / money.FixedPoint.rate("0.3")).to_cents().tolist() == [-1000, -333, -3]
+    with pytest.raises(ValueError):
+        rate / amount
+
+    # Only the rows divided by zero are missing
+    ratio = amount / money.FixedPoint(np.array([3, 0, 1]))
+    assert ratio.missing.tolist() == [False, True, False]
+    assert (ratio * money.FixedPoint(100)).to_cents().tolist() == [10000, 0, 100]
+    assert (amount / money.FixedPoint.rate("0")).missing
+
+
+def test_shares_are_exact():
+    # Every amount from 0.01 to 2,000.00
+    cents = pd.Series(np.arange(1, 200001, dtype="int64"))
+    columns = {"M": cents}
+
+    local = export_tabular.compile_formula("=FLOOR($M2*0.17,0.01)")(columns)
+    federal = export_tabular.compile_formula("=FLOOR($M2*0.83,0.01)")(columns)
+
+    expected_local = [int((Decimal(c) * Decimal("0.17")).to_integral_value(ROUND_FLOOR)) for c in cents]
+    expected_federal = [int((Decimal(c) * Decimal("0.83")).to_integral_value(ROUND_FLOOR)) for c in cents]
+    assert local.tolist() == expected_local
+    assert federal.tolist() == expected_federal
+
+    # Binary floating point gets some of these wrong, e.g. FLOOR(3.00*0.83, 0.01) gives 2.48
+    assert math.floor(3.00 * 0.83 / 0.01) * 0.01 != 2.49
+    assert federal[299] == 249
+
+
+def test_totals_reconcile_with_source(config_dict):
+    with sqlite3.connect("data/test_medical_data.db") as connection:
+        source = connection.execute(
+            "SELECT CAST(billed_amount AS TEXT), CAST(spend_down AS TEXT), CAST(tpl_amount AS TEXT) "
+            "FROM medical_data;").fetchall()
+
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_money_columns(df, config_dict["money_columns"])
+
+    for position, header in enumerate(["BILLED AMOUNT", "SPEND DOWN", "TPL AMOUNT"]):
+        assert df[header].dtype == "int64"
+        expected = sum(Decimal(row[position]) for row in source)
+        assert Decimal(int(df[header].sum())) / 100 == expected
+
+    # GRAND TOTAL of the tabular export sums the amounts to the cent
+    template = template_registry.DEFAULT_TEMPLATES["MAP or COFA"]
+    workbook = export_excel.load_template(template["path"])
+    layout = template_registry.get_layout(workbook, template["path"], template["sheet"],
+                                          config_dict["unprotected_columns"])
+    frame = export_tabular.tabular_frame(df, layout, config_dict["money_columns"])
+
+    grand_total = sum(Decimal(str(value)) for value in frame["GRAND TOTAL"])
+    assert grand_total == sum(Decimal(row[1]) + Decimal(row[2]) for row in source)
+    assert frame["BILLED AMOUNT"].tolist() == [float(row[0]) for row in source]
+
+
+def test_workbook_amounts_are_display_values(config_dict):
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+    df = setup_dataframe.format_money_columns(df, config_dict["money_columns"])
+
+    workbook, = template_registry.populate_templates(df.head(3), config_dict).values()
+    sheet = workbook["MAP or COFA"]
+
+    assert [sheet[f"K{row}"].value for row in (2, 3, 4)] == (df["BILLED AMOUNT"].head(3) / 100).tolist()
+    assert sheet["K2"].value == 150.73
@@ -0,0 +1,53 @@
+import pytest
+from openpyxl import load_workbook
+from openpyxl.worksheet.cell_range import MultiCellRange
+from src import export_excel, row_capacity, template_registry
+
+
+def test_fit_ranges():
+    ranges = MultiCellRange("K2:K1048576 L2 L6:L1048576 Q2:Q3000 R3001:R1048576")
+
+    # Clipped to the capacity, ranges below it are dropped
+    assert str(row_capacity.fit_ranges(ranges, 80, 3000)) == "K2:K80 L2 L6:L80 Q2:Q80"
+    assert str(row_capacity.fit_ranges(ranges, 4, 3000)) == "K2:K4 L2 Q2:Q4"
+
+    # Ranges ending on the last pre-formatted row grow, unless their column is covered past it
+    assert str(row_capacity.fit_ranges(ranges, 5000, 3000)) == "K2:K5000 L2 L6:L5000 Q2:Q5000 R3001:R5000"
+    fitted = row_capacity.fit_ranges(MultiCellRange("M2:Q3000"), 5000, 3000, covered_columns={14, 15})
+    assert str(fitted) == "M2:Q3000 M3001:M5000 P3001:Q5000"
+
+
+@pytest.mark.parametrize("num_rows", [30, 3500])
+def test_populated_sheet_fits_rows(config_and_df, tmp_path, num_rows):
+    config_dict, df = config_and_df
+    df = df.sample(num_rows, replace=True, random_state=0).reset_index(drop=True)
+    slack_rows = config_dict["row_capacity"]["slack_rows"]
+    last_row = num_rows + 1 + slack_rows
+
+    workbooks = template_registry.populate_templates(df, config_dict)
+    save_path = export_excel.save_workbook(workbooks["CTS_Example_Template"], "fitted.xlsx",
+                                           sheets_directory=str(tmp_path))
+
+    sheet = load_workbook(save_path)["MAP or COFA"]
+    assert sheet.max_row == last_row
+    assert sheet.tables["Table1"].ref == f"A1:U{last_row}"
+
+    # Every range ends within the capacity and every validated column reaches its last row
+    validated_ends = {}
+    for validation in sheet.data_validations.dataValidation:
+        for cell_range in validation.sqref.ranges:
+            validated_ends[cell_range.min_col] = max(validated_ends.get(cell_range.min_col, 0), cell_range.max_row)
+    assert set(validated_ends.values()) == {last_row}
+    for formatting in sheet.conditional_formatting:
+        assert max(cell_range.max_row for cell_range in formatting.sqref.ranges) == last_row
+
+    # Shared formulas are read back as the formula of every row
+    assert sheet["N2"].value == "=FLOOR($M2*0.17,0.01)"
+    assert sheet[f"L{last_row}"].value == f"=SUM(M{last_row},P{last_row},Q{last_row},S{last_row})"
+
+    # Rows past the pre-formatted block are formatted and the last data row is unlocked
+    assert sheet[f"E{num_rows + 1}"].number_format == config_dict["formatting"]["DATE OF BIRTH"]["style_format"]
+    assert sheet[f"M{last_row}"].number_format == sheet["M2"].number_format
+    assert sheet[f"M{num_rows + 1}"].protection.locked is False
+    assert sheet[f"M{last_row}"].protection.locked is False
+    assert sheet[f"A{last_row}"].protection.locked is True
@@ -0,0 +1,103 @@
+import datetime
+import pytest
+from openpyxl import load_workbook
+from src import config_compiler, export_excel, row_pipeline, setup_dataframe, shared_formula, xlsx_package
+
+
+def test_formula_pattern():
+    assert shared_formula.formula_pattern("=SUM(M2,P2,Q2,S2)", 2) == "=SUM(M{row},P{row},Q{row},S{row})"
+    assert shared_formula.formula_pattern("=FLOOR($M2*0.17,0.01)", 2) == "=FLOOR($M{row}*0.17,0.01)"
+    assert shared_formula.formula_pattern("=SUM($M$1,M2)", 2) == "=SUM($M$1,M{row})"
+
+    with pytest.raises(ValueError):
+        shared_formula.formula_pattern("=M3", 2)
+
+
+def test_generate_lean_matches_dataframe_route(config_dict, tmp_path):
+    workbook, num_rows = row_pipeline.generate_lean("data/test_medical_data.db", config_dict)
+    save_path = export_excel.save_workbook(workbook, "lean.xlsx", sheets_directory=str(tmp_path))
+
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+    assert num_rows == df.shape[0]
+
+    # The data rows are followed by the slack rows
+    last_row = num_rows + 1 + config_dict["row_capacity"]["slack_rows"]
+    sheet = load_workbook(save_path)["MAP or COFA"]
+    headers = [cell.value for cell in sheet[1]]
+    assert sheet.max_row == last_row
+    assert sheet.tables["Table1"].ref == f"A1:U{last_row}"
+    assert sheet[f"A{last_row}"].value is None
+    assert sheet[f"L{last_row}"].value == f"=SUM(M{last_row},P{last_row},Q{last_row},S{last_row})"
+    assert sheet[f"M{last_row}"].protection.locked is False
+    assert sheet.protection.sheet
+
+    for row_idx, record in enumerate(df.to_dict("records"), start=2):
+        for col_idx, header in enumerate(headers, start=1):
+            if header not in record:
+                continue
+            value = sheet.cell(row=row_idx, column=col_idx).value
+            expected = record[header]
+            if isinstance(value, datetime.datetime):
+                value = value.date()
+            if isinstance(expected, datetime.datetime):
+                expected = expected.date()
+            assert value == expected, (row_idx, header)
+
+    assert sheet["L2"].value == "=SUM(M2,P2,Q2,S2)"
+    assert sheet["M2"].protection.locked is False
+    assert sheet["A2"].protection.locked is True
+    assert sheet["E2"].number_format == config_dict["formatting"]["DATE OF BIRTH"]["style_format"]
+
+
+@pytest.mark.parametrize("block_size", [7, 1])
+def test_partitioned_rows_match_serial_writer(config_dict, block_size):
+    packages = []
+    for workers in (1, 2, 3):
+        workbook, _ = row_pipeline.generate_lean("data/test_medical_data.db", config_dict,
+                                                 workers=workers, block_size=block_size)
+
+        # The creation time in the document properties differs between runs
+        packages.append([(name, data) for name, _, data in xlsx_package.serialize_workbook(workbook)
+                         if name != "docProps/core.xml"])
+
+    assert packages[0] == packages[1] == packages[2]
+
+
+def test_block_formulas():
+    patterns = [None, "=SUM(A{row},C{row})", None, "=$A{row}*2"]
+
+    masters, dependents = row_pipeline.block_formulas(patterns, 9, 15, 4)
+    assert masters[0] is None and dependents[2] is None
+    assert dict(masters[1]) == {"t": "shared", "ref": "B9:B15", "si": "4"}
+    assert masters[1].text == "=SUM(A9,C9)"
+    assert dict(dependents[3]) == {"t": "shared", "si": "5"}
+
+    # A block of one row has plain formulas
+    masters, dependents = row_pipeline.block_formulas(patterns, 9, 9, 4)
+    assert masters[3] == "=$A9*2"
+    assert dependents == [None] * 4
+
+
+def test_generate_lean_selection(config_dict, tmp_path):
+    selection = {"payers": ["Medicare"]}
+    workbook, num_rows = row_pipeline.generate_lean("data/test_medical_data.db", config_dict, selection=selection)
+    save_path = export_excel.save_workbook(workbook, "selection.xlsx", sheets_directory=str(tmp_path))
+
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db", selection=selection)
+    assert num_rows == df.shape[0] == 10
+
+    sheet = load_workbook(save_path)["MAP or COFA"]
+    assert [sheet.cell(row=row, column=1).value for row in range(2, num_rows + 2)] == \
+        df["control_account_number"].tolist()
+
+
+def test_generate_lean_uses_plan_template(config_dict, tmp_path):
+    template = config_compiler.lean_template(config_compiler.compile_config(config_dict))
+    template["formatting"]["DATE OF BIRTH"]["style_format"] = "yyyy-mm-dd"
+
+    workbook, _ = row_pipeline.generate_lean("data/test_medical_data.db", config_dict, plan_template=template)
+    save_path = export_excel.save_workbook(workbook, "plan.xlsx", sheets_directory=str(tmp_path))
+
+    assert load_workbook(save_path)["MAP or COFA"]["E2"].number_format == "yyyy-mm-dd"
@@ -0,0 +1,47 @@
+import json
+from src import run_metrics
+
+
+def test_run_metrics(tmp_path):
+    metrics = run_metrics.RunMetrics("example.xlsx")
+
+    with metrics.stage("setup"):
+        metrics.add("rows", 30)
+        metrics.add("cache_misses")
+    with metrics.stage("save"):
+        metrics.add("bytes_written", 2048)
+    metrics.status = "ok"
+
+    log_path = tmp_path / "logs" / "metrics.jsonl"
+    textfile_path = tmp_path / "node_exporter" / "cts.prom"
+    config = {"json_log": str(log_path), "prometheus_textfile": str(textfile_path)}
+
+    run_metrics.emit(metrics, config)
+    run_metrics.emit(metrics, config)
+
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+
+    record = json.loads(lines[0])
+    assert record["status"] == "ok"
+    assert record["rows"] == 30
+    assert record["cache_misses"] == 1
+    assert list(record["stages"]) == ["setup", "save"]
+
+    text = textfile_path.read_text(encoding="utf-8")
+    assert "cts_generation_success 1" in text
+    assert "cts_generation_rows 30" in text
+    assert 'cts_generation_stage_duration_seconds{stage="save"}' in text
+    assert [path.name for path in textfile_path.parent.iterdir()] == ["cts.prom"]
+    assert record["peak_rss_bytes"] > 0
+
+
+def test_emit_reports_write_failures(tmp_path, capsys):
+    metrics = run_metrics.RunMetrics("example.xlsx")
+    textfile_path = tmp_path / "cts.prom"
+
+    # The log path is a directory, the textfile is still written
+    run_metrics.emit(metrics, {"json_log": str(tmp_path), "prometheus_textfile": str(textfile_path)})
+
+    assert "Run metrics not written to" in capsys.readouterr().err
+    assert "cts_generation_success 0" in textfile_path.read_text(encoding="utf-8")
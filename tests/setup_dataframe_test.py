@@ -2,6 +2,7 @@ from src import setup_dataframe
 import pandas as pd
 import os
 import pytest
+import sqlite3
 
 def test_create_dataframe():
     test_df = setup_dataframe.create_dataframe("data/test_medical_data.db")
@@ -41,4 +42,78 @@ def test_create_sheet():
 
     # Cleanup the created file and directory
     if os.path.exists(path):
-        os.remove(path)
\ No newline at end of file
+        os.remove(path)
+
+def test_create_dataframe_pyarrow():
+    pytest.importorskip("pyarrow")
+
+    test_df = setup_dataframe.create_dataframe("data/test_medical_data.db", dtype_backend="pyarrow")
+
+    # All columns should be Arrow-backed and match the default path
+    assert test_df.shape[1] == 14
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in test_df.dtypes)
+
+    # Date columns stay in Arrow memory after formatting
+    formatted = setup_dataframe.format_date_columns(test_df, ["date_of_service"])
+    assert str(formatted["date_of_service"].dtype) == "timestamp[ns][pyarrow]"
+
+    with pytest.raises(ValueError):
+        setup_dataframe.create_dataframe("data/test_medical_data.db", dtype_backend="not_a_backend")
+
+def read_selection(selection):
+    with sqlite3.connect("data/test_medical_data.db") as connection:
+        return connection.execute(*setup_dataframe.select_claims(connection, selection)).fetchall()
+
+def test_select_claims():
+    every_claim = read_selection(None)
+    assert len(every_claim) == 30
+    assert read_selection({}) == every_claim
+
+    # Filters are combined and keep the table order
+    accounts = read_selection({"accounts": ["1234567890", "5678901234"]})
+    assert len(accounts) == 20
+    assert accounts == [row for row in every_claim if row[0] in ("1234567890", "5678901234")]
+
+    assert len(read_selection({"payers": ["Medicare"], "service_from": "2024-06-16"})) == 10
+    assert len(read_selection({"service_from": "2024-06-15", "service_to": "2024-06-20"})) == 20
+    assert read_selection({"accounts": ["1234567890"], "payers": ["Medicare"]}) == []
+
+def test_select_claims_shards():
+    every_claim = read_selection(None)
+
+    # Shards are disjoint, cover every claim and keep the claims of an account together
+    shards = [read_selection({"shard": [n, 3]}) for n in (1, 2, 3)]
+    assert sorted(row for shard in shards for row in shard) == sorted(every_claim)
+    for n, shard in enumerate(shards):
+        assert all(setup_dataframe.shard_of(row[0], 3) == n for row in shard)
+
+def test_select_claims_account_table(monkeypatch):
+    selection = {"accounts": ["1234567890", "0987654321", "missing"]}
+    bound = read_selection(selection)
+
+    # Long account lists are joined through a temporary table
+    monkeypatch.setattr(setup_dataframe, "ACCOUNT_TEMP_TABLE_THRESHOLD", 2)
+    with sqlite3.connect("data/test_medical_data.db") as connection:
+        query, params = setup_dataframe.select_claims(connection, selection)
+        assert "temp.selected_accounts" in query
+        assert connection.execute(query, params).fetchall() == bound
+
+@pytest.mark.parametrize("selection", [
+    {"account": ["1234567890"]},
+    {"accounts": []},
+    {"payers": []},
+    {"service_from": "2024-06-20", "service_to": "2024-06-15"},
+    {"service_from": "06/15/2024"},
+    {"shard": [0, 4]},
+    {"shard": [5, 4]},
+])
+def test_select_claims_errors(selection):
+    with pytest.raises(ValueError):
+        read_selection(selection)
+
+def test_create_dataframe_selection():
+    test_df = setup_dataframe.create_dataframe("data/test_medical_data.db",
+                                               selection={"accounts": ["0987654321"], "payers": ["Medicare"]})
+
+    assert test_df.shape == (10, 14)
+    assert set(test_df["control_account_number"]) == {"0987654321"}
@@ -0,0 +1,65 @@
+import io
+import shutil
+import zipfile
+from openpyxl import load_workbook
+from src import export_excel, template_blob, xlsx_package
+
+
+def test_blob_restores_independent_templates(tmp_path):
+    path = template_blob.build_blob("CTS_Example_Template.xlsx", str(tmp_path / "template.blob"))
+    blob = template_blob.TemplateBlob(path)
+
+    first = blob.workbook()
+    first["MAP or COFA"]["B2"] = "changed"
+    second = blob.workbook()
+
+    parsed = export_excel.load_template("CTS_Example_Template.xlsx")
+    assert second["MAP or COFA"]["B2"].value == parsed["MAP or COFA"]["B2"].value
+    assert second.sheetnames == parsed.sheetnames
+    assert second._cell_styles == parsed._cell_styles
+    assert isinstance(blob.section("snapshot"), memoryview)
+
+    blob.close()
+
+
+def test_open_blob_follows_template_content(tmp_path):
+    template_path = str(tmp_path / "Template.xlsx")
+    shutil.copy("CTS_Example_Template.xlsx", template_path)
+    blob_dir = str(tmp_path / "blobs")
+
+    blob = template_blob.open_blob(template_path, blob_dir)
+    assert template_blob.open_blob(template_path, blob_dir) is blob
+    assert template_blob.blob_path(template_path, blob_dir, 9) != blob.path
+
+    # A changed template gets a new blob
+    workbook = load_workbook(template_path)
+    workbook["MAP or COFA"]["A1"] = "CHANGED"
+    workbook.save(template_path)
+    assert template_blob.blob_path(template_path, blob_dir) != blob.path
+
+
+def test_unchanged_parts_reuse_payloads(tmp_path):
+    blob = template_blob.open_blob("CTS_Example_Template.xlsx", str(tmp_path))
+    workbook = blob.workbook()
+    workbook["MAP or COFA"]["B2"] = "Smith"
+    parts = xlsx_package.serialize_workbook(workbook)
+
+    # Payloads stored at level 9 show up in a package written at level 1
+    precompressed = {key: (data, xlsx_package.deflate(bytes(data), 9))
+                     for key, (data, _) in blob.precompressed(6).items()}
+
+    buffer = io.BytesIO()
+    xlsx_package.write_package(parts, buffer, compresslevel=1, precompressed=precompressed)
+
+    with zipfile.ZipFile(buffer) as archive:
+        sizes = {info.filename: info.compress_size for info in archive.infolist()}
+        assert archive.testzip() is None
+
+    reused = [name for (name, _), (_, payload) in precompressed.items() if sizes.get(name) == len(payload)]
+    assert "xl/theme/theme1.xml" in reused
+    assert "xl/worksheets/sheet2.xml" not in reused
+
+    # The package reads back with the changed cell
+    save_path = tmp_path / "reused.xlsx"
+    save_path.write_bytes(buffer.getvalue())
+    assert load_workbook(save_path)["MAP or COFA"]["B2"].value == "Smith"
@@ -0,0 +1,95 @@
+import shutil
+import pandas as pd
+import pytest
+from src import config_compiler, export_excel, template_registry
+
+
+def test_get_layout(config_and_df):
+    config_dict, _ = config_and_df
+    workbook = export_excel.load_template("CTS_Example_Template.xlsx")
+
+    layout = template_registry.get_layout(workbook, "CTS_Example_Template.xlsx", "MAP or COFA",
+                                          config_dict["unprotected_columns"])
+
+    assert layout["headers"]["LAST NAME"] == "B"
+    assert layout["formulas"]["N"] == "=FLOOR($M2*0.17,0.01)"
+    assert layout["unlock_columns"] == ["M", "P", "S", "T", "U"]
+
+    # Compiled once per template version
+    assert template_registry.get_layout(workbook, "CTS_Example_Template.xlsx", "MAP or COFA",
+                                        config_dict["unprotected_columns"]) is layout
+
+    with pytest.raises(ValueError):
+        template_registry.compile_layout(workbook["MAP or COFA"], ["NOT IN SHEET"])
+
+
+def test_route_mask():
+    df = pd.DataFrame({"TPL": ["Medicare", "None", "Private Insurance"]})
+
+    assert template_registry.route_mask(df, {"column": "TPL", "equals": "None"}).tolist() == [False, True, False]
+    assert template_registry.route_mask(df, {"column": "TPL", "in": ["None", "Medicare"]}).tolist() == [True, True, False]
+    assert template_registry.route_mask(df, {"column": "TPL", "not_in": ["None"]}).tolist() == [True, False, True]
+
+    with pytest.raises(ValueError):
+        template_registry.route_mask(df, {"column": "TPL"})
+
+
+def test_populate_templates(config_and_df, tmp_path):
+    config_dict, df = config_and_df
+
+    second_template = str(tmp_path / "Medicare_Template.xlsx")
+    shutil.copy("CTS_Example_Template.xlsx", second_template)
+
+    config_dict = dict(config_dict, templates={
+        "Medicare": {"path": second_template, "sheet": "MAP or COFA",
+                     "route": {"column": "TPL", "equals": "Medicare"}},
+        "Other": {"path": "CTS_Example_Template.xlsx", "sheet": "MAP or COFA", "default": True},
+    })
+
+    workbooks = template_registry.populate_templates(df, config_dict)
+
+    assert sorted(workbooks) == ["CTS_Example_Template", "Medicare_Template"]
+
+    medicare_sheet = workbooks["Medicare_Template"]["MAP or COFA"]
+    other_sheet = workbooks["CTS_Example_Template"]["MAP or COFA"]
+
+    # 10 of the 30 test claims are Medicare claims
+    assert medicare_sheet["R11"].value == "Medicare"
+    assert medicare_sheet["A12"].value is None
+    assert other_sheet["R21"].value != "Medicare"
+    assert other_sheet["A22"].value is None
+    assert medicare_sheet.protection.sheet is True
+
+
+def test_populate_templates_uses_plan_formatting(config_and_df):
+    config_dict, df = config_and_df
+    plan = config_compiler.compile_config(config_dict)
+    plan["templates"]["MAP or COFA"]["formatting"]["DATE OF BIRTH"]["style_format"] = "yyyy-mm-dd"
+
+    workbook = template_registry.populate_templates(df, config_dict, plan=plan)["CTS_Example_Template"]
+
+    assert workbook["MAP or COFA"]["E2"].number_format == "yyyy-mm-dd"
+
+
+def test_duplicate_templates_are_rejected(config_and_df, tmp_path):
+    config_dict, df = config_and_df
+
+    (tmp_path / "other").mkdir()
+    same_name = str(tmp_path / "other" / "CTS_Example_Template.xlsx")
+    shutil.copy("CTS_Example_Template.xlsx", same_name)
+
+    templates = {
+        "Medicare": {"path": "CTS_Example_Template.xlsx", "sheet": "MAP or COFA",
+                     "route": {"column": "TPL", "equals": "Medicare"}},
+        "Again": {"path": "./CTS_Example_Template.xlsx", "sheet": "MAP or COFA", "default": True},
+        "Elsewhere": {"path": same_name, "sheet": "MAP or COFA"},
+    }
+    problems = template_registry.duplicate_templates(templates)
+    assert problems[0] == "Templates Medicare and Again both populate sheet MAP or COFA of ./CTS_Example_Template.xlsx"
+    assert problems[1].endswith("have the same output name CTS_Example_Template")
+    assert len(problems) == 2
+
+    with pytest.raises(ValueError, match="same output name"):
+        template_registry.populate_templates(df, dict(config_dict, templates=templates))
+    with pytest.raises(ValueError, match="both populate sheet"):
+        config_compiler.compile_config(dict(config_dict, templates=templates))
@@ -0,0 +1,154 @@
+import tracemalloc
+import pytest
+import openpyxl
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Protection
+from openpyxl.worksheet.datavalidation import DataValidation
+from src import export_excel, row_pipeline, setup_dataframe, template_registry, workbook_equivalence
+from src.shared_formula import fill_shared_formula
+
+
+@pytest.fixture(scope="module")
+def reference(config_dict, tmp_path_factory):
+    """
+    Workbook written by the per-cell insert_into_template route
+    """
+
+    df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+    df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+    df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+    df = setup_dataframe.format_money_columns(df, config_dict["money_columns"])
+
+    workbook, = template_registry.populate_templates(df, config_dict).values()
+    directory = tmp_path_factory.mktemp("reference")
+    return export_excel.save_workbook(workbook, "reference.xlsx", sheets_directory=str(directory))
+
+
+def resave(path, tmp_path, name, edit=None):
+    """
+    Loads and saves a copy of a workbook with openpyxl, which renumbers the styles
+    and shared strings, after applying edit to its claims sheet
+    """
+
+    workbook = openpyxl.load_workbook(path)
+    if edit is not None:
+        edit(workbook["MAP or COFA"])
+    save_path = str(tmp_path / name)
+    workbook.save(save_path)
+    return save_path
+
+
+def test_parse_ranges():
+    assert workbook_equivalence.parse_ranges("A2:A5 A6:A10 C3") == {1: [[2, 10]], 3: [[3, 3]]}
+    assert workbook_equivalence.parse_ranges("B2:C4 $B$3:$B$8") == {2: [[2, 8]], 3: [[2, 4]]}
+
+
+def test_resaved_workbook_is_equivalent(reference, tmp_path):
+    assert workbook_equivalence.compare_workbooks(reference, reference) == []
+    assert workbook_equivalence.compare_workbooks(reference, resave(reference, tmp_path, "copy.xlsx")) == []
+
+
+@pytest.mark.parametrize("edit, location, attribute", [
+    (lambda sheet: setattr(sheet["B3"], "value", "Changed"), "B3", "value"),
+    (lambda sheet: setattr(sheet["K2"], "value", sheet["K2"].value + 0.01), "K2", "value"),
+    (lambda sheet: setattr(sheet["L4"], "value", "=SUM(M4,P4)"), "L4", "value"),
+    (lambda sheet: setattr(sheet["E5"], "number_format", "YYYY-MM-DD"), "E5", "number_format"),
+    (lambda sheet: setattr(sheet["A6"], "alignment", Alignment(horizontal="center")), "A6", "alignment"),
+    (lambda sheet: setattr(sheet["M7"], "protection", Protection(locked=True)), "M7", "protection"),
+    (lambda sheet: setattr(sheet["U40"], "value", 1), "U40", "value"),
+])
+def test_cell_differences_are_reported(reference, tmp_path, edit, location, attribute):
+    candidate = resave(reference, tmp_path, "candidate.xlsx", edit)
+
+    differences = workbook_equivalence.compare_workbooks(reference, candidate)
+    assert [(sheet, found, kind) for sheet, found, kind, _, _ in differences] == [("MAP or COFA", location, attribute)]
+
+
+def test_sheet_differences_are_reported(reference, tmp_path):
+    def edit(sheet):
+        validation = DataValidation(type="whole", operator="greaterThan", formula1="0", sqref="T2:T10")
+        sheet.add_data_validation(validation)
+        sheet.conditional_formatting.add("U2:U10", FormulaRule(formula=["ISBLANK(U2)"]))
+        sheet.protection.sheet = False
+
+    candidate = resave(reference, tmp_path, "candidate.xlsx", edit)
+
+    differences = workbook_equivalence.compare_workbooks(reference, candidate)
+    assert sorted(kind for _, _, kind, _, _ in differences) == ["conditional_format", "data_validation",
+                                                               "sheet_protection"]
+
+    found = {kind: (reference_value, candidate_value) for _, _, kind, reference_value, candidate_value in differences}
+    assert found["data_validation"] == (None, {20: [[2, 10]]})
+
+
+def test_shared_formulas_match_cell_formulas(tmp_path):
+    paths = []
+    for shared in (False, True):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        if shared:
+            fill_shared_formula(sheet, "L", "=SUM(M2,P2,Q2,S2)", 2, 500)
+        else:
+            for row in range(2, 501):
+                sheet[f"L{row}"] = f"=SUM(M{row},P{row},Q{row},S{row})"
+        paths.append(str(tmp_path / f"formulas_{shared}.xlsx"))
+        workbook.save(paths[-1])
+
+    assert workbook_equivalence.compare_workbooks(*paths) == []
+
+
+def test_lean_route_matches_reference(reference, config_dict, tmp_path):
+    workbook, _ = row_pipeline.generate_lean("data/test_medical_data.db", config_dict)
+    candidate = export_excel.save_workbook(workbook, "lean.xlsx", sheets_directory=str(tmp_path))
+
+    assert workbook_equivalence.compare_workbooks(reference, candidate, ["MAP or COFA"], None) == []
+
+
+def test_max_differences(reference, tmp_path):
+    def edit(sheet):
+        for row in range(2, 12):
+            sheet[f"B{row}"] = "Changed"
+
+    candidate = resave(reference, tmp_path, "candidate.xlsx", edit)
+
+    assert len(workbook_equivalence.compare_workbooks(reference, candidate, max_differences=3)) == 3
+    assert len(workbook_equivalence.compare_workbooks(reference, candidate, max_differences=None)) == 10
+
+
+def write_claims(path, num_rows, shared, changed_row=None):
+    """
+    Writes a sheet of numbers, strings and a formula column without the template
+    """
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in range(2, num_rows + 2):
+        sheet.cell(row=row, column=1, value=row * 1.25)
+        sheet.cell(row=row, column=2, value="Changed" if row == changed_row else "Smith")
+    if shared:
+        fill_shared_formula(sheet, "C", "=FLOOR($A2*0.83,0.01)", 2, num_rows + 1)
+    else:
+        for row in range(2, num_rows + 2):
+            sheet.cell(row=row, column=3, value=f"=FLOOR($A{row}*0.83,0.01)")
+    workbook.save(path)
+    return str(path)
+
+
+def test_memory_does_not_grow_with_rows(tmp_path, monkeypatch):
+    # Both sheets span several chunks
+    monkeypatch.setattr(workbook_equivalence, "CHUNK_SIZE", 1 << 16)
+
+    peaks = []
+    for num_rows in (2000, 16000):
+        reference = write_claims(tmp_path / f"reference_{num_rows}.xlsx", num_rows, shared=False)
+        candidate = write_claims(tmp_path / f"candidate_{num_rows}.xlsx", num_rows, shared=True,
+                                 changed_row=num_rows + 1)
+
+        tracemalloc.start()
+        differences = workbook_equivalence.compare_workbooks(reference, candidate)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        assert differences == [("Sheet", f"B{num_rows + 1}", "value", "Smith", "Changed")]
+
+    assert peaks[1] < 2 * peaks[0]
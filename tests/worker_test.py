@@ -0,0 +1,90 @@
+import json
+import os
+import socket
+import threading
+import time
+import openpyxl
+import pytest
+from src import export_excel, setup_dataframe, template_registry, workbook_equivalence, worker
+
+
+class TestGenerationWorker:
+    @classmethod
+    def setup_class(cls):
+        """
+        Setup logic shared by all tests in the class.
+        The worker is started once, like a resident worker would be.
+        """
+        cls.worker = worker.GenerationWorker(connection_string="data/test_medical_data.db")
+
+    @classmethod
+    def teardown_class(cls):
+        cls.worker.close()
+
+    def test_run_job(self, tmp_path):
+        self.worker.sheets_directory = str(tmp_path)
+
+        result = self.worker.run_job({"name": "job.xlsx", "password": "secret"})
+
+        assert result["status"] == "ok"
+        assert result["rows"] == 30
+
+        sheet = openpyxl.load_workbook(result["path"])["MAP or COFA"]
+        assert sheet["B2"].value == "Smith"
+        assert sheet.protection.sheet is True
+
+        # The sheet is fitted to the rows like the output of main.py
+        last_row = 31 + self.worker.config_dict["row_capacity"]["slack_rows"]
+        assert sheet.tables["Table1"].ref == f"A1:U{last_row}"
+        assert sheet.max_row == last_row
+
+        config_dict = self.worker.config_dict
+        df = setup_dataframe.create_dataframe("data/test_medical_data.db")
+        df = setup_dataframe.transform_header(df, config_dict["database_fields_to_headers"])
+        df = setup_dataframe.format_date_columns(df, config_dict["date_columns"])
+        df = setup_dataframe.format_money_columns(df, config_dict["money_columns"])
+        workbook, = template_registry.populate_templates(df, config_dict, "secret").values()
+        reference = export_excel.save_workbook(workbook, "main.xlsx", sheets_directory=str(tmp_path))
+        assert workbook_equivalence.compare_workbooks(reference, result["path"]) == []
+
+        # Each job gets a fresh template, the snapshot is never modified
+        second = self.worker.run_job({"name": "job2.xlsx"})
+        assert second["status"] == "ok"
+
+        # Errors are reported without stopping the worker
+        assert self.worker.handle({"name": "job.xlsx"})["status"] == "error"
+        assert self.worker.handle({"name": "not_excel"})["status"] == "error"
+
+    def test_watch_directory(self, tmp_path):
+        self.worker.sheets_directory = str(tmp_path)
+        queue_dir = tmp_path / "queue"
+        queue_dir.mkdir()
+
+        (queue_dir / "first.json").write_text(json.dumps({"name": "queued.xlsx"}))
+        (queue_dir / "second.json").write_text(json.dumps({"name": "bad_name"}))
+
+        worker.watch_directory(self.worker, str(queue_dir), once=True)
+
+        assert (queue_dir / "first.done").exists()
+        assert (queue_dir / "second.failed").exists()
+        assert json.loads((queue_dir / "first.result.json").read_text())["status"] == "ok"
+        assert os.path.exists(tmp_path / "queued.xlsx")
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets not available")
+    def test_serve_socket(self, tmp_path):
+        self.worker.sheets_directory = str(tmp_path)
+        socket_path = str(tmp_path / "worker.sock")
+
+        server = threading.Thread(target=worker.serve_socket, args=(self.worker, socket_path), daemon=True)
+        server.start()
+
+        # Wait for the server to bind
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.01)
+
+        result = worker.submit_job(socket_path, {"name": "socket.xlsx"}, timeout=30)
+
+        assert result["status"] == "ok"
+        assert os.path.exists(result["path"])
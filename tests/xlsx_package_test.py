@@ -0,0 +1,58 @@
+import io
+import os
+import zipfile
+import openpyxl
+from src import xlsx_package
+
+
+def test_chunked_parts_round_trip(monkeypatch):
+    monkeypatch.setattr(xlsx_package, "CHUNK_SIZE", 4096)
+
+    large = b"".join(f"<row r=\"{row}\"><c><v>{row * 7}</v></c></row>".encode() for row in range(5000))
+    parts = [("[Content_Types].xml", (2026, 10, 19, 0, 0, 0), b"<Types/>"),
+             ("xl/worksheets/sheet1.xml", (2026, 10, 19, 0, 0, 0), large),
+             ("xl/empty.xml", (2026, 10, 19, 0, 0, 0), b"")]
+
+    packages = []
+    for workers in (1, 4):
+        buffer = io.BytesIO()
+        xlsx_package.write_package(parts, buffer, compresslevel=6, workers=workers)
+        packages.append(buffer.getvalue())
+
+    # The chunking does not depend on the number of threads
+    assert packages[0] == packages[1]
+
+    with zipfile.ZipFile(io.BytesIO(packages[0])) as archive:
+        assert archive.testzip() is None
+        assert [(info.filename, archive.read(info)) for info in archive.infolist()] == \
+            [(name, data) for name, _, data in parts]
+        assert archive.getinfo("xl/worksheets/sheet1.xml").compress_size < len(large) // 4
+
+
+def test_spooled_workbook_matches_serialized(tmp_path):
+    workbook = openpyxl.Workbook()
+    for row in range(1, 200):
+        workbook.active.append([row, f"claim {row}", row * 0.5])
+
+    serialized = xlsx_package.serialize_workbook(workbook)
+    with xlsx_package.spool_workbook(workbook) as parts:
+        save_path = xlsx_package.save_atomic(parts, str(tmp_path / "spooled.xlsx"))
+
+    with zipfile.ZipFile(save_path) as archive:
+        assert [(info.filename, archive.read(info)) for info in archive.infolist()] == \
+            [(name, data) for name, _, data in serialized]
+
+
+def test_save_atomic_applies_umask(tmp_path):
+    parts = [("[Content_Types].xml", (2026, 10, 19, 0, 0, 0), b"<Types/>")]
+
+    previous = os.umask(0o077)
+    try:
+        private_path = xlsx_package.save_atomic(parts, str(tmp_path / "private.xlsx"))
+        os.umask(0o022)
+        shared_path = xlsx_package.save_atomic(parts, str(tmp_path / "shared.xlsx"))
+    finally:
+        os.umask(previous)
+
+    assert os.stat(private_path).st_mode & 0o777 == 0o600
+    assert os.stat(shared_path).st_mode & 0o777 == 0o644